@@ -0,0 +1,290 @@
+import argparse
+import collections
+import gzip
+import hashlib
+import json
+import math
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from sampling import (
+    gather_cpu_percents,
+    gather_cpu_times,
+    gather_swap_memory_stats,
+    gather_virtual_memory_stats,
+    DeadlineCalls,
+    get_disk_io_counters,
+)
+
+# Standalone push agent for remote hosts. It samples this machine with the
+# same psutil helpers the backend uses and pushes gzip'd JSON batches to a
+# central backend's POST /ingest. Needs only psutil: no FastAPI, Postgres
+# credentials or GPU libraries.
+# Samples wait in a bounded in-memory buffer (spooled to disk on exit) until
+# the server accepts them, so outages and 429s only delay data
+FAST_FAMILIES = ("cpu", "memory", "io")
+SLOW_FAMILIES = ("swap_memory", "disk_usage")
+MAX_BACKOFF_SECONDS = 60
+# Weight of each new clock offset measurement
+SKEW_SMOOTHING = 0.2
+# Seconds disk usage may take per tick, as in the collector's SOURCE_DEADLINES
+DISK_USAGE_DEADLINE_SECONDS = 1.0
+
+
+def sample_families(families, calls):
+    # One frame in the /ws/metrics shape, for the families due this tick
+    frame = {}
+    if "cpu" in families:
+        user_time, system_time, idle_time = gather_cpu_times()
+        frame["cpu"] = {
+            "user_time": user_time,
+            "system_time": system_time,
+            "idle_time": idle_time,
+            "percent": gather_cpu_percents(),
+        }
+    if "memory" in families:
+        available_memory, memory_percent_usage, used_memory = gather_virtual_memory_stats()
+        frame["memory"] = {
+            "available_memory": available_memory,
+            "memory_percent_usage": memory_percent_usage,
+            "used_memory": used_memory,
+        }
+    if "swap_memory" in families:
+        used_memory, free_memory, percent_usage = gather_swap_memory_stats()
+        frame["swap_memory"] = {"used_memory": used_memory, "free_memory": free_memory, "percent_usage": percent_usage}
+    if "io" in families:
+        frame["io"] = get_disk_io_counters()
+    if "disk_usage" in families:
+        # Through deadlines, so a hung mount can't stall sampling
+        usage, late = calls.disk_usage(DISK_USAGE_DEADLINE_SECONDS)
+        if usage is not None:
+            frame["disk_usage"] = usage
+        if late:
+            print(f"Disk usage skipped for: {', '.join(late)}")
+    return frame
+
+
+class RetryLater(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Rejected(Exception):
+    pass
+
+
+class Agent:
+    def __init__(self, server, token, host, interval, slow_interval, push_interval, batch_size, buffer_size, spool, timeout):
+        self.url = server.rstrip("/") + "/ingest"
+        self.token = token
+        self.host = host
+        self.interval = interval
+        self.slow_interval = slow_interval
+        self.push_interval = push_interval
+        self.batch_size = batch_size
+        self.spool = spool
+        self.timeout = timeout
+        # Frames carry local epoch timestamps; the skew is applied when sending
+        self.buffer = collections.deque(maxlen=buffer_size)
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.dropped = 0
+        # Server clock minus local clock, in seconds
+        self.offset = None
+        self.failures = 0
+        self.calls = DeadlineCalls()
+
+    def sample_forever(self):
+        # Ticks land on wall-clock multiples of interval, like the collector's
+        next_at = math.ceil(time.time() / self.interval) * self.interval
+        while not self.stop.wait(max(next_at - time.time(), 0)):
+            families = FAST_FAMILIES + (SLOW_FAMILIES if next_at % self.slow_interval == 0 else ())
+            try:
+                frame = sample_families(families, self.calls)
+            except Exception as e:
+                print(f"Sampling failed: {e}")
+            else:
+                frame["timestamp"] = next_at
+                with self.lock:
+                    if len(self.buffer) == self.buffer.maxlen:
+                        self.dropped += 1
+                    self.buffer.append(frame)
+            next_at += self.interval
+            if next_at < time.time():
+                # Asleep or suspended: resume on the next boundary rather than catching up
+                next_at = math.ceil(time.time() / self.interval) * self.interval
+
+    def observe_clock(self, sent, received, server_time):
+        # NTP-style: the server stamped its reply halfway through the round trip
+        measured = server_time - (sent + received) / 2
+        if self.offset is None:
+            self.offset = measured
+        else:
+            self.offset += SKEW_SMOOTHING * (measured - self.offset)
+
+    def push(self, frames):
+        offset = self.offset or 0.0
+        # Derived from the frames, so every retry of the same frames carries
+        # the same id and the server stores them once
+        batch_id = hashlib.blake2b(json.dumps([frame["timestamp"] for frame in frames]).encode(), digest_size=16).hexdigest()
+        body = gzip.compress(json.dumps({
+            "host": self.host,
+            "batch_id": batch_id,
+            "sent_at": time.time(),
+            "samples": [dict(frame, timestamp=frame["timestamp"] + offset) for frame in frames],
+        }).encode())
+        request = urllib.request.Request(self.url, data=body, method="POST", headers={
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+            "X-Ingest-Token": self.token,
+        })
+        sent = time.time()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                reply = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 429 or e.code >= 500:
+                retry_after = e.headers.get("Retry-After")
+                raise RetryLater(f"HTTP {e.code}", float(retry_after) if retry_after else None)
+            if e.code == 413:
+                raise Rejected("HTTP 413")
+            if e.code in (401, 403):
+                # Keep the data; the token may be fixed without restarting anything
+                raise RetryLater(f"HTTP {e.code}: check INGEST_TOKEN")
+            raise Rejected(f"HTTP {e.code}: {e.read()[:200]!r}")
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise RetryLater(str(e))
+        self.observe_clock(sent, time.time(), reply["server_time"])
+        return reply["accepted"]
+
+    def flush(self):
+        # Pushes buffered frames oldest first until the buffer is empty or the server says wait
+        limit = self.batch_size
+        # Frames at the head of the buffer that were part of a rejected batch.
+        # They go in halves until each is sent or dropped, then batches are full size again
+        suspect = 0
+        while not self.stop.is_set():
+            with self.lock:
+                frames = [self.buffer[i] for i in range(min(limit, len(self.buffer)))]
+            if not frames:
+                return
+            try:
+                self.push(frames)
+            except Rejected as e:
+                if len(frames) > 1:
+                    # Too large or malformed: retry in halves, down to the single bad frame
+                    suspect = max(suspect, len(frames))
+                    limit = max(len(frames) // 2, 1)
+                    print(f"Batch rejected ({e}), retrying with batches of {limit}")
+                    continue
+                print(f"Dropping a frame the server rejected: {e}")
+            sent = {id(frame) for frame in frames}
+            with self.lock:
+                while self.buffer and id(self.buffer[0]) in sent:
+                    self.buffer.popleft()
+            self.failures = 0
+            suspect = max(suspect - len(frames), 0)
+            if not suspect:
+                limit = self.batch_size
+
+    def backoff(self, error):
+        self.failures += 1
+        delay = error.retry_after or min(2 ** self.failures, MAX_BACKOFF_SECONDS)
+        # Jitter spreads out thousands of agents retrying after the same outage
+        return delay * random.uniform(0.5, 1.5)
+
+    def load_spool(self):
+        if not self.spool or not os.path.exists(self.spool):
+            return
+        try:
+            with gzip.open(self.spool, "rt") as f:
+                frames = json.load(f)
+            self.buffer.extend(frames)
+            os.remove(self.spool)
+            print(f"Loaded {len(frames)} spooled samples")
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable spool {self.spool}: {e}")
+
+    def save_spool(self):
+        if not self.spool or not self.buffer:
+            return
+        with gzip.open(self.spool, "wt") as f:
+            json.dump(list(self.buffer), f)
+        print(f"Spooled {len(self.buffer)} unsent samples to {self.spool}")
+
+    def run(self):
+        self.load_spool()
+        sampler = threading.Thread(target=self.sample_forever, name="agent-sampler", daemon=True)
+        sampler.start()
+
+        # An empty batch first: checks the token and measures the clock skew
+        # before any sample is sent
+        delay = 0
+        while not self.stop.wait(delay):
+            try:
+                self.push([])
+                self.failures = 0
+                print(f"Connected to {self.url}, clock offset {self.offset:+.3f}s")
+                break
+            except (RetryLater, Rejected) as e:
+                delay = self.backoff(e if isinstance(e, RetryLater) else RetryLater(str(e)))
+                print(f"Server unavailable ({e}), retrying in {delay:.1f}s")
+
+        delay = self.push_interval * random.uniform(0, 1)
+        while not self.stop.wait(delay):
+            try:
+                self.flush()
+                delay = self.push_interval * random.uniform(0.8, 1.2)
+            except RetryLater as e:
+                delay = self.backoff(e)
+                print(f"Push failed ({e}), {len(self.buffer)} samples buffered, retrying in {delay:.1f}s")
+            if self.dropped:
+                print(f"Buffer full: dropped {self.dropped} oldest samples")
+                self.dropped = 0
+
+        sampler.join(timeout=self.interval)
+        self.save_spool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sample this host and push metrics to a central Web Specs backend")
+    parser.add_argument("--server", default=os.getenv("AGENT_SERVER"), help="backend base URL (default $AGENT_SERVER)")
+    parser.add_argument("--token", default=os.getenv("INGEST_TOKEN"), help="ingest token (default $INGEST_TOKEN)")
+    parser.add_argument("--host", default=os.getenv("HOST_NAME") or socket.gethostname())
+    parser.add_argument("--interval", type=int, default=5, help="seconds between CPU, memory and IO samples")
+    parser.add_argument("--slow-interval", type=int, default=60, help="seconds between swap and disk usage samples")
+    parser.add_argument("--push-interval", type=float, default=30, help="seconds between pushes")
+    parser.add_argument("--batch-size", type=int, default=500, help="samples per request")
+    parser.add_argument("--buffer-size", type=int, default=17280, help="samples kept while the server is unreachable")
+    parser.add_argument("--spool", default="agent_spool.json.gz", help="where unsent samples are kept across restarts ('' to disable)")
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+    if not args.server or not args.token:
+        parser.error("--server and --token (or AGENT_SERVER and INGEST_TOKEN) are required")
+    if args.slow_interval % args.interval:
+        parser.error("--slow-interval must be a multiple of --interval")
+
+    agent = Agent(args.server, args.token, args.host, args.interval, args.slow_interval,
+                  args.push_interval, args.batch_size, args.buffer_size, args.spool, args.timeout)
+    signal.signal(signal.SIGTERM, lambda *_: agent.stop.set())
+    try:
+        agent.run()
+    except KeyboardInterrupt:
+        agent.stop.set()
+        agent.save_spool()
+    # Interpreter exit joins pool threads, and one stuck on a hung mount never returns
+    if any(not future.done() for future in agent.calls.in_flight.values()):
+        sys.stdout.flush()
+        os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
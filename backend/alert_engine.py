@@ -0,0 +1,178 @@
+from datetime import datetime
+
+from live_info import HOST_NAME, get_db_connection
+
+DEFAULT_ALERT_RULE = {"for_seconds": 30, "clear_margin": 5}
+# Families are sampled at their own rates, so a tick only carries readings
+# for some of them. Lapses are counted in each family's sampling interval:
+# a pending timer survives this many intervals without a reading...
+PENDING_GRACE_SAMPLES = 2
+# ...and an open incident (rule removed from the config, device gone) is
+# closed after this many
+STALE_INCIDENT_SAMPLES = 5
+# For families the caller gave no interval for, e.g. before the first tick
+DEFAULT_FAMILY_INTERVAL = 60
+# An incident's peak_value is its highest value, or for anomalies the value
+# observed at its highest score, whichever way that value moved
+PEAK_VALUE = """CASE WHEN {reading}.score IS NULL THEN GREATEST({incident}.peak_value, {reading}.value)
+    WHEN {reading}.score > {incident}.peak_score THEN {reading}.value
+    ELSE {incident}.peak_value END"""
+
+
+def family_of(component):
+    # Threshold components are "<section>-...", anomalies "anomaly-<section>-..."
+    return component.removeprefix("anomaly-").split("-", 1)[0]
+
+
+class AlertEngine:
+    def __init__(self, host=HOST_NAME):
+        self.host = host
+        # component -> when it first crossed its fire threshold
+        self.pending = {}
+        # component -> alerts.id of its open incident, loaded on first use
+        self.open = None
+        # component -> when it last had a reading
+        self.seen_at = {}
+        # family -> seconds between its samples, as last reported
+        self.intervals = {}
+        # Set by resync(); the next process() starts over from the table
+        self.stale = False
+
+    def resync(self):
+        # After regaining the collector lease: another replica may have opened
+        # or closed incidents meanwhile, so reload them on the next tick and
+        # drop timers from the previous term. A flag rather than clearing
+        # open here, since process() may be running on the ingest thread
+        self.stale = True
+
+    def _load_open(self, cursor):
+        cursor.execute("SELECT id, component FROM alerts WHERE host = %s AND closed_at IS NULL", (self.host,))
+        self.open = {component: alert_id for alert_id, component in cursor.fetchall()}
+
+    def _lapsed(self, component, now, samples):
+        interval = self.intervals.get(family_of(component), DEFAULT_FAMILY_INTERVAL)
+        seen_at = self.seen_at.setdefault(component, now)
+        return (now - seen_at).total_seconds() > samples * interval
+
+    def process(self, readings, now=None, intervals=None):
+        # readings: (component, value, fire, clear, for_seconds) for the rules
+        # whose family was sampled this tick. Anomaly readings add a score
+        # (component, value, fire, clear, for_seconds, score): fire and clear
+        # apply to the score, and value is stored as the observed value.
+        # intervals: family -> seconds between its samples right now (the
+        # collector's effective intervals)
+        now = now or datetime.now()
+        if intervals:
+            self.intervals.update(intervals)
+        to_open = []
+        to_update = []
+        to_close = []
+
+        if self.stale:
+            self.stale = False
+            self.open = None
+            self.pending = {}
+            self.seen_at = {}
+        if self.open is None:
+            conn = get_db_connection()
+            if conn is None:
+                # Skip the tick; the next one tries to load again
+                return
+            try:
+                with conn.cursor() as cursor:
+                    self._load_open(cursor)
+            finally:
+                conn.close()
+
+        for component, *_ in readings:
+            self.seen_at[component] = now
+        self.pending = {
+            component: since for component, since in self.pending.items()
+            if not self._lapsed(component, now, PENDING_GRACE_SAMPLES)
+        }
+        to_expire = [
+            alert_id for component, alert_id in self.open.items()
+            if self._lapsed(component, now, STALE_INCIDENT_SAMPLES)
+        ]
+
+        for component, value, fire, clear, for_seconds, *score in readings:
+            score = score[0] if score else None
+            level = value if score is None else score
+            alert_id = self.open.get(component)
+            if level >= fire:
+                if alert_id is not None:
+                    to_update.append((alert_id, value, score, now))
+                    continue
+                since = self.pending.setdefault(component, now)
+                if (now - since).total_seconds() >= for_seconds:
+                    to_open.append((self.host, now, component, value, fire, False, now, value, score, score))
+            else:
+                self.pending.pop(component, None)
+                if alert_id is None:
+                    continue
+                if level <= clear:
+                    to_close.append(alert_id)
+                else:
+                    to_update.append((alert_id, value, score, now))
+
+        if not (to_open or to_update or to_close or to_expire):
+            return
+
+        from psycopg2.extras import execute_values
+        conn = get_db_connection()
+        if conn is None:
+            return
+        try:
+            with conn.cursor() as cursor:
+                if to_open:
+                    opened = execute_values(
+                        cursor,
+                        f"""INSERT INTO alerts (host, timestamp, component, value, threshold_value, sent, last_seen,
+                            peak_value, score, peak_score)
+                        VALUES %s
+                        ON CONFLICT (host, component) WHERE closed_at IS NULL
+                        DO UPDATE SET value = EXCLUDED.value, last_seen = EXCLUDED.last_seen, score = EXCLUDED.score,
+                            peak_value = {PEAK_VALUE.format(incident="alerts", reading="EXCLUDED")},
+                            peak_score = GREATEST(alerts.peak_score, EXCLUDED.score)
+                        RETURNING id, component""",
+                        to_open,
+                        fetch=True
+                    )
+                if to_update:
+                    execute_values(
+                        cursor,
+                        f"""UPDATE alerts AS a
+                        SET value = v.value, last_seen = v.last_seen, score = v.score,
+                            peak_value = {PEAK_VALUE.format(incident="a", reading="v")},
+                            peak_score = GREATEST(a.peak_score, v.score)
+                        FROM (VALUES %s) AS v(id, value, score, last_seen)
+                        WHERE a.id = v.id""",
+                        to_update,
+                        template="(%s, %s, %s::double precision, %s)"
+                    )
+                if to_close:
+                    cursor.execute(
+                        "UPDATE alerts SET closed_at = %s, last_seen = %s WHERE id = ANY(%s)",
+                        (now, now, to_close)
+                    )
+                if to_expire:
+                    # last_seen stays at the last reading
+                    cursor.execute("UPDATE alerts SET closed_at = %s WHERE id = ANY(%s)", (now, to_expire))
+            conn.commit()
+        except Exception as e:
+            print(f"Error recording alerts: {e}")
+            conn.rollback()
+            # Resync from the table rather than trust the in-memory view
+            self.open = None
+            return
+        finally:
+            conn.close()
+
+        for alert_id, component in (opened if to_open else []):
+            self.open[component] = alert_id
+            self.pending.pop(component, None)
+        closed = set(to_close) | set(to_expire)
+        self.open = {component: alert_id for component, alert_id in self.open.items() if alert_id not in closed}
+
+
+engine = AlertEngine()
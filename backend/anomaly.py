@@ -0,0 +1,175 @@
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+ANOMALY_STATE_PATH = os.path.join("anomaly_state.json")
+ANOMALY_SAVE_SECONDS = 300
+# Weight of each new sample in the running mean/variance (~ last 1/alpha samples)
+EWMA_ALPHA = 0.01
+# Samples a baseline needs before it can flag anything
+WARMUP_SAMPLES = 100
+# Deviation in standard deviations that opens an anomaly, and that closes it
+Z_FIRE = 4.0
+Z_CLEAR = 2.0
+ANOMALY_FOR_SECONDS = 15
+# Per hour-of-week baselines on top of the global one, for daily/weekly cycles
+ANOMALY_SEASONAL = os.getenv("ANOMALY_SEASONAL", "0") == "1"
+HOURS_PER_WEEK = 168
+
+# Which way a series has to move from its baseline to be flagged, as a
+# z-score -> deviation in that direction
+DIRECTIONS = {
+    "high": lambda z: z,
+    "low": lambda z: -z,
+    "both": abs,
+}
+# Leaves are tracked when any key on their path is listed for their section,
+# with the direction they're flagged in. Utilisation, loss and latency only
+# matter when they rise. io byte counters are cumulative and are tracked as
+# per-second rates
+TRACKED_FIELDS = {
+    "cpu": {"percent": "high"},
+    "memory": {"memory_percent_usage": "high"},
+    "swap_memory": {"percent_usage": "high"},
+    "disk_usage": {"percent": "high"},
+    "io": {"read_bytes": "both", "write_bytes": "both"},
+    "gpu": {"gpu_utilization": "high", "memory_percent": "high", "temperature": "both"},
+    "latency": {"avg_ms": "high", "loss_percent": "high"},
+}
+RATE_SECTIONS = {"io"}
+
+
+def _override_directions(spec):
+    # ANOMALY_DIRECTIONS="io.write_bytes=high,gpu.temperature=high"
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        path, _, direction = item.partition("=")
+        section, _, field = path.partition(".")
+        if field not in TRACKED_FIELDS.get(section, {}) or direction not in DIRECTIONS:
+            raise ValueError(f"Invalid ANOMALY_DIRECTIONS entry {item!r}. Use <section>.<field>=high|low|both.")
+        TRACKED_FIELDS[section][field] = direction
+
+_override_directions(os.getenv("ANOMALY_DIRECTIONS", ""))
+
+
+def _update(stats, value):
+    # stats is [count, mean, variance]; exponentially weighted, O(1) per sample
+    if stats[0] == 0:
+        stats[1] = value
+        stats[2] = 0.0
+    else:
+        diff = value - stats[1]
+        increment = EWMA_ALPHA * diff
+        stats[1] += increment
+        stats[2] = (1 - EWMA_ALPHA) * (stats[2] + diff * increment)
+    stats[0] += 1
+
+
+def _zscore(stats, value):
+    if stats[0] < WARMUP_SAMPLES:
+        return None
+    # Signed; floor the deviation so perfectly flat series don't flag on tiny wiggles
+    std = max(math.sqrt(stats[2]), abs(stats[1]) * 0.01, 0.5)
+    return (value - stats[1]) / std
+
+def _tracked_series(snapshot):
+    # (section, key, value, direction) for every tracked leaf
+    for section, fields in TRACKED_FIELDS.items():
+        for field, direction in fields.items():
+            for _, series in snapshot.series({section: (field,)}):
+                for key, value in series:
+                    yield section, key, value, direction
+
+
+class AnomalyDetector:
+    def __init__(self, path=ANOMALY_STATE_PATH, seasonal=ANOMALY_SEASONAL):
+        self.path = path
+        self.seasonal = seasonal
+        # key -> [count, mean, variance]
+        self.baselines = {}
+        # key -> HOURS_PER_WEEK lists of [count, mean, variance], filled on demand
+        self.seasonal_baselines = {}
+        # key -> (counter value, epoch seconds) for rate sections
+        self.counters = {}
+        self.saved_at = time.monotonic()
+        # observe runs on the ingest thread, save also at exit
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+            self.baselines = state.get("baselines", {})
+            self.seasonal_baselines = state.get("seasonal", {})
+        except (OSError, ValueError) as e:
+            print(f"Error loading anomaly state: {e}")
+
+    def save(self):
+        # Written whole to a temp file and renamed over the old state, so a
+        # crash mid-save never leaves a truncated file behind
+        tmp_path = f"{self.path}.tmp"
+        with self.lock:
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump({"baselines": self.baselines, "seasonal": self.seasonal_baselines}, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Error saving anomaly state: {e}")
+            self.saved_at = time.monotonic()
+
+    def _observe(self, key, value, hour_of_week):
+        baseline = self.baselines.setdefault(key, [0, 0.0, 0.0])
+        score = _zscore(baseline, value)
+        if self.seasonal:
+            slots = self.seasonal_baselines.setdefault(key, [None] * HOURS_PER_WEEK)
+            if slots[hour_of_week] is None:
+                slots[hour_of_week] = [0, 0.0, 0.0]
+            seasonal_score = _zscore(slots[hour_of_week], value)
+            if seasonal_score is not None:
+                score = seasonal_score
+            _update(slots[hour_of_week], value)
+        _update(baseline, value)
+        return score
+
+    def observe(self, snapshot, now=None):
+        # Returns alert engine readings: (component, observed value, fire,
+        # clear, for_seconds, score), where score is the z-score in the
+        # field's direction and is what fire and clear apply to
+        now = now or datetime.now()
+        epoch = now.timestamp()
+        hour_of_week = now.weekday() * 24 + now.hour
+        readings = []
+        with self.lock:
+            for section, key, value, direction in _tracked_series(snapshot):
+                if section in RATE_SECTIONS:
+                    previous = self.counters.get(key)
+                    self.counters[key] = (value, epoch)
+                    if previous is None or epoch <= previous[1] or value < previous[0]:
+                        continue
+                    value = (value - previous[0]) / (epoch - previous[1])
+                z = self._observe(key, value, hour_of_week)
+                if z is not None:
+                    score = round(DIRECTIONS[direction](z), 2)
+                    readings.append((f"anomaly-{key}", value, Z_FIRE, Z_CLEAR, ANOMALY_FOR_SECONDS, score))
+
+        if time.monotonic() - self.saved_at >= ANOMALY_SAVE_SECONDS:
+            self.save()
+        return readings
+
+
+detector = None
+
+def get_detector():
+    global detector
+    if detector is None:
+        detector = AnomalyDetector()
+        atexit.register(detector.save)
+    return detector
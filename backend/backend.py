@@ -1,42 +1,87 @@
-from fastapi import FastAPI, WebSocket, Request
+from fastapi import FastAPI, WebSocket, Request, Response, Header, Depends
 from fastapi.responses import JSONResponse as jsonify
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
-import psutil
 import json
-from config import generate_notif_settings, update_settings, setup_email_config, check_thresholds
-
-from ping3 import ping
-import ifcfg 
-import platform
-import pynvml
-import pyadl
-import subprocess
-import psycopg2
+from contextlib import asynccontextmanager
+from config import generate_notif_settings, update_settings, setup_email_config, check_thresholds, get_notif_config
+from alert_engine import engine
+
 import os
 import datetime
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-import smtplib
-from email.message import EmailMessage
+from mailer import mailer
 
 from live_info import (
+    HOST_NAME,
     get_db_connection,
-    get_gpu_stats,
-    get_ping,
-    gather_cpu_times,
-    gather_cpu_percents,
-    gather_virtual_memory_stats,
-    gather_swap_memory_stats,
-    get_disk_usage,
-    get_disk_io_counters,
+    log_batch,
     log_data,
+    prune_ingest_batches,
+)
+from collector import Collector
+from exposition import OPENMETRICS_CONTENT_TYPE, metrics_cache
+from instrumentation import StatsMiddleware, instrument, stats, timed
+from query_guard import QueryGuardMiddleware, reads_rollups
+from profiling import ADMIN_TOKEN, DEFAULT_SAMPLE_INTERVAL, ProfileBusy, profiler
+from remote_ingest import (
+    INGEST_DEDUPE_DAYS,
+    INGEST_MAX_CONCURRENCY,
+    INGEST_RETRY_AFTER_SECONDS,
+    INGEST_TOKEN,
+    MAX_BATCH_BYTES,
+    BatchError,
+    decode_batch,
 )
+import hmac
 
-from static_info import system_info
+from static_info import system_info, start_refresher, stop_refresher
+from rollups import HOST_AGGREGATES, ROLLUP_INTERVAL_MINUTES, ROLLUP_QUERIES, fleet_timeseries, fleet_top, list_hosts, range_points, refresh_rollups
+from ranges import RangeError, parse_instant, parse_range, parse_window
+from point_in_time import SNAPSHOT_TOLERANCE_SECONDS, snapshot_at
+from schema import IDS_RECHECK_SECONDS, check_ids, ensure_schema, ids_widened, schema_applied
 from collections import defaultdict
+from leader import (
+    COLLECTOR_LEASE,
+    DIGEST_LEASE,
+    HEARTBEAT_SECONDS,
+    ROLLUP_LEASE,
+    heartbeat_all,
+    is_leader,
+    lease,
+    leader_only,
+)
+
+def start_scheduler():
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    scheduler = AsyncIOScheduler()
+    scheduler.add_job(instrument("job", "heartbeat")(heartbeat_all), 'interval', seconds=HEARTBEAT_SECONDS, next_run_time=datetime.datetime.now(), max_instances=1, coalesce=True)
+    scheduler.add_job(send_out_emails, 'interval', hours=1)
+    scheduler.add_job(roll_up_hosts, 'interval', minutes=ROLLUP_INTERVAL_MINUTES, max_instances=1, coalesce=True)
+    scheduler.add_job(forget_ingest_batches, 'interval', hours=1, max_instances=1, coalesce=True)
+    scheduler.start()
+    return scheduler
+
+@asynccontextmanager
+async def lifespan(app):
+    # Everything starts here, so importing this module does no work; shutdown
+    # stops it in reverse order
+    await asyncio.to_thread(ensure_schema)
+    scheduler = start_scheduler()
+    # One collector per process feeds every WebSocket client and ingestion
+    collector.start()
+    # Probes once up front, then keeps the inventory fresh in the background
+    await asyncio.to_thread(start_refresher)
+    try:
+        yield
+    finally:
+        stop_refresher()
+        await collector.stop()
+        scheduler.shutdown(wait=False)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
+# Innermost, so its 429s still get CORS headers
+app.add_middleware(QueryGuardMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -44,67 +89,191 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(StatsMiddleware)
 
-async def send_out_emails():
-    with smtplib.SMTP('smtp.gmail.com', 587) as smtp:
-        config_path = os.path.join("email_config.json")
-        
-        if os.path.exists(config_path):
-            with open(config_path, "r") as f:
-                email_config = json.load(f)
-        else:
-            return
-        
-        conn = get_db_connection()
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT email FROM email_subscriptions")
-            data = cursor.fetchall()
-            emails = [row[0] for row in data]
-            msg = EmailMessage()
-            msg['Subject'] = f"Web Specs Log - Past Hour: {datetime.datetime.now()}"
-            msg['From'] = email_config['sender_email']
-            msg['To'] = ','.join(emails)
+# Hourly digests a subscriber can miss in a row before the alerts held back
+# for them are dropped
+MAX_DIGEST_ATTEMPTS = 24
 
-            cursor.execute("""
-                UPDATE alerts
-                SET sent = TRUE
-                WHERE timestamp >= NOW() - INTERVAL '1 hour'
-            """)
-            conn.commit()
+def load_digest():
+    # -> (subscribers as (email, alert ids their failed digests held), unsent
+    # alert rows, rows of held alerts that have since been sent to others)
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT email, failed_alert_ids FROM email_subscriptions")
+            subscribers = cursor.fetchall()
 
+            # Served by the alerts_unsent_idx partial index
             cursor.execute("""
-                SELECT component, timestamp, value, threshold_value
+                SELECT id, host, component, timestamp, value, peak_value, threshold_value, closed_at, peak_score
                 FROM alerts
-                WHERE timestamp >= NOW() - INTERVAL '1 hour'
+                WHERE sent = false
                 ORDER BY timestamp DESC
             """)
             alerts = cursor.fetchall()
-            if alerts:
-
-                grouped = defaultdict(list)
-                for row in alerts:
-                    component, timestamp, value, threshold = row
-                    grouped[component].append(
-                        f"[{timestamp.strftime('%Y-%m-%d %H:%M:%S')}] Value={value}, Threshold={threshold}"
-                    )
-                # Build message content
-                alert_lines = []
-                for component, entries in grouped.items():
-                    alert_lines.append(f"{component}:")
-                    alert_lines.extend(entries)
-                    alert_lines.append("") 
-                msg.set_content('\n'.join(alert_lines))
-
-                smtp.starttls()
-                smtp.login(email_config['sender_email'], email_config['app_password'])
-                smtp.send_message(msg)
-            
-            else:
-                return
 
-scheduler = AsyncIOScheduler()
-scheduler.add_job(send_out_emails, 'interval', hours=1)
-scheduler.start()
+            held = set().union(*(ids for _, ids in subscribers)) - {row[0] for row in alerts}
+            earlier = []
+            if held:
+                cursor.execute("""
+                    SELECT id, host, component, timestamp, value, peak_value, threshold_value, closed_at, peak_score
+                    FROM alerts
+                    WHERE id = ANY(%s)
+                """, (list(held),))
+                earlier = cursor.fetchall()
+        return subscribers, alerts, earlier
+    finally:
+        conn.close()
+
+def record_digest(alert_ids, delivered, failed):
+    # Every unsent alert is marked sent once each subscriber either got it or
+    # holds it in failed_alert_ids; failed maps email -> alert ids it missed
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("UPDATE alerts SET sent = TRUE WHERE id = ANY(%s)", (alert_ids,))
+            cursor.execute(
+                "UPDATE email_subscriptions SET failed_alert_ids = '{}', digest_failures = 0 WHERE email = ANY(%s)",
+                (delivered,)
+            )
+            for email, ids in failed.items():
+                cursor.execute(
+                    "UPDATE email_subscriptions SET failed_alert_ids = %s, digest_failures = digest_failures + 1 WHERE email = %s",
+                    (sorted(ids), email)
+                )
+            cursor.execute(
+                """UPDATE email_subscriptions SET failed_alert_ids = '{}', digest_failures = 0
+                WHERE digest_failures >= %s RETURNING email""",
+                (MAX_DIGEST_ATTEMPTS,)
+            )
+            dropped = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+    finally:
+        conn.close()
+    if dropped:
+        print(f"Dropping held alerts after {MAX_DIGEST_ATTEMPTS} failed digests for: {dropped}")
+
+def format_digest(alerts):
+    grouped = defaultdict(list)
+    for row in sorted(alerts, key=lambda row: row[3], reverse=True):
+        alert_id, host, component, timestamp, value, peak, threshold, closed_at, peak_score = row
+        status = f"resolved {closed_at.strftime('%Y-%m-%d %H:%M:%S')}" if closed_at else "ongoing"
+        # Anomaly thresholds are in standard deviations, not the value's units
+        detail = f"Threshold={threshold}" if peak_score is None else f"Peak z-score={peak_score}, Threshold z-score={threshold}"
+        grouped[f"{component} ({host})"].append(
+            f"[{timestamp.strftime('%Y-%m-%d %H:%M:%S')}] Value={value}, Peak={peak}, {detail} ({status})"
+        )
+    # Build message content
+    alert_lines = []
+    for component, entries in grouped.items():
+        alert_lines.append(f"{component}:")
+        alert_lines.extend(entries)
+        alert_lines.append("")
+    return '\n'.join(alert_lines)
+
+@instrument("job", "digest")
+@leader_only(DIGEST_LEASE)
+async def send_out_emails():
+    config_path = os.path.join("email_config.json")
+
+    if os.path.exists(config_path):
+        with open(config_path, "r") as f:
+            email_config = json.load(f)
+    else:
+        return
+
+    subscribers, alerts, earlier = await asyncio.to_thread(load_digest)
+    if not subscribers or not (alerts or earlier):
+        return
+
+    # Delivery is tracked per subscriber: one whose earlier digest failed gets
+    # those alerts again along with the new ones. Subscribers owed the same
+    # alerts share one rendered digest
+    rows = {row[0]: row for row in [*earlier, *alerts]}
+    unsent = {row[0] for row in alerts}
+    recipients = defaultdict(list)
+    for email, held in subscribers:
+        ids = frozenset(unsent | {alert_id for alert_id in held if alert_id in rows})
+        if ids:
+            recipients[ids].append(email)
+
+    subject = f"Web Specs Log - Past Hour: {datetime.datetime.now()}"
+    done, failed = [], {}
+    for ids, emails in recipients.items():
+        delivered, refused, missed = await mailer.send_digest(
+            email_config['sender_email'],
+            email_config['app_password'],
+            emails,
+            subject,
+            format_digest([rows[alert_id] for alert_id in ids])
+        )
+        if refused:
+            print(f"Recipients refused by SMTP server: {refused}")
+        # Refused addresses are permanent rejections, retrying them won't help
+        done.extend(delivered + refused)
+        failed.update({email: ids for email in missed})
+    if failed:
+        print(f"Digest delivery failed for {len(failed)} of {len(subscribers)} subscribers, retrying next hour")
+    await asyncio.to_thread(record_digest, sorted(unsent), done, failed)
+
+@instrument("job", "rollup")
+@leader_only(ROLLUP_LEASE)
+async def roll_up_hosts():
+    await asyncio.to_thread(refresh_rollups)
+
+@instrument("job", "forget_ingest_batches")
+@leader_only(ROLLUP_LEASE)
+async def forget_ingest_batches():
+    await asyncio.to_thread(prune_ingest_batches, INGEST_DEDUPE_DAYS)
+
+def ingest(snapshot, timestamp):
+    with timed("ingest", "generate_notif_settings"):
+        generate_notif_settings(snapshot)
+
+    # Only one replica per monitored host writes history and alerts
+    if is_leader(COLLECTOR_LEASE):
+        with timed("ingest", "log_data"):
+            log_data(snapshot, timestamp)
+        with timed("ingest", "check_thresholds"):
+            check_thresholds(snapshot, timestamp, collector.effective_intervals())
+
+# Incidents may have changed while another replica held the lease
+lease(COLLECTOR_LEASE).on_acquire.append(engine.resync)
+collector = Collector(ingest=ingest)
+
+# Pushed batches in flight at once; beyond this agents get 429 and retry
+ingest_slots = asyncio.Semaphore(INGEST_MAX_CONCURRENCY)
+
+class HistoryScope:
+    # What a history route reads: one host (this machine unless ?host= names
+    # another) and, when the client sent start/end, an explicit window that
+    # replaces the route's fixed one. time_range is set on timeseries routes
+    # given a start, with the step to bucket by
+    def __init__(self, host, window=None, time_range=None):
+        self.host = host or HOST_NAME
+        self.window = window if time_range is None else (time_range.start, time_range.end)
+        self.time_range = time_range
+
+    def where(self, time_query):
+        # -> (WHERE clause, params); host and timestamp together match the
+        # (host, timestamp) index
+        params = []
+        if self.window is not None:
+            time_query, params = "WHERE timestamp >= %s AND timestamp < %s", list(self.window)
+        time_query = f"{time_query} AND host = %s" if time_query else "WHERE host = %s"
+        return time_query, params + [self.host]
+
+# Route dependencies; a RangeError from either becomes a 400 (see range_error)
+def history_window(host: str = None, start: str = None, end: str = None):
+    return HistoryScope(host, window=parse_window(start, end))
+
+def history_range(host: str = None, start: str = None, end: str = None, step: str = None):
+    return HistoryScope(host, time_range=parse_range(start, end, step))
+
+@app.exception_handler(RangeError)
+async def range_error(request: Request, e: RangeError):
+    return jsonify({"error": str(e)}, status_code=400)
 
 '''
 PLANS:
@@ -127,8 +296,118 @@ PLANS:
 def static_info():
     return jsonify({"static-info": system_info()}), 200
 
+@app.get("/collector/status")
+def collector_status():
+    return collector.status()
+
+@app.get("/internal/stats")
+def internal_stats():
+    return stats.report()
+
+@app.post("/admin/profile")
+async def admin_profile(seconds: float = 10, interval: float = DEFAULT_SAMPLE_INTERVAL, allocations: bool = False,
+                        format: str = 'json', x_admin_token: str = Header(default="")):
+    # Real status codes here: callers and proxies must see a refused capture as one
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Profiling is disabled. Set ADMIN_TOKEN to enable it."}, status_code=403)
+    if not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        return jsonify({"error": "Invalid admin token"}, status_code=401)
+    if format not in ('json', 'collapsed'):
+        return jsonify({"error": "Invalid format parameter. Use 'json' or 'collapsed'."}, status_code=400)
+    if seconds <= 0 or interval <= 0:
+        return jsonify({"error": "seconds and interval must be positive"}, status_code=400)
+
+    try:
+        profile = await asyncio.to_thread(profiler.capture, seconds, interval, allocations)
+    except ProfileBusy as e:
+        return jsonify({"error": str(e)}, status_code=409)
+
+    stamp = datetime.datetime.fromtimestamp(profile["started_at"]).strftime("%Y%m%d-%H%M%S")
+    if format == 'collapsed':
+        return Response(
+            content=profile["collapsed"] + "\n",
+            media_type="text/plain",
+            headers={"Content-Disposition": f'attachment; filename="profile-{stamp}.collapsed"'},
+        )
+    return Response(
+        content=json.dumps(profile),
+        media_type="application/json",
+        headers={"Content-Disposition": f'attachment; filename="profile-{stamp}.json"'},
+    )
+
+@app.get("/metrics")
+async def metrics():
+    # Served from memory on the event loop; no database round trip per scrape
+    if collector.latest is None:
+        return Response(status_code=503)
+    return Response(content=metrics_cache.render(collector.latest), media_type=OPENMETRICS_CONTENT_TYPE)
+
+@app.post("/ingest")
+async def ingest_batch(request: Request, x_ingest_token: str = Header(default=""), content_encoding: str = Header(default="")):
+    # Real status codes here: agents retry on 429 and 5xx and drop a batch on any other 4xx
+    if not INGEST_TOKEN:
+        return jsonify({"error": "Ingestion is disabled. Set INGEST_TOKEN to enable it."}, status_code=403)
+    if not hmac.compare_digest(x_ingest_token.encode(), INGEST_TOKEN.encode()):
+        return jsonify({"error": "Invalid ingest token"}, status_code=401)
+    try:
+        content_length = int(request.headers.get("content-length") or 0)
+    except ValueError:
+        stats.incr("ingest", "batches_rejected")
+        return jsonify({"error": "Malformed Content-Length header"}, status_code=400)
+    if content_length > MAX_BATCH_BYTES:
+        return jsonify({"error": f"Batch is larger than {MAX_BATCH_BYTES} bytes"}, status_code=413)
+    # If startup couldn't apply the schema, the next batch tries again
+    if not schema_applied.is_set() and not await asyncio.to_thread(ensure_schema):
+        return jsonify(
+            {"error": "Schema is not applied yet, retry later"},
+            status_code=503,
+            headers={"Retry-After": str(INGEST_RETRY_AFTER_SECONDS)},
+        )
+    # Nothing is stored before the ids are bigint, which takes an explicit
+    # `python schema.py --widen-ids` on databases created with integer ids
+    if not ids_widened.is_set() and not await asyncio.to_thread(check_ids):
+        return jsonify(
+            {"error": "Ids are not widened to bigint yet, retry later"},
+            status_code=503,
+            headers={"Retry-After": str(IDS_RECHECK_SECONDS)},
+        )
+
+    # Admission control: when every slot is busy the batch is refused at once
+    # instead of queueing behind the database, and stays buffered on the agent
+    if ingest_slots.locked():
+        stats.incr("ingest", "batches_refused")
+        return jsonify(
+            {"error": "Ingestion is at capacity, retry later"},
+            status_code=429,
+            headers={"Retry-After": str(INGEST_RETRY_AFTER_SECONDS)},
+        )
+
+    async with ingest_slots:
+        body = await request.body()
+        try:
+            host, batch_id, samples = await asyncio.to_thread(decode_batch, body, content_encoding)
+        except BatchError as e:
+            stats.incr("ingest", "batches_rejected")
+            return jsonify({"error": str(e)}, status_code=400)
+
+        if samples:
+            try:
+                with timed("ingest", "remote_batch"):
+                    stored = await asyncio.to_thread(log_batch, host, samples, batch_id)
+            except Exception as e:
+                print(f"Error storing batch from {host}: {e}")
+                return jsonify({"error": "Unable to store batch, retry later"}, status_code=503)
+            if stored:
+                stats.incr("ingest", "remote_samples", len(samples))
+            else:
+                # A retry of a batch already stored: acknowledge it so the agent moves on
+                stats.incr("ingest", "batches_duplicate")
+
+    # server_time lets the agent measure and correct its clock skew
+    return {"accepted": len(samples), "server_time": datetime.datetime.now().timestamp()}
+
 @app.get("/memory/percent/distribution")
-def memory_percent_dist(time: str = 'hour'):
+def memory_percent_dist(time: str = 'hour', scope: HistoryScope = Depends(history_window)):
     try:
         # Map time param to interval
         intervals = {
@@ -142,9 +421,10 @@ def memory_percent_dist(time: str = 'hour'):
             return jsonify({"error": "Invalid time parameter. Use 'hour', 'day', 'month', 'year', or 'overall'."}), 400
 
         time_query = intervals[time]
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            cursor.execute(f"SELECT memory_percent_usage FROM memory_metrics {time_query}")
+            cursor.execute(f"SELECT memory_percent_usage FROM memory_metrics {time_query}", params)
             data = cursor.fetchall()
             values = [float(row[0]) for row in data]
             return jsonify({"memory_percent_distribution": values})
@@ -152,7 +432,7 @@ def memory_percent_dist(time: str = 'hour'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/swap_memory/percent/distribution")
-def swap_memory_percent_dist(time: str = 'hour'):
+def swap_memory_percent_dist(time: str = 'hour', scope: HistoryScope = Depends(history_window)):
     try:
         intervals = {
             'hour': "WHERE timestamp >= NOW() - INTERVAL '1 hour'",
@@ -165,9 +445,10 @@ def swap_memory_percent_dist(time: str = 'hour'):
             return jsonify({"error": "Invalid time parameter. Use 'hour', 'day', 'month', 'year', or 'overall'."}), 400
 
         time_query = intervals[time]
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            cursor.execute(f"SELECT percent_usage FROM swap_memory_metrics {time_query}")
+            cursor.execute(f"SELECT percent_usage FROM swap_memory_metrics {time_query}", params)
             data = cursor.fetchall()
             values = [float(row[0]) for row in data]
             return jsonify({"swap_memory_percent_distribution": values})
@@ -175,7 +456,7 @@ def swap_memory_percent_dist(time: str = 'hour'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/cpu/percent/distribution")
-def cpu_percent_dist(time: str = 'hour'):
+def cpu_percent_dist(time: str = 'hour', scope: HistoryScope = Depends(history_window)):
     try:
         intervals = {
             'hour': "WHERE timestamp >= NOW() - INTERVAL '1 hour'",
@@ -188,16 +469,17 @@ def cpu_percent_dist(time: str = 'hour'):
             return jsonify({"error": "Invalid time parameter. Use 'hour', 'day', 'month', 'year', or 'overall'."}), 400
 
         time_query = intervals[time]
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            cursor.execute(f"SELECT AVG(percent_usage) FROM cpu_metrics {time_query} GROUP BY timestamp")
+            cursor.execute(f"SELECT AVG(percent_usage) FROM cpu_metrics {time_query} GROUP BY timestamp", params)
             data = cursor.fetchall()
             return jsonify({"cpu_percent_distribution": [float(row[0]) for row in data]})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.get("/io/read/bytes/distribution")
-def io_read_bytes_dist(time: str = 'hour'):
+def io_read_bytes_dist(time: str = 'hour', scope: HistoryScope = Depends(history_window)):
     try:
         intervals = {
             'hour': "WHERE timestamp >= NOW() - INTERVAL '1 hour'",
@@ -210,9 +492,10 @@ def io_read_bytes_dist(time: str = 'hour'):
             return jsonify({"error": "Invalid time parameter. Use 'hour', 'day', 'month', 'year', or 'overall'."}), 400
 
         time_query = intervals[time]
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            cursor.execute(f"SELECT device_name, read_bytes FROM disk_io_metrics {time_query}")
+            cursor.execute(f"SELECT device_name, read_bytes FROM disk_io_metrics {time_query}", params)
             data = cursor.fetchall()
             dist = {}
             for device, value in data:
@@ -222,7 +505,7 @@ def io_read_bytes_dist(time: str = 'hour'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/io/write/bytes/distribution")
-def io_write_bytes_dist(time: str = 'hour'):
+def io_write_bytes_dist(time: str = 'hour', scope: HistoryScope = Depends(history_window)):
     try:
         intervals = {
             'hour': "WHERE timestamp >= NOW() - INTERVAL '1 hour'",
@@ -235,9 +518,10 @@ def io_write_bytes_dist(time: str = 'hour'):
             return jsonify({"error": "Invalid time parameter. Use 'hour', 'day', 'month', 'year', or 'overall'."}), 400
 
         time_query = intervals[time]
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            cursor.execute(f"SELECT device_name, write_bytes FROM disk_io_metrics {time_query}")
+            cursor.execute(f"SELECT device_name, write_bytes FROM disk_io_metrics {time_query}", params)
             data = cursor.fetchall()
             dist = {}
             for device, value in data:
@@ -247,7 +531,7 @@ def io_write_bytes_dist(time: str = 'hour'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/io/read/bytes")
-def io_read_bytes(type: str='avg', time: str = 'overall'):
+def io_read_bytes(type: str='avg', time: str = 'overall', scope: HistoryScope = Depends(history_window)):
     try:
         if type not in ['max', 'min', 'avg']:
             return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
@@ -262,10 +546,12 @@ def io_read_bytes(type: str='avg', time: str = 'overall'):
         elif time == 'yearly':
             time_query = "WHERE timestamp >= NOW() - INTERVAL '1 year'"
 
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
             cursor.execute(
-                f"SELECT device_name, {type.upper()}(read_bytes) FROM disk_io_metrics {time_query} GROUP BY device_name"
+                f"SELECT device_name, {type.upper()}(read_bytes) FROM disk_io_metrics {time_query} GROUP BY device_name",
+                params
             )
             data = cursor.fetchall()
             if data:
@@ -276,7 +562,7 @@ def io_read_bytes(type: str='avg', time: str = 'overall'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/io/write/bytes")
-def io_write_bytes(type: str='avg', time: str = 'overall'):
+def io_write_bytes(type: str='avg', time: str = 'overall', scope: HistoryScope = Depends(history_window)):
     try:
         if type not in ['max', 'min', 'avg']:
             return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
@@ -291,10 +577,12 @@ def io_write_bytes(type: str='avg', time: str = 'overall'):
         elif time == 'yearly':
             time_query = "WHERE timestamp >= NOW() - INTERVAL '1 year'"
 
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
             cursor.execute(
-                f"SELECT device_name, {type.upper()}(write_bytes) FROM disk_io_metrics {time_query} GROUP BY device_name"
+                f"SELECT device_name, {type.upper()}(write_bytes) FROM disk_io_metrics {time_query} GROUP BY device_name",
+                params
             )
             data = cursor.fetchall()
             if data:
@@ -305,7 +593,7 @@ def io_write_bytes(type: str='avg', time: str = 'overall'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/io/read/time")
-def io_read_time(type: str='avg', time: str = 'overall'):
+def io_read_time(type: str='avg', time: str = 'overall', scope: HistoryScope = Depends(history_window)):
     try:
         if type not in ['max', 'min', 'avg']:
             return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
@@ -320,10 +608,12 @@ def io_read_time(type: str='avg', time: str = 'overall'):
         elif time == 'yearly':
             time_query = "WHERE timestamp >= NOW() - INTERVAL '1 year'"
 
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
             cursor.execute(
-                f"SELECT device_name, {type.upper()}(read_time) FROM disk_io_metrics {time_query} GROUP BY device_name"
+                f"SELECT device_name, {type.upper()}(read_time) FROM disk_io_metrics {time_query} GROUP BY device_name",
+                params
             )
             data = cursor.fetchall()
             if data:
@@ -334,7 +624,7 @@ def io_read_time(type: str='avg', time: str = 'overall'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/io/write/time")
-def io_write_time(type: str='avg', time: str = 'overall'):
+def io_write_time(type: str='avg', time: str = 'overall', scope: HistoryScope = Depends(history_window)):
     try:
         if type not in ['max', 'min', 'avg']:
             return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
@@ -349,10 +639,12 @@ def io_write_time(type: str='avg', time: str = 'overall'):
         elif time == 'yearly':
             time_query = "WHERE timestamp >= NOW() - INTERVAL '1 year'"
 
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
             cursor.execute(
-                f"SELECT device_name, {type.upper()}(write_time) FROM disk_io_metrics {time_query} GROUP BY device_name"
+                f"SELECT device_name, {type.upper()}(write_time) FROM disk_io_metrics {time_query} GROUP BY device_name",
+                params
             )
             data = cursor.fetchall()
             if data:
@@ -363,7 +655,7 @@ def io_write_time(type: str='avg', time: str = 'overall'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/memory/percent")
-def memory_percent(type: str = 'avg', time: str = 'overall'):
+def memory_percent(type: str = 'avg', time: str = 'overall', scope: HistoryScope = Depends(history_window)):
     try:
         if type not in ['max', 'min', 'avg']:
             return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
@@ -378,9 +670,10 @@ def memory_percent(type: str = 'avg', time: str = 'overall'):
         elif time == 'yearly':
             time_query = "WHERE timestamp >= NOW() - INTERVAL '1 year'"
 
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            cursor.execute(f"SELECT {type.upper()}(memory_percent_usage) FROM memory_metrics {time_query}")
+            cursor.execute(f"SELECT {type.upper()}(memory_percent_usage) FROM memory_metrics {time_query}", params)
             data = cursor.fetchone()
             if data:
                 return jsonify({"memory_percent": {"Memory":round(float(data[0]),2)}})
@@ -390,11 +683,16 @@ def memory_percent(type: str = 'avg', time: str = 'overall'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/memory/percent/timeseries")
-def memory_percent_timeseries(type: str = 'avg', groupby: str = 'hour'):
+@reads_rollups
+def memory_percent_timeseries(type: str = 'avg', groupby: str = 'hour', scope: HistoryScope = Depends(history_range)):
     try:
         if type not in ['max', 'min', 'avg']:
             return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
 
+        # An explicit start/end/step replaces the groupby window
+        if scope.time_range is not None:
+            return jsonify({"memory_percent_timeseries": range_points("memory_percent", type, scope.host, scope.time_range)})
+
         # Set time window and truncation for grouping
         if groupby == 'minute':
             time_query = "WHERE timestamp >= NOW() - INTERVAL '1 hour'"
@@ -414,6 +712,7 @@ def memory_percent_timeseries(type: str = 'avg', groupby: str = 'hour'):
         else:
             return jsonify({"error": "Invalid groupby parameter. Use 'minute', 'hour', 'day', 'month', or 'year'."}), 400
 
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
             cursor.execute(
@@ -423,7 +722,8 @@ def memory_percent_timeseries(type: str = 'avg', groupby: str = 'hour'):
                 {time_query}
                 GROUP BY date_trunc('{trunc}', timestamp)
                 ORDER BY period
-                """
+                """,
+                params
             )
             data = cursor.fetchall()
             if data:
@@ -436,7 +736,7 @@ def memory_percent_timeseries(type: str = 'avg', groupby: str = 'hour'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/swap_memory/percent")
-def swap_memory_percent(type: str = 'avg', time: str = 'overall'):
+def swap_memory_percent(type: str = 'avg', time: str = 'overall', scope: HistoryScope = Depends(history_window)):
     try:
         if type not in ['max', 'min', 'avg']:
             return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
@@ -451,9 +751,10 @@ def swap_memory_percent(type: str = 'avg', time: str = 'overall'):
         elif time == 'yearly':
             time_query = "WHERE timestamp >= NOW() - INTERVAL '1 year'"
 
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            cursor.execute(f"SELECT {type.upper()}(percent_usage) FROM swap_memory_metrics {time_query}")
+            cursor.execute(f"SELECT {type.upper()}(percent_usage) FROM swap_memory_metrics {time_query}", params)
             data = cursor.fetchone()
             if data:
                 return jsonify({"memory_percent": {"Memory": data[0]}})
@@ -463,11 +764,16 @@ def swap_memory_percent(type: str = 'avg', time: str = 'overall'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/swap_memory/percent/timeseries")
-def swap_memory_percent_timeseries(type: str = 'avg', groupby: str = 'hour'):
+@reads_rollups
+def swap_memory_percent_timeseries(type: str = 'avg', groupby: str = 'hour', scope: HistoryScope = Depends(history_range)):
     try:
         if type not in ['max', 'min', 'avg']:
             return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
 
+        # An explicit start/end/step replaces the groupby window
+        if scope.time_range is not None:
+            return jsonify({"swap_memory_percent_timeseries": range_points("swap_memory_percent", type, scope.host, scope.time_range)})
+
         # Set time window and truncation for grouping
         if groupby == 'minute':
             time_query = "WHERE timestamp >= NOW() - INTERVAL '1 hour'"
@@ -487,6 +793,7 @@ def swap_memory_percent_timeseries(type: str = 'avg', groupby: str = 'hour'):
         else:
             return jsonify({"error": "Invalid groupby parameter. Use 'minute', 'hour', 'day', 'month', or 'year'."}), 400
 
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
             cursor.execute(
@@ -496,7 +803,8 @@ def swap_memory_percent_timeseries(type: str = 'avg', groupby: str = 'hour'):
                 {time_query}
                 GROUP BY date_trunc('{trunc}', timestamp)
                 ORDER BY period
-                """
+                """,
+                params
             )
             data = cursor.fetchall()
             if data:
@@ -509,7 +817,7 @@ def swap_memory_percent_timeseries(type: str = 'avg', groupby: str = 'hour'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/cpu/percent")
-def cpu_percent(type: str = 'avg', time: str = 'overall'):
+def cpu_percent(type: str = 'avg', time: str = 'overall', scope: HistoryScope = Depends(history_window)):
     try:
         if type not in ['max', 'min', 'avg']:
             return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
@@ -524,10 +832,12 @@ def cpu_percent(type: str = 'avg', time: str = 'overall'):
         elif time == 'yearly':
             time_query = "WHERE timestamp >= NOW() - INTERVAL '1 year'"
 
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
             cursor.execute(
-                f"SELECT core_id, {type.upper()}(percent_usage) FROM cpu_metrics {time_query} GROUP BY core_id"
+                f"SELECT core_id, {type.upper()}(percent_usage) FROM cpu_metrics {time_query} GROUP BY core_id",
+                params
             )
             data = cursor.fetchall()
             if data:
@@ -538,11 +848,16 @@ def cpu_percent(type: str = 'avg', time: str = 'overall'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/cpu/percent/timeseries")
-def cpu_percent_timeseries(type: str = 'avg', groupby: str = 'hour'):
+@reads_rollups
+def cpu_percent_timeseries(type: str = 'avg', groupby: str = 'hour', scope: HistoryScope = Depends(history_range)):
     try:
         if type not in ['max', 'min', 'avg']:
             return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
 
+        # An explicit start/end/step replaces the groupby window
+        if scope.time_range is not None:
+            return jsonify({"cpu_percent_timeseries": range_points("cpu_percent", type, scope.host, scope.time_range)})
+
         # Set time window and truncation for grouping
         if groupby == 'minute':
             time_query = "WHERE timestamp >= NOW() - INTERVAL '1 hour'"
@@ -562,6 +877,7 @@ def cpu_percent_timeseries(type: str = 'avg', groupby: str = 'hour'):
         else:
             return jsonify({"error": "Invalid groupby parameter. Use 'minute', 'hour', 'day', 'month', or 'year'."}), 400
 
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
             cursor.execute(
@@ -571,7 +887,8 @@ def cpu_percent_timeseries(type: str = 'avg', groupby: str = 'hour'):
                 {time_query}
                 GROUP BY core_id, date_trunc('{trunc}', timestamp)
                 ORDER BY core_id, period
-                """
+                """,
+                params
             )
             data = cursor.fetchall()
             if data:
@@ -584,11 +901,16 @@ def cpu_percent_timeseries(type: str = 'avg', groupby: str = 'hour'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/io/read/bytes/timeseries")
-def io_read_bytes_timeseries(type: str = 'avg', groupby: str = 'hour'):
+@reads_rollups
+def io_read_bytes_timeseries(type: str = 'avg', groupby: str = 'hour', scope: HistoryScope = Depends(history_range)):
     try:
         if type not in ['max', 'min', 'avg']:
             return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
 
+        # An explicit start/end/step replaces the groupby window
+        if scope.time_range is not None:
+            return jsonify({"io_read_bytes_timeseries": range_points("io_read_bytes", type, scope.host, scope.time_range)})
+
         # Set time window and truncation for grouping
         if groupby == 'minute':
             time_query = "WHERE timestamp >= NOW() - INTERVAL '1 hour'"
@@ -608,6 +930,7 @@ def io_read_bytes_timeseries(type: str = 'avg', groupby: str = 'hour'):
         else:
             return jsonify({"error": "Invalid groupby parameter. Use 'minute', 'hour', 'day', 'month', or 'year'."}), 400
 
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
             cursor.execute(
@@ -617,7 +940,8 @@ def io_read_bytes_timeseries(type: str = 'avg', groupby: str = 'hour'):
                 {time_query}
                 GROUP BY device_name, date_trunc('{trunc}', timestamp)
                 ORDER BY device_name, period
-                """
+                """,
+                params
             )
             data = cursor.fetchall()
             if data:
@@ -630,11 +954,16 @@ def io_read_bytes_timeseries(type: str = 'avg', groupby: str = 'hour'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/io/write/bytes/timeseries")
-def io_write_bytes_timeseries(type: str = 'avg', groupby: str = 'hour'):
+@reads_rollups
+def io_write_bytes_timeseries(type: str = 'avg', groupby: str = 'hour', scope: HistoryScope = Depends(history_range)):
     try:
         if type not in ['max', 'min', 'avg']:
             return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
 
+        # An explicit start/end/step replaces the groupby window
+        if scope.time_range is not None:
+            return jsonify({"io_write_bytes_timeseries": range_points("io_write_bytes", type, scope.host, scope.time_range)})
+
         # Set time window and truncation for grouping
         if groupby == 'minute':
             time_query = "WHERE timestamp >= NOW() - INTERVAL '1 hour'"
@@ -654,6 +983,7 @@ def io_write_bytes_timeseries(type: str = 'avg', groupby: str = 'hour'):
         else:
             return jsonify({"error": "Invalid groupby parameter. Use 'minute', 'hour', 'day', 'month', or 'year'."}), 400
 
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
             cursor.execute(
@@ -663,7 +993,8 @@ def io_write_bytes_timeseries(type: str = 'avg', groupby: str = 'hour'):
                 {time_query}
                 GROUP BY device_name, date_trunc('{trunc}', timestamp)
                 ORDER BY device_name, period
-                """
+                """,
+                params
             )
             data = cursor.fetchall()
             if data:
@@ -676,11 +1007,16 @@ def io_write_bytes_timeseries(type: str = 'avg', groupby: str = 'hour'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/io/read/time/timeseries")
-def io_read_time_timeseries(type: str = 'avg', groupby: str = 'hour'):
+@reads_rollups
+def io_read_time_timeseries(type: str = 'avg', groupby: str = 'hour', scope: HistoryScope = Depends(history_range)):
     try:
         if type not in ['max', 'min', 'avg']:
             return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
 
+        # An explicit start/end/step replaces the groupby window
+        if scope.time_range is not None:
+            return jsonify({"io_read_time_timeseries": range_points("io_read_time", type, scope.host, scope.time_range)})
+
         # Set time window and truncation for grouping
         if groupby == 'minute':
             time_query = "WHERE timestamp >= NOW() - INTERVAL '1 hour'"
@@ -700,6 +1036,7 @@ def io_read_time_timeseries(type: str = 'avg', groupby: str = 'hour'):
         else:
             return jsonify({"error": "Invalid groupby parameter. Use 'minute', 'hour', 'day', 'month', or 'year'."}), 400
 
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
             cursor.execute(
@@ -709,7 +1046,8 @@ def io_read_time_timeseries(type: str = 'avg', groupby: str = 'hour'):
                 {time_query}
                 GROUP BY device_name, date_trunc('{trunc}', timestamp)
                 ORDER BY device_name, period
-                """
+                """,
+                params
             )
             data = cursor.fetchall()
             if data:
@@ -722,11 +1060,16 @@ def io_read_time_timeseries(type: str = 'avg', groupby: str = 'hour'):
         return jsonify({"error": str(e)}), 500
 
 @app.get("/io/write/time/timeseries")
-def io_write_time_timeseries(type: str = 'avg', groupby: str = 'hour'):
+@reads_rollups
+def io_write_time_timeseries(type: str = 'avg', groupby: str = 'hour', scope: HistoryScope = Depends(history_range)):
     try:
         if type not in ['max', 'min', 'avg']:
             return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
 
+        # An explicit start/end/step replaces the groupby window
+        if scope.time_range is not None:
+            return jsonify({"io_write_time_timeseries": range_points("io_write_time", type, scope.host, scope.time_range)})
+
         # Set time window and truncation for grouping
         if groupby == 'minute':
             time_query = "WHERE timestamp >= NOW() - INTERVAL '1 hour'"
@@ -746,6 +1089,7 @@ def io_write_time_timeseries(type: str = 'avg', groupby: str = 'hour'):
         else:
             return jsonify({"error": "Invalid groupby parameter. Use 'minute', 'hour', 'day', 'month', or 'year'."}), 400
 
+        time_query, params = scope.where(time_query)
         conn = get_db_connection()
         with conn.cursor() as cursor:
             cursor.execute(
@@ -755,7 +1099,8 @@ def io_write_time_timeseries(type: str = 'avg', groupby: str = 'hour'):
                 {time_query}
                 GROUP BY device_name, date_trunc('{trunc}', timestamp)
                 ORDER BY device_name, period
-                """
+                """,
+                params
             )
             data = cursor.fetchall()
             if data:
@@ -767,12 +1112,457 @@ def io_write_time_timeseries(type: str = 'avg', groupby: str = 'hour'):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.get("/gpu/utilization")
+def gpu_utilization(type: str = 'avg', time: str = 'overall', scope: HistoryScope = Depends(history_window)):
+    try:
+        if type not in ['max', 'min', 'avg']:
+            return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
+
+        time_query = ""
+        if time == 'hourly':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 hour'"
+        elif time == 'daily':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 day'"
+        elif time == 'monthly':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 month'"
+        elif time == 'yearly':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 year'"
+
+        time_query, params = scope.where(time_query)
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT device_name, {type.upper()}(gpu_utilization) FROM gpu_metrics {time_query} GROUP BY device_name",
+                params
+            )
+            data = cursor.fetchall()
+            if data:
+                return jsonify({"gpu_utilization": {row[0]: round(float(row[1]), 2) for row in data}})
+            else:
+                return jsonify({"error": f"Unable to grab {type} data for GPU"}), 500
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.get("/gpu/utilization/timeseries")
+@reads_rollups
+def gpu_utilization_timeseries(type: str = 'avg', groupby: str = 'hour', scope: HistoryScope = Depends(history_range)):
+    try:
+        if type not in ['max', 'min', 'avg']:
+            return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
+
+        # An explicit start/end/step replaces the groupby window
+        if scope.time_range is not None:
+            return jsonify({"gpu_utilization_timeseries": range_points("gpu_utilization", type, scope.host, scope.time_range)})
+
+        # Set time window and truncation for grouping
+        if groupby == 'minute':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 hour'"
+            trunc = "minute"
+        elif groupby == 'hour':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 day'"
+            trunc = "hour"
+        elif groupby == 'day':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 month'"
+            trunc = "day"
+        elif groupby == 'month':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 year'"
+            trunc = "month"
+        elif groupby == 'year':
+            time_query = ""
+            trunc = "year"
+        else:
+            return jsonify({"error": "Invalid groupby parameter. Use 'minute', 'hour', 'day', 'month', or 'year'."}), 400
+
+        time_query, params = scope.where(time_query)
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT device_name, date_trunc('{trunc}', timestamp) AS period, {type.upper()}(gpu_utilization)
+                FROM gpu_metrics
+                {time_query}
+                GROUP BY device_name, date_trunc('{trunc}', timestamp)
+                ORDER BY device_name, period
+                """,
+                params
+            )
+            data = cursor.fetchall()
+            if data:
+                return jsonify({"gpu_utilization_timeseries": [
+                    {"device_name": row[0], "period": row[1].isoformat(), "value": round(float(row[2]), 2)} for row in data
+                ]})
+            else:
+                return jsonify({"error": f"Unable to grab {type} timeseries data for GPU"}), 500
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.get("/gpu/memory/timeseries")
+@reads_rollups
+def gpu_memory_timeseries(type: str = 'avg', groupby: str = 'hour', scope: HistoryScope = Depends(history_range)):
+    try:
+        if type not in ['max', 'min', 'avg']:
+            return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
+
+        # An explicit start/end/step replaces the groupby window
+        if scope.time_range is not None:
+            return jsonify({"gpu_memory_timeseries": range_points("gpu_memory", type, scope.host, scope.time_range)})
+
+        # Set time window and truncation for grouping
+        if groupby == 'minute':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 hour'"
+            trunc = "minute"
+        elif groupby == 'hour':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 day'"
+            trunc = "hour"
+        elif groupby == 'day':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 month'"
+            trunc = "day"
+        elif groupby == 'month':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 year'"
+            trunc = "month"
+        elif groupby == 'year':
+            time_query = ""
+            trunc = "year"
+        else:
+            return jsonify({"error": "Invalid groupby parameter. Use 'minute', 'hour', 'day', 'month', or 'year'."}), 400
+
+        time_query, params = scope.where(time_query)
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT device_name, date_trunc('{trunc}', timestamp) AS period, {type.upper()}(memory_used)
+                FROM gpu_metrics
+                {time_query}
+                GROUP BY device_name, date_trunc('{trunc}', timestamp)
+                ORDER BY device_name, period
+                """,
+                params
+            )
+            data = cursor.fetchall()
+            if data:
+                return jsonify({"gpu_memory_timeseries": [
+                    {"device_name": row[0], "period": row[1].isoformat(), "value": round(float(row[2]), 2)} for row in data
+                ]})
+            else:
+                return jsonify({"error": f"Unable to grab {type} timeseries data for GPU"}), 500
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.get("/gpu/temperature/timeseries")
+@reads_rollups
+def gpu_temperature_timeseries(type: str = 'avg', groupby: str = 'hour', scope: HistoryScope = Depends(history_range)):
+    try:
+        if type not in ['max', 'min', 'avg']:
+            return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
+
+        # An explicit start/end/step replaces the groupby window
+        if scope.time_range is not None:
+            return jsonify({"gpu_temperature_timeseries": range_points("gpu_temperature", type, scope.host, scope.time_range)})
+
+        # Set time window and truncation for grouping
+        if groupby == 'minute':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 hour'"
+            trunc = "minute"
+        elif groupby == 'hour':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 day'"
+            trunc = "hour"
+        elif groupby == 'day':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 month'"
+            trunc = "day"
+        elif groupby == 'month':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 year'"
+            trunc = "month"
+        elif groupby == 'year':
+            time_query = ""
+            trunc = "year"
+        else:
+            return jsonify({"error": "Invalid groupby parameter. Use 'minute', 'hour', 'day', 'month', or 'year'."}), 400
+
+        time_query, params = scope.where(time_query)
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT device_name, date_trunc('{trunc}', timestamp) AS period, {type.upper()}(temperature)
+                FROM gpu_metrics
+                {time_query}
+                GROUP BY device_name, date_trunc('{trunc}', timestamp)
+                ORDER BY device_name, period
+                """,
+                params
+            )
+            data = cursor.fetchall()
+            if data:
+                return jsonify({"gpu_temperature_timeseries": [
+                    {"device_name": row[0], "period": row[1].isoformat(), "value": round(float(row[2]), 2)} for row in data
+                ]})
+            else:
+                return jsonify({"error": f"Unable to grab {type} timeseries data for GPU"}), 500
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.get("/latency")
+def latency(type: str = 'avg', time: str = 'overall', scope: HistoryScope = Depends(history_window)):
+    try:
+        if type not in ['max', 'min', 'avg']:
+            return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
+
+        time_query = ""
+        if time == 'hourly':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 hour'"
+        elif time == 'daily':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 day'"
+        elif time == 'monthly':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 month'"
+        elif time == 'yearly':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 year'"
+
+        time_query, params = scope.where(time_query)
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""SELECT target, MIN(min_ms), {type.upper()}(avg_ms), MAX(max_ms), AVG(loss_percent)
+                FROM latency_metrics {time_query} GROUP BY target""",
+                params
+            )
+            data = cursor.fetchall()
+            if data:
+                return jsonify({"latency": {
+                    row[0]: {
+                        "min_ms": row[1],
+                        "avg_ms": round(float(row[2]), 3) if row[2] is not None else None,
+                        "max_ms": row[3],
+                        "loss_percent": round(float(row[4]), 2),
+                    } for row in data
+                }})
+            else:
+                return jsonify({"error": f"Unable to grab {type} data for latency"}), 500
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.get("/latency/timeseries")
+@reads_rollups
+def latency_timeseries(type: str = 'avg', groupby: str = 'hour', target: str = None, scope: HistoryScope = Depends(history_range)):
+    try:
+        if type not in ['max', 'min', 'avg']:
+            return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
+
+        # An explicit start/end/step replaces the groupby window
+        if scope.time_range is not None:
+            return jsonify({"latency_timeseries": range_points("latency", type, scope.host, scope.time_range, series=target, digits=3)})
+
+        # Set time window and truncation for grouping
+        if groupby == 'minute':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 hour'"
+            trunc = "minute"
+        elif groupby == 'hour':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 day'"
+            trunc = "hour"
+        elif groupby == 'day':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 month'"
+            trunc = "day"
+        elif groupby == 'month':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 year'"
+            trunc = "month"
+        elif groupby == 'year':
+            time_query = "WHERE TRUE"
+            trunc = "year"
+        else:
+            return jsonify({"error": "Invalid groupby parameter. Use 'minute', 'hour', 'day', 'month', or 'year'."}), 400
+
+        time_query, params = scope.where(time_query)
+        if target:
+            time_query += " AND target = %s"
+            params.append(target)
+
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT target, date_trunc('{trunc}', timestamp) AS period, {type.upper()}(avg_ms)
+                FROM latency_metrics
+                {time_query}
+                GROUP BY target, date_trunc('{trunc}', timestamp)
+                ORDER BY target, period
+                """,
+                params
+            )
+            data = cursor.fetchall()
+            if data:
+                return jsonify({"latency_timeseries": [
+                    {"target": row[0], "period": row[1].isoformat(), "value": round(float(row[2]), 3) if row[2] is not None else None} for row in data
+                ]})
+            else:
+                return jsonify({"error": f"Unable to grab {type} timeseries data for latency"}), 500
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.get("/latency/loss/timeseries")
+@reads_rollups
+def latency_loss_timeseries(type: str = 'avg', groupby: str = 'hour', target: str = None, scope: HistoryScope = Depends(history_range)):
+    try:
+        if type not in ['max', 'min', 'avg']:
+            return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
+
+        # An explicit start/end/step replaces the groupby window
+        if scope.time_range is not None:
+            return jsonify({"latency_loss_timeseries": range_points("latency_loss", type, scope.host, scope.time_range, series=target, digits=3)})
+
+        # Set time window and truncation for grouping
+        if groupby == 'minute':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 hour'"
+            trunc = "minute"
+        elif groupby == 'hour':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 day'"
+            trunc = "hour"
+        elif groupby == 'day':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 month'"
+            trunc = "day"
+        elif groupby == 'month':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 year'"
+            trunc = "month"
+        elif groupby == 'year':
+            time_query = "WHERE TRUE"
+            trunc = "year"
+        else:
+            return jsonify({"error": "Invalid groupby parameter. Use 'minute', 'hour', 'day', 'month', or 'year'."}), 400
+
+        time_query, params = scope.where(time_query)
+        if target:
+            time_query += " AND target = %s"
+            params.append(target)
+
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT target, date_trunc('{trunc}', timestamp) AS period, {type.upper()}(loss_percent)
+                FROM latency_metrics
+                {time_query}
+                GROUP BY target, date_trunc('{trunc}', timestamp)
+                ORDER BY target, period
+                """,
+                params
+            )
+            data = cursor.fetchall()
+            if data:
+                return jsonify({"latency_loss_timeseries": [
+                    {"target": row[0], "period": row[1].isoformat(), "value": round(float(row[2]), 3) if row[2] is not None else None} for row in data
+                ]})
+            else:
+                return jsonify({"error": f"Unable to grab {type} timeseries data for latency"}), 500
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.get("/processes/top")
+def processes_top(by: str = 'cpu', time: str = 'hourly', limit: int = 10, scope: HistoryScope = Depends(history_window)):
+    try:
+        columns = {'cpu': 'cpu_percent', 'rss': 'rss', 'io': 'io_bytes_per_sec'}
+        if by not in columns:
+            return jsonify({"error": "Invalid by parameter. Use 'cpu', 'rss', or 'io'."}), 400
+
+        time_query = ""
+        if time == 'hourly':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 hour'"
+        elif time == 'daily':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 day'"
+        elif time == 'monthly':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 month'"
+        elif time == 'yearly':
+            time_query = "WHERE timestamp >= NOW() - INTERVAL '1 year'"
+
+        time_query, params = scope.where(time_query)
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""SELECT name, AVG({columns[by]}), MAX({columns[by]}), COUNT(*)
+                FROM process_metrics {time_query}
+                GROUP BY name ORDER BY AVG({columns[by]}) DESC LIMIT %s""",
+                params + [min(max(limit, 1), 100)]
+            )
+            data = cursor.fetchall()
+            return jsonify({"processes_top": [
+                {"name": row[0], "avg": round(float(row[1]), 2), "max": round(float(row[2]), 2), "samples": row[3]} for row in data
+            ]})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.get("/snapshot")
+def snapshot_at_instant(at: str, host: str = None, tolerance: float = SNAPSHOT_TOLERANCE_SECONDS):
+    # Every family's nearest stored sample to at, as a /ws/metrics frame;
+    # sampled_at says when each family was actually sampled. A bad at raises
+    # RangeError here, which range_error turns into a 400
+    instant = parse_instant(at)
+    if not 0 < tolerance <= 86400:
+        return jsonify({"error": "Invalid tolerance parameter. Use seconds between 0 and 86400."}), 400
+    try:
+        frame, sampled_at = snapshot_at(instant, host, tolerance)
+        frame["late"] = []
+        frame["sampled_at"] = {section: timestamp.isoformat() for section, timestamp in sampled_at.items()}
+        return jsonify(frame)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.get("/hosts")
+def hosts():
+    try:
+        return jsonify({"hosts": [
+            {"host": row[0], "first_seen": row[1].isoformat(), "last_seen": row[2].isoformat()} for row in list_hosts()
+        ]})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.get("/fleet/timeseries")
+def fleet_quantile_timeseries(metric: str = 'cpu_percent', type: str = 'avg', quantile: float = 0.95, groupby: str = 'hour'):
+    # Served from host_rollups, so cost grows with hosts x periods, not raw rows
+    try:
+        if metric not in ROLLUP_QUERIES:
+            return jsonify({"error": f"Invalid metric parameter. Use one of {', '.join(ROLLUP_QUERIES)}."}), 400
+        if type not in HOST_AGGREGATES:
+            return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
+        if not 0 <= quantile <= 1:
+            return jsonify({"error": "Invalid quantile parameter. Use a value between 0 and 1."}), 400
+
+        windows = {'hour': '1 day', 'day': '1 month', 'month': '1 year', 'year': None}
+        if groupby not in windows:
+            return jsonify({"error": "Invalid groupby parameter. Use 'hour', 'day', 'month', or 'year'."}), 400
+
+        data = fleet_timeseries(metric, type, quantile, groupby, windows[groupby])
+        return jsonify({"fleet_timeseries": [
+            {
+                "period": row[0].isoformat(),
+                "value": round(float(row[1]), 2),
+                "avg": round(float(row[2]), 2),
+                "max": round(float(row[3]), 2),
+                "hosts": row[4],
+            } for row in data
+        ]})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.get("/fleet/top")
+def fleet_top_hosts(metric: str = 'io_write_bytes_rate', type: str = 'avg', time: str = 'daily', limit: int = 10):
+    try:
+        if metric not in ROLLUP_QUERIES:
+            return jsonify({"error": f"Invalid metric parameter. Use one of {', '.join(ROLLUP_QUERIES)}."}), 400
+        if type not in HOST_AGGREGATES:
+            return jsonify({"error": "Invalid type parameter. Use 'max', 'min', or 'avg'."}), 400
+
+        windows = {'hourly': '1 hour', 'daily': '1 day', 'monthly': '1 month', 'yearly': '1 year', 'overall': None}
+        if time not in windows:
+            return jsonify({"error": "Invalid time parameter. Use 'hourly', 'daily', 'monthly', 'yearly', or 'overall'."}), 400
+
+        data = fleet_top(metric, type, windows[time], min(max(limit, 1), 100))
+        return jsonify({"fleet_top": [
+            {"host": row[0], "value": round(float(row[1]), 2), "samples": row[2]} for row in data
+        ]})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.get("/notification-settings")
 def get_notif_settings():
-    config_path = os.path.join("notif_config.json")
-    if os.path.exists(config_path):
-        with open(config_path, "r") as f:
-            return json.load(f)
+    return get_notif_config()
 
 @app.patch("/notification-settings")
 async def update_notif_settings(request: Request):
@@ -825,45 +1615,15 @@ async def add_host_email(request: Request):
 @app.websocket("/ws/metrics")
 async def metric_ws(ws: WebSocket):
     await ws.accept()
+    queue = collector.subscribe()
     try:
+        if collector.latest_json is not None:
+            await ws.send_text(collector.latest_json)
         while True:
-            system_info = {}
-
-            # CPU
-            system_info['cpu'] = {}
-            user_time, system_time, idle_time = gather_cpu_times()
-            system_info['cpu']['user_time'] = user_time
-            system_info['cpu']['system_time'] = system_time
-            system_info['cpu']['idle_time'] = idle_time
-            system_info['cpu']['percent'] = gather_cpu_percents()
-
-            # Memory
-            system_info['memory'] = {}
-            available_memory, percent_usage, used_memory = gather_virtual_memory_stats()
-            system_info['memory']['available_memory'] = available_memory
-            system_info['memory']['memory_percent_usage'] = percent_usage
-            system_info['memory']['used_memory'] = used_memory
-
-            # Swap memory
-            system_info['swap_memory'] = {}
-            swap_used_memory, swap_free_memory, swap_percent_usage = gather_swap_memory_stats()
-            system_info['swap_memory']['used_memory'] = swap_used_memory
-            system_info['swap_memory']['free_memory'] = swap_free_memory
-            system_info['swap_memory']['percent_usage'] = swap_percent_usage
-
-            # Disk usage
-            system_info['disk_usage'] = get_disk_usage()
-
-            # IO
-            system_info['io'] = get_disk_io_counters()
-            
-            log_data(system_info)
-
-            generate_notif_settings(system_info)
-
-            check_thresholds(system_info)
-
-            await ws.send_text(json.dumps(system_info))
-            await asyncio.sleep(3)
-    except Exception as e:
-        print("WebSocket Disconnected", e)
\ No newline at end of file
+            frame = await queue.get()
+            with timed("websocket", "send"):
+                await ws.send_text(frame)
+    except Exception as e:
+        print("WebSocket Disconnected", e)
+    finally:
+        collector.unsubscribe(queue)
@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only load on first use, never when backend.py is imported
+LAZY_MODULES = ("pynvml", "ping3", "ifcfg", "smtplib", "psycopg2", "apscheduler")
+
+# Runs in a fresh interpreter per measurement, so nothing is already cached
+PROBE = f"""
+import json, sys, threading
+sys.path.insert(0, {BACKEND_DIR!r})
+import backend
+print(json.dumps({{
+    "loaded": [name for name in {LAZY_MODULES!r} if name in sys.modules],
+    "threads": [thread.name for thread in threading.enumerate() if thread is not threading.main_thread()],
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    # -X importtime lines: "import time: self [us] | cumulative | name", with
+    # nesting shown by indenting the name
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Drop the space after the separator so top-level names are unindented
+        modules.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return modules
+
+def measure():
+    # A temporary working directory keeps the run from writing into the checkout
+    with tempfile.TemporaryDirectory() as cwd:
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE],
+                                cwd=cwd, capture_output=True, text=True)
+    modules = parse_importtime(result.stderr)
+    if result.returncode:
+        sys.exit(f"Importing backend failed:\n{result.stderr[-2000:]}")
+    total = next(cumulative for name, _, cumulative in modules if name.strip() == "backend" and not name.startswith(" "))
+    return total / 1000, modules, json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend.py import time against a budget")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=500, help="median import time allowed")
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to list")
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    median_ms = statistics.median(total for total, _, _ in runs)
+    _, modules, probe = runs[-1]
+
+    print(f"import backend: median {median_ms:.1f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    print(f"{'module':<50} {'self ms':>10} {'cumulative ms':>14}")
+    for name, self_us, cumulative_us in sorted(modules, key=lambda m: m[1], reverse=True)[:args.top]:
+        print(f"{name.strip():<50} {self_us / 1000:>10.1f} {cumulative_us / 1000:>14.1f}")
+
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f"import took {median_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+    if probe["loaded"]:
+        failures.append(f"loaded at import: {', '.join(probe['loaded'])}")
+    if probe["threads"]:
+        failures.append(f"threads started at import: {', '.join(probe['threads'])}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mailer import Mailer
+
+# Minimal SMTP stand-in: accepts every command and counts delivered messages
+class StandInSMTP:
+    def __init__(self):
+        self.delivered = 0
+
+    async def handle(self, reader, writer):
+        writer.write(b"220 stand-in ESMTP\r\n")
+        in_data = False
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if in_data:
+                if line == b".\r\n":
+                    in_data = False
+                    self.delivered += 1
+                    writer.write(b"250 OK\r\n")
+                continue
+            command = line[:4].upper()
+            if command == b"EHLO":
+                writer.write(b"250-stand-in\r\n250 8BITMIME\r\n")
+            elif command == b"DATA":
+                in_data = True
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif command == b"QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+
+def start_server(stand_in):
+    # Runs on its own loop so the server never competes with the mailer's loop
+    ready = threading.Event()
+    ports = []
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(asyncio.start_server(stand_in.handle, "127.0.0.1", 0))
+        ports.append(server.sockets[0].getsockname()[1])
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    ready.wait()
+    return ports[0]
+
+
+async def run(subscribers, alerts):
+    stand_in = StandInSMTP()
+    port = start_server(stand_in)
+    mailer = Mailer(host="127.0.0.1", port=port, starttls=False)
+
+    recipients = [f"subscriber{i}@example.com" for i in range(subscribers)]
+    body = "\n".join(f"cpu-percent-core_{i}:\n[2024-01-01 00:00:00] Value=91.0, Peak=97.5, Threshold=80 (ongoing)\n" for i in range(alerts))
+
+    start = time.perf_counter()
+    delivered, refused, failed = await mailer.send_digest("host@example.com", None, recipients, "Web Specs Log", body)
+    elapsed = time.perf_counter() - start
+    mailer.close()
+
+    print(f"subscribers: {subscribers}, alerts per digest: {alerts}")
+    print(f"delivered: {len(delivered)}, refused: {len(refused)}, failed: {len(failed)}, server saw: {stand_in.delivered}")
+    print(f"elapsed: {elapsed:.2f}s, throughput: {len(delivered) / elapsed:.0f} msgs/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Digest throughput against a local stand-in SMTP server")
+    parser.add_argument("--subscribers", type=int, default=10000)
+    parser.add_argument("--alerts", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.subscribers, args.alerts))
@@ -0,0 +1,74 @@
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import app
+from query_guard import is_heavy
+
+# Admission classification against the real routes: which requests count
+# against MAX_HEAVY_QUERIES and get the heavy statement_timeout. Exits 1 when
+# a case is misclassified, and reports what classifying a request costs
+NOW = datetime.datetime.now()
+LONG = (NOW - datetime.timedelta(days=90)).isoformat(timespec="seconds")
+SHORT = (NOW - datetime.timedelta(hours=1)).isoformat(timespec="seconds")
+
+# (path, query string, heavy?)
+CASES = [
+    # Summary and distribution routes scan raw rows whatever the range
+    ("/cpu/percent", f"start={LONG}", True),
+    ("/memory/percent/distribution", f"start={LONG}", True),
+    ("/io/read/bytes", f"start={LONG}&step=1h", True),
+    ("/cpu/percent", f"start={SHORT}", False),
+    # Timeseries routes read series_rollups only for explicit whole-hour steps
+    ("/cpu/percent/timeseries", f"start={LONG}&step=1h", False),
+    ("/memory/percent/timeseries", f"start={LONG}&step=1d", False),
+    ("/cpu/percent/timeseries", f"start={LONG}&step=10m", True),
+    ("/cpu/percent/timeseries", f"start={LONG}", True),
+    # Fixed windows, including the route's own defaults
+    ("/cpu/percent", "", True),
+    ("/cpu/percent", "time=hourly", False),
+    ("/memory/percent/timeseries", "groupby=year", True),
+    ("/memory/percent/timeseries", "", False),
+]
+
+
+def scope(path, query):
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [],
+        "app": app,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and time history-route admission classification")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    failures = 0
+    for path, query, expected in CASES:
+        heavy = is_heavy(scope(path, query))
+        status = "ok" if heavy == expected else "FAIL"
+        failures += heavy != expected
+        print(f"{status:<5} {path}?{query or '-'}: heavy={heavy}, expected {expected}")
+
+    requests = [scope(path, query) for path, query, _ in CASES]
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        for request in requests:
+            is_heavy(request)
+    per_call = (time.perf_counter() - start) / (args.iterations * len(requests))
+    print(f"is_heavy: {per_call * 1e6:.1f} us per request")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snapshot import CpuSample, DiskIoSample, DiskUsageSample, MemorySample, Snapshot, SwapSample
+
+# Synthetic host: psutil-shaped records for N cores and M disks, so the
+# benchmark runs without psutil or a database
+CpuTimes = namedtuple("CpuTimes", "user system idle")
+DiskIo = namedtuple("DiskIo", "read_count write_count read_bytes write_bytes read_time write_time")
+Partition = namedtuple("Partition", "device mountpoint fstype")
+Usage = namedtuple("Usage", "total used free percent")
+
+TRACKED = {"cpu": {"percent"}, "memory": {"memory_percent_usage"}, "disk_usage": {"percent"}, "io": {"read_bytes", "write_bytes"}}
+
+
+def synthetic_host(cores, disks):
+    cpu_times = [CpuTimes(random.uniform(0, 1e6), random.uniform(0, 1e6), random.uniform(0, 1e7)) for _ in range(cores)]
+    cpu_percents = [round(random.uniform(0, 100), 1) for _ in range(cores)]
+    io = {f"sd{i}": DiskIo(*(random.randrange(1 << 40) for _ in range(6))) for i in range(disks)}
+    usages = [(Partition(f"/dev/sd{i}1", f"/mnt/{i}", "ext4"), Usage(1 << 40, 1 << 39, 1 << 39, 50.0)) for i in range(disks)]
+    return cpu_times, cpu_percents, io, usages
+
+
+def rule_paths(cores, disks):
+    # What the generated notif_config.json thresholds: every percent leaf
+    paths = [("cpu", "percent", f"core_{i+1}") for i in range(cores)]
+    paths += [("disk_usage", f"/dev/sd{i}1", "percent") for i in range(disks)]
+    paths += [("memory", "memory_percent_usage"), ("swap_memory", "percent_usage")]
+    return paths
+
+
+def dict_tick(host, paths):
+    # The nested dict pipeline the collector used before snapshot.py
+    cpu_times, cpu_percents, io, usages = host
+    system_info = {
+        "cpu": {
+            "user_time": {f"core_{i+1}": core[0] for i, core in enumerate(cpu_times)},
+            "system_time": {f"core_{i+1}": core[1] for i, core in enumerate(cpu_times)},
+            "idle_time": {f"core_{i+1}": core[2] for i, core in enumerate(cpu_times)},
+            "percent": {f"core_{i+1}": percent for i, percent in enumerate(cpu_percents)},
+        },
+        "memory": {"available_memory": 1 << 33, "memory_percent_usage": 42.0, "used_memory": 1 << 32},
+        "swap_memory": {"used_memory": 0, "free_memory": 1 << 30, "percent_usage": 0.0},
+        "io": {name: dict(counters._asdict()) for name, counters in io.items()},
+        "disk_usage": {
+            p.device: {"mountpoint": p.mountpoint, "fstype": p.fstype, "total": u.total, "used": u.used, "free": u.free, "percent": u.percent}
+            for p, u in usages
+        },
+        "late": [],
+    }
+    encoded = json.dumps(system_info)
+
+    readings = 0
+    for path in paths:
+        value = system_info
+        for key in path:
+            value = value[key]
+        if isinstance(value, (float, int)):
+            readings += 1
+
+    def leaves(value, path, fields, tracked):
+        if isinstance(value, dict):
+            for key, nested in value.items():
+                yield from leaves(nested, path + (key,), fields, tracked or key in fields)
+        elif tracked and isinstance(value, (float, int)):
+            yield "-".join(path), value
+    series = sum(1 for section, fields in TRACKED.items() for _ in leaves(system_info[section], (section,), fields, False))
+
+    cpu = system_info["cpu"]
+    rows = [
+        (i + 1, cpu["user_time"][f"core_{i+1}"], cpu["system_time"][f"core_{i+1}"], cpu["idle_time"][f"core_{i+1}"], cpu["percent"][f"core_{i+1}"])
+        for i in range(len(cpu["percent"]))
+    ]
+    rows += [(name, *stats.values()) for name, stats in system_info["io"].items()]
+    return len(encoded), readings, series, len(rows)
+
+
+def snapshot_tick(host, paths):
+    cpu_times, cpu_percents, io, usages = host
+    snapshot = Snapshot({
+        "cpu": CpuSample.from_psutil(cpu_times, cpu_percents),
+        "memory": MemorySample(1 << 33, 42.0, 1 << 32),
+        "swap_memory": SwapSample(0, 1 << 30, 0.0),
+        "io": DiskIoSample.from_psutil(io),
+        "disk_usage": DiskUsageSample.from_usages(usages),
+    })
+    encoded = snapshot.encode()
+    readings = sum(1 for path in paths if snapshot.value(path) is not None)
+    series = sum(1 for _, section in snapshot.series(TRACKED) for _ in section)
+
+    cpu = snapshot.sections["cpu"]
+    rows = list(zip(range(1, len(cpu.percent) + 1), cpu.user_time, cpu.system_time, cpu.idle_time, cpu.percent))
+    rows += list(snapshot.sections["io"].rows())
+    return len(encoded), readings, series, len(rows)
+
+
+def measure(tick, host, paths, ticks):
+    tick(host, paths)
+    start = time.process_time()
+    for _ in range(ticks):
+        tick(host, paths)
+    cpu_us = (time.process_time() - start) / ticks * 1e6
+
+    # Allocations are traced separately, tracing slows the timed loop down
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    tick(host, paths)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu_us, peak - base
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-tick CPU and allocations: nested dicts vs typed snapshot")
+    parser.add_argument("--cores", type=int, default=256)
+    parser.add_argument("--disks", type=int, default=16)
+    parser.add_argument("--ticks", type=int, default=500)
+    args = parser.parse_args()
+
+    random.seed(0)
+    host = synthetic_host(args.cores, args.disks)
+    paths = rule_paths(args.cores, args.disks)
+    assert dict_tick(host, paths)[1:] == snapshot_tick(host, paths)[1:]
+
+    print(f"{args.cores} cores, {args.disks} disks, {len(paths)} threshold rules, {args.ticks} ticks")
+    print(f"{'pipeline':<10} {'cpu/tick':>12} {'peak alloc':>12}")
+    for name, tick in (("dict", dict_tick), ("snapshot", snapshot_tick)):
+        cpu_us, peak = measure(tick, host, paths, args.ticks)
+        print(f"{name:<10} {cpu_us:>10.1f}us {peak / 1024:>10.1f}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+# Hosts are simulated: psutil is replaced before any backend module imports it
+import fake_psutil
+sys.modules["psutil"] = fake_psutil
+
+# notif_config.json and anomaly_state.json are written to the working
+# directory, keep them out of the checkout
+os.chdir(tempfile.mkdtemp(prefix="web-specs-bench-"))
+
+import alert_engine
+import collector
+import config
+import live_info
+from snapshot import Snapshot
+
+DEFAULT_HOSTS = "4x1,64x20,256x50,512x200"
+DEFAULT_BASELINE_PATH = os.path.join(BENCH_DIR, "baselines.json")
+DEFAULT_THRESHOLD = 0.25
+
+
+# Local database stand-in: accepts every statement, renders execute_values
+# pages through mogrify like psycopg2 does, and counts round trips
+class StandInCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.page = []
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def mogrify(self, template, args):
+        self.page.append(args)
+        if isinstance(template, str):
+            template = template.encode()
+        return template % tuple(repr(arg).encode() for arg in args)
+
+    def execute(self, query, vars=None):
+        self.connection.round_trips += 1
+        if isinstance(query, bytes):
+            query = query.decode()
+        # alert_engine opens incidents with INSERT ... RETURNING id, component
+        if re.search(r"RETURNING id, component\s*$", query):
+            self.rows = []
+            for args in self.page:
+                self.connection.next_id += 1
+                self.rows.append((self.connection.next_id, args[2]))
+        else:
+            self.rows = []
+        self.page = []
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def close(self):
+        pass
+
+
+class StandInConnection:
+    encoding = "UTF8"
+
+    def __init__(self, db):
+        self.db = db
+        self.round_trips = 0
+        self.next_id = 0
+
+    def cursor(self):
+        return StandInCursor(self)
+
+    def commit(self):
+        self.round_trips += 1
+
+    def rollback(self):
+        self.round_trips += 1
+
+    def close(self):
+        self.db.round_trips += self.round_trips
+        self.db.next_id = max(self.db.next_id, self.next_id)
+        self.round_trips = 0
+
+
+class StandInDatabase:
+    def __init__(self):
+        self.round_trips = 0
+        self.next_id = 0
+
+    def connect(self):
+        self.round_trips += 1
+        connection = StandInConnection(self)
+        connection.next_id = self.next_id
+        return connection
+
+
+def full_snapshot():
+    disk_usage = collector.DiskUsageSample.from_usages([
+        (partition, collector.partition_usage(partition)) for partition in fake_psutil.disk_partitions()
+    ])
+    return Snapshot({
+        "cpu": collector.collect_cpu(),
+        "memory": collector.collect_memory(),
+        "swap_memory": collector.collect_swap_memory(),
+        "io": collector.collect_io(),
+        "disk_usage": disk_usage,
+    })
+
+
+# name -> (setup(iterations) returning per-iteration args, fn, warmup iterations)
+clock = {"now": datetime.datetime(2026, 1, 1)}
+
+def _timestamps(iterations):
+    # One simulated second per tick, never rewinding between warm-up and
+    # measurement, so incidents open and close as they would live
+    timestamps = []
+    for _ in range(iterations):
+        clock["now"] += datetime.timedelta(seconds=1)
+        timestamps.append(clock["now"])
+    return timestamps
+
+def _snapshots(iterations):
+    return [(full_snapshot(), now) for now in _timestamps(iterations)]
+
+def _publish_args(iterations):
+    return [(full_snapshot().sections, []) for _ in range(iterations)]
+
+def build_benchmarks():
+    ws_collector = collector.Collector(sources={})
+    return {
+        "gather_cpu_times": (lambda n: [()] * n, live_info.gather_cpu_times, 5),
+        "get_disk_io_counters": (lambda n: [()] * n, live_info.get_disk_io_counters, 5),
+        "collect_cpu": (lambda n: [()] * n, collector.collect_cpu, 5),
+        "collect_io": (lambda n: [()] * n, collector.collect_io, 5),
+        "log_data": (_snapshots, live_info.log_data, 5),
+        # Past the anomaly warm-up, so baselines and open incidents are in steady state
+        "check_thresholds": (_snapshots, config.check_thresholds, 120),
+        # Collector.publish is the metric_ws encode: one JSON frame per tick
+        "ws_encode": (_publish_args, ws_collector.publish, 5),
+    }
+
+
+def reset_host(cores, disks):
+    # Fresh default thresholds for the new shape, as ingest() writes them on
+    # a first tick, and no incidents carried over from the previous shape
+    fake_psutil.configure(cores, disks)
+    if os.path.exists(config.NOTIF_CONFIG_PATH):
+        os.remove(config.NOTIF_CONFIG_PATH)
+    config._notif_cache["config"] = None
+    config.generate_notif_settings(full_snapshot())
+    config.engine.pending.clear()
+    config.engine.open = None
+
+
+def run_benchmark(db, setup, fn, warmup, iterations):
+    for args in setup(warmup):
+        fn(*args)
+
+    arg_list = setup(iterations)
+    db.round_trips = 0
+    timings = []
+    for args in arg_list:
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    round_trips = db.round_trips / iterations
+
+    # Allocations are traced on a separate call, tracing distorts timings
+    args = setup(1)[0]
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "median_us": round(statistics.median(timings) * 1e6, 2),
+        "p95_us": round(timings[int(len(timings) * 0.95) - 1] * 1e6, 2),
+        "peak_alloc_kb": round((peak - base) / 1024, 2),
+        "round_trips": round(round_trips, 2),
+    }
+
+
+def compare(results, baseline, threshold):
+    # Latency and allocations may grow by threshold; round trips may not grow at all
+    regressions = []
+    for key, result in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        for metric in ("median_us", "peak_alloc_kb"):
+            if previous[metric] and result[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f"{key} {metric}: {previous[metric]} -> {result[metric]}")
+        if result["round_trips"] > previous["round_trips"]:
+            regressions.append(f"{key} round_trips: {previous['round_trips']} -> {result['round_trips']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collection, ingest and alert hot-path benchmarks on simulated hosts")
+    parser.add_argument("--hosts", default=DEFAULT_HOSTS, help="comma separated CORESxDISKS host shapes")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--only", help="comma separated benchmark names")
+    parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE_PATH, help="write results as a baseline file")
+    parser.add_argument("--check", nargs="?", const=DEFAULT_BASELINE_PATH, help="fail on regression against a baseline file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed growth before a regression (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    db = StandInDatabase()
+    live_info.get_db_connection = db.connect
+    alert_engine.get_db_connection = db.connect
+
+    benchmarks = build_benchmarks()
+    if args.only:
+        benchmarks = {name: benchmarks[name] for name in args.only.split(",")}
+
+    results = {}
+    print(f"{'benchmark':<34} {'median':>10} {'p95':>10} {'peak alloc':>12} {'db trips':>9}")
+    for shape in args.hosts.split(","):
+        cores, disks = (int(part) for part in shape.lower().split("x"))
+        for name, (setup, fn, warmup) in benchmarks.items():
+            reset_host(cores, disks)
+            key = f"{name}@{cores}x{disks}"
+            result = run_benchmark(db, setup, fn, warmup, args.iterations)
+            results[key] = result
+            print(f"{key:<34} {result['median_us']:>8.1f}us {result['p95_us']:>8.1f}us "
+                  f"{result['peak_alloc_kb']:>10.1f}KB {result['round_trips']:>9}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "iterations": args.iterations,
+                "results": results,
+            }, f, indent=4)
+        print(f"Saved baseline to {args.save}")
+
+    if args.check:
+        with open(args.check, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.check}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import math
+from collections import namedtuple
+
+# Stand-in for the parts of psutil the collector and live_info use, shaped
+# like a host with a configurable number of cores and disks. Values move a
+# little on every call so encoders and baselines never see a frozen tick.
+# Install with sys.modules["psutil"] = fake_psutil before importing backend modules
+
+scputimes = namedtuple("scputimes", "user system idle")
+svmem = namedtuple("svmem", "total available percent used free")
+sswap = namedtuple("sswap", "total used free percent sin sout")
+sdiskpart = namedtuple("sdiskpart", "device mountpoint fstype opts")
+sdiskusage = namedtuple("sdiskusage", "total used free percent")
+sdiskio = namedtuple("sdiskio", "read_count write_count read_bytes write_bytes read_time write_time")
+
+GIB = 1024 ** 3
+
+host = {"cores": 4, "disks": 1, "calls": 0}
+
+
+class Error(Exception):
+    pass
+
+
+class Process:
+    # Only probed for io_counters support by processes.py
+    def io_counters(self):
+        raise Error("fake process")
+
+
+def configure(cores, disks):
+    host["cores"] = cores
+    host["disks"] = disks
+    host["calls"] = 0
+
+def _tick():
+    host["calls"] += 1
+    return host["calls"]
+
+def cpu_times(percpu=False):
+    t = _tick()
+    cores = [scputimes(1000.0 + t * 0.6 + i, 500.0 + t * 0.2 + i, 9000.0 + t * 0.2 + i) for i in range(host["cores"])]
+    return cores if percpu else cores[0]
+
+def cpu_percent(interval=None, percpu=False):
+    t = _tick()
+    # Slow swings, so busy cores stay over an 80% threshold long enough to alert
+    cores = [round(50 + 40 * math.sin(t / 400 + i), 1) for i in range(host["cores"])]
+    return cores if percpu else sum(cores) / len(cores)
+
+def cpu_count(logical=True):
+    return host["cores"]
+
+def virtual_memory():
+    t = _tick()
+    used = int(16 * GIB * (0.5 + 0.1 * math.sin(t / 20)))
+    return svmem(32 * GIB, 32 * GIB - used, round(used / (32 * GIB) * 100, 1), used, 32 * GIB - used)
+
+def swap_memory():
+    return sswap(4 * GIB, GIB, 3 * GIB, 25.0, 0, 0)
+
+def disk_partitions(all=False):
+    return [sdiskpart(f"/dev/sd{i}1", "/" if i == 0 else f"/mnt/disk{i}", "ext4", "rw") for i in range(host["disks"])]
+
+def disk_usage(path):
+    return sdiskusage(512 * GIB, 256 * GIB, 256 * GIB, 50.0)
+
+def disk_io_counters(perdisk=False):
+    t = _tick()
+    disks = {
+        f"sd{i}": sdiskio(1000 * t + i, 800 * t + i, 4096 * 1000 * t, 4096 * 800 * t, 3 * t, 5 * t)
+        for i in range(host["disks"])
+    }
+    return disks if perdisk else next(iter(disks.values()))
+
+def process_iter(attrs=None, ad_value=None):
+    return iter(())
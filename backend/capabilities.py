@@ -0,0 +1,29 @@
+import functools
+import importlib
+import importlib.util
+
+# Optional subsystems (GPU, ping, interface discovery) import their libraries
+# on first use rather than when the backend is imported: pynvml, ping3 and
+# ifcfg are slow to load or missing on some hosts, and a missing one should
+# only switch its feature off
+
+
+def installed(name):
+    # Capability check without paying for the import
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+@functools.lru_cache(maxsize=None)
+def optional_import(name):
+    # The module, or None if it isn't installed or fails to import; either
+    # outcome is remembered so callers can ask every tick
+    if not installed(name):
+        print(f"Optional module {name} is not installed")
+        return None
+    try:
+        return importlib.import_module(name)
+    except Exception as e:
+        print(f"Optional module {name} failed to import: {e}")
+        return None
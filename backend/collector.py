@@ -0,0 +1,370 @@
+import asyncio
+import datetime
+import functools
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+from instrumentation import stats
+from live_info import list_disk_partitions
+from sampling import QUARANTINE_BASE_SECONDS, QUARANTINE_MAX_SECONDS
+from snapshot import (
+    CpuSample,
+    DiskIoSample,
+    DiskUsageSample,
+    MemorySample,
+    PayloadSample,
+    Snapshot,
+    SwapSample,
+)
+from gpu import collect_gpu, gpu_available
+from latency import collect_latency
+from processes import COLLECT_PROCESSES, PROCESS_SCAN_BUDGET_SECONDS, collect_processes
+
+COLLECTOR_WORKERS = 8
+MAX_PENDING_INGESTS = 10
+
+# Seconds between samples of each family. Ticks land on wall-clock multiples
+# of these, so every family sampled in the same second shares a timestamp
+SOURCE_INTERVALS = {
+    "cpu": 1,
+    "memory": 5,
+    "swap_memory": 60,
+    "io": 5,
+    "disk_usage": 60,
+    "gpu": 5,
+    "latency": 10,
+    "processes": 5,
+}
+
+# Seconds each source gets before the tick goes out without it
+SOURCE_DEADLINES = {
+    "cpu": 0.5,
+    "memory": 0.5,
+    "swap_memory": 0.5,
+    "disk_usage": 1.0,
+    "io": 1.0,
+    "gpu": 1.0,
+    "latency": 1.0,
+    "processes": PROCESS_SCAN_BUDGET_SECONDS + 0.25,
+}
+
+# Collector CPU time (sources, encoding and ingestion) as a fraction of one
+# core. Over budget the collector first slows every family down, doubling
+# intervals up to MAX_SLOWDOWN, then sheds families in SHED_ORDER; below
+# budget * RESTORE_RATIO it undoes those steps one at a time
+OVERHEAD_BUDGET = float(os.getenv("COLLECTOR_OVERHEAD_BUDGET", "0.005"))
+BUDGET_WINDOW_SECONDS = 30
+MAX_SLOWDOWN = 8
+RESTORE_RATIO = 0.5
+SHED_ORDER = ["processes", "latency", "disk_usage", "swap_memory", "gpu", "io", "memory"]
+
+
+# Sources fill typed samples straight from psutil; see snapshot.py
+def collect_cpu():
+    return CpuSample.from_psutil(psutil.cpu_times(percpu=True), psutil.cpu_percent(percpu=True))
+
+def collect_memory():
+    virtual_memory = psutil.virtual_memory()
+    return MemorySample(virtual_memory.available, virtual_memory.percent, virtual_memory.used)
+
+def collect_swap_memory():
+    swap_memory = psutil.swap_memory()
+    return SwapSample(swap_memory.used, swap_memory.free, swap_memory.percent)
+
+# Windows needs diskperf -y ran in cmd.exe
+def collect_io():
+    return DiskIoSample.from_psutil(psutil.disk_io_counters(perdisk=True))
+
+def partition_usage(partition):
+    return psutil.disk_usage(partition.mountpoint)
+
+SOURCES = {
+    "cpu": collect_cpu,
+    "memory": collect_memory,
+    "swap_memory": collect_swap_memory,
+    "io": collect_io,
+    "latency": collect_latency,
+}
+
+def default_sources():
+    # Optional sources join only when the host can actually serve them
+    sources = dict(SOURCES)
+    if gpu_available():
+        sources["gpu"] = collect_gpu
+    if COLLECT_PROCESSES:
+        sources["processes"] = collect_processes
+    return sources
+
+
+class Collector:
+    def __init__(self, ingest=None, sources=None, intervals=SOURCE_INTERVALS,
+                 deadlines=SOURCE_DEADLINES, workers=COLLECTOR_WORKERS, budget=OVERHEAD_BUDGET):
+        # ingest(snapshot, timestamp) receives a Snapshot of only the families sampled that tick
+        self.ingest = ingest
+        # Default sources are probed in start(), so constructing a collector
+        # at import time doesn't initialise NVML
+        self.probe_sources = sources is None
+        self.sources = sources if sources is not None else {}
+        self.intervals = intervals
+        self.deadlines = deadlines
+        self.tick_seconds = functools.reduce(math.gcd, intervals.values())
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="collector")
+        # Ingestion gets its own thread so a hung source never holds up writes
+        self.ingest_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+        # name -> future still running from an earlier tick; never resubmitted until it returns
+        self.in_flight = {}
+        # mountpoint -> (quarantined until, current backoff)
+        self.quarantine = {}
+        # Most recent sample of every family, fresh or not
+        self.sections = {}
+        self.latest = None
+        self.latest_json = None
+        self.subscribers = set()
+        self.pending_ingests = 0
+        self.missed_ticks = 0
+        self.task = None
+
+        self.budget = budget
+        self.slowdown = 1
+        self.shed = []
+        self.overhead = 0.0
+        self.cpu_seconds = 0.0
+        self.cpu_lock = threading.Lock()
+        self.window_start = time.monotonic()
+
+    async def _call(self, name, fn, *args, deadline):
+        # Returns (status, value) with status "ok", "late" or "error". A call
+        # that overruns keeps its worker and stays in in_flight, so a stuck
+        # source only ever ties up one thread
+        running = self.in_flight.get(name)
+        if running is not None and not running.done():
+            return "late", None
+
+        # Coroutine sources (network probes) run on the loop, the rest in the pool
+        if asyncio.iscoroutinefunction(fn):
+            future = asyncio.ensure_future(fn(*args))
+            waiter = future
+        else:
+            future = self.pool.submit(self._timed, fn, *args)
+            waiter = asyncio.wrap_future(future)
+        self.in_flight[name] = future
+        start = time.perf_counter()
+        done, _ = await asyncio.wait({waiter}, timeout=deadline)
+        if not done:
+            stats.incr("source_late", name)
+            return "late", None
+        stats.observe("source", name, time.perf_counter() - start)
+        del self.in_flight[name]
+        try:
+            return "ok", future.result()
+        except PermissionError:
+            return "error", None
+        except Exception as e:
+            stats.incr("source_errors", name)
+            print(f"Error collecting {name}: {e}")
+            return "error", None
+
+    def _timed(self, fn, *args):
+        start = time.thread_time()
+        try:
+            return fn(*args)
+        finally:
+            self._charge(time.thread_time() - start)
+
+    def _charge(self, seconds):
+        with self.cpu_lock:
+            self.cpu_seconds += seconds
+
+    def effective_intervals(self):
+        return {
+            name: interval * self.slowdown
+            for name, interval in self.intervals.items()
+            if name not in self.shed and (name in self.sources or name == "disk_usage")
+        }
+
+    def _enforce_budget(self):
+        # Keep several ticks of the fastest family in every window, or a slowed
+        # down collector would read as idle and flap back to full rate
+        elapsed = time.monotonic() - self.window_start
+        if elapsed < max(BUDGET_WINDOW_SECONDS, 4 * min(self.effective_intervals().values())):
+            return
+        with self.cpu_lock:
+            cpu_seconds, self.cpu_seconds = self.cpu_seconds, 0.0
+        self.window_start = time.monotonic()
+        self.overhead = cpu_seconds / elapsed
+
+        if self.overhead > self.budget:
+            if self.slowdown < MAX_SLOWDOWN:
+                self.slowdown *= 2
+            else:
+                # Only families that actually run cost anything; shedding
+                # an inactive one (gpu without NVML) would change nothing
+                active = self.effective_intervals()
+                remaining = [name for name in SHED_ORDER if name in active]
+                if remaining:
+                    self.shed.append(remaining[0])
+            print(f"Collector over budget ({self.overhead:.4f} > {self.budget}), now {self.effective_intervals()}")
+        elif self.overhead < self.budget * RESTORE_RATIO and (self.shed or self.slowdown > 1):
+            if self.shed:
+                self.shed.pop()
+            else:
+                self.slowdown //= 2
+            print(f"Collector back under budget ({self.overhead:.4f}), now {self.effective_intervals()}")
+
+    def status(self):
+        return {
+            "overhead": round(self.overhead, 6),
+            "budget": self.budget,
+            "slowdown": self.slowdown,
+            "shed": list(self.shed),
+            "effective_intervals": self.effective_intervals(),
+            "missed_ticks": self.missed_ticks,
+            "late": self.latest.late if self.latest else [],
+        }
+
+    async def _collect_source(self, name, fn):
+        status, value = await self._call(name, fn, deadline=self.deadlines.get(name, self.tick_seconds))
+        return name, status, value
+
+    async def _collect_mount(self, partition, deadline):
+        mountpoint = partition.mountpoint
+        until, backoff = self.quarantine.get(mountpoint, (0, 0))
+        if time.monotonic() < until:
+            return partition, "late", None
+
+        status, value = await self._call(f"disk_usage:{mountpoint}", partition_usage, partition, deadline=deadline)
+        if status == "ok":
+            self.quarantine.pop(mountpoint, None)
+        elif status == "late":
+            backoff = min(max(backoff * 2, QUARANTINE_BASE_SECONDS), QUARANTINE_MAX_SECONDS)
+            self.quarantine[mountpoint] = (time.monotonic() + backoff, backoff)
+            print(f"Quarantining {mountpoint} for {backoff}s")
+        return partition, status, value
+
+    async def _collect_disk_usage(self):
+        deadline = self.deadlines.get("disk_usage", self.tick_seconds)
+        status, partitions = await self._call("disk_partitions", list_disk_partitions, deadline=deadline)
+        if status != "ok":
+            return None, ["disk_usage"]
+
+        results = await asyncio.gather(*(self._collect_mount(p, deadline) for p in partitions))
+        usages = []
+        late = []
+        for partition, status, usage in results:
+            if status == "ok":
+                usages.append((partition, usage))
+            elif status == "late":
+                late.append(f"disk_usage:{partition.mountpoint}")
+        return DiskUsageSample.from_usages(usages), late
+
+    async def collect(self, due):
+        # Samples the families in due; returns (fresh sections, late names)
+        jobs = [self._collect_source(name, fn) for name, fn in self.sources.items() if name in due]
+        if "disk_usage" in due:
+            jobs.append(self._collect_disk_usage())
+        results = await asyncio.gather(*jobs)
+
+        fresh = {}
+        late = []
+        if "disk_usage" in due:
+            disk_usage_sample, late = results.pop()
+            if disk_usage_sample is not None:
+                fresh['disk_usage'] = disk_usage_sample
+        for name, status, value in results:
+            if status == "ok":
+                fresh[name] = PayloadSample(name, value) if isinstance(value, dict) else value
+            else:
+                late.append(name)
+        return fresh, late
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=1)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, fresh, late):
+        # Frames carry the latest value of every family; encode once per tick
+        # however many clients are listening, slow clients only see the newest
+        start = time.thread_time()
+        with stats.timed("collector", "encode"):
+            self.sections.update(fresh)
+            self.latest = Snapshot({name: sample for name, sample in self.sections.items() if name not in self.shed}, late)
+            self.latest_json = self.latest.encode()
+        self._charge(time.thread_time() - start)
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+                stats.incr("websocket", "frames_dropped")
+            queue.put_nowait(self.latest_json)
+
+    def _ingest_done(self, future):
+        self.pending_ingests -= 1
+        if future.exception() is not None:
+            print(f"Ingest failed: {future.exception()}")
+
+    def _submit_ingest(self, fresh, timestamp):
+        if self.ingest is None or not fresh:
+            return
+        if self.pending_ingests >= MAX_PENDING_INGESTS:
+            stats.incr("collector", "ingests_dropped")
+            print(f"Ingest backlog full, dropping tick {timestamp}")
+            return
+        self.pending_ingests += 1
+        future = self.ingest_pool.submit(self._timed, self.ingest, Snapshot(fresh), timestamp)
+        asyncio.wrap_future(future).add_done_callback(self._ingest_done)
+
+    async def run(self):
+        base = self.tick_seconds
+        next_tick = (int(time.time()) // base + 1) * base
+        while True:
+            # Sleep to the boundary against the wall clock every time, so
+            # collection time never accumulates into drift
+            delay = next_tick - time.time()
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = next_tick - time.time()
+
+            # After a stall, run only the most recent boundary
+            missed = int(-delay // base)
+            if missed:
+                self.missed_ticks += missed
+                stats.incr("collector", "missed_ticks", missed)
+                next_tick += missed * base
+
+            tick = next_tick
+            next_tick += base
+            # The first tick samples everything so frames start out complete
+            due = {name for name, interval in self.effective_intervals().items() if tick % interval == 0 or self.latest is None}
+            try:
+                fresh, late = await self.collect(due)
+                self.publish(fresh, late)
+                self._submit_ingest(fresh, datetime.datetime.fromtimestamp(tick))
+            except Exception as e:
+                print(f"Collector tick failed: {e}")
+            self._enforce_budget()
+
+    def start(self):
+        if self.probe_sources:
+            self.sources = default_sources()
+            self.probe_sources = False
+        self.task = asyncio.get_running_loop().create_task(self.run())
+        return self.task
+
+    async def stop(self):
+        # Ends the tick loop, then lets ingests already handed off finish writing
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await asyncio.to_thread(self.ingest_pool.shutdown)
@@ -1,9 +1,19 @@
 import json
 import os
-from live_info import get_db_connection
-from datetime import datetime
+import time
+from alert_engine import DEFAULT_ALERT_RULE, engine
+from anomaly import get_detector
 
-def generate_notif_settings(system_info):
+NOTIF_CONFIG_PATH = os.path.join("notif_config.json")
+NOTIF_CONFIG_CHECK_SECONDS = 5
+ALERT_RULES_KEY = "alert_rules"
+# Frame sections that are listings rather than metrics, never thresholded
+NON_THRESHOLD_SECTIONS = {"processes"}
+
+# Parsed notif_config.json and its compiled threshold rules
+_notif_cache = {"config": None, "rules": [], "mtime": None, "checked_at": 0.0}
+
+def generate_notif_settings(snapshot):
     def set_values(obj):
         if isinstance(obj, dict):
             for k, v in obj.items():
@@ -21,14 +31,31 @@ def generate_notif_settings(system_info):
                     obj[k] = v
         return obj
 
-    config_path = os.path.join("notif_config.json")
-    if not os.path.exists(config_path):
-        system_info = set_values(system_info)
-        with open(config_path, "w") as f:
-            json.dump(system_info, f, indent=4)
+    # Cheap once loaded: only sections the config has never seen (a late first
+    # sample, a newly enabled source) get defaults written for them
+    config_dict = _notif_cache["config"]
+    if config_dict is None and os.path.exists(NOTIF_CONFIG_PATH):
+        with open(NOTIF_CONFIG_PATH, "r") as f:
+            config_dict = json.load(f)
+    config_dict = config_dict if config_dict is not None else {}
+    missing = [
+        k for k in snapshot.sections
+        if k not in config_dict and k not in NON_THRESHOLD_SECTIONS
+    ]
+    if not missing and ALERT_RULES_KEY in config_dict:
+        if _notif_cache["config"] is None:
+            reload_notif_config()
+        return
+
+    # to_dict builds fresh dicts, the snapshot itself is still logged and streamed
+    config_dict = {**config_dict, **set_values({k: snapshot.sections[k].to_dict() for k in missing})}
+    config_dict.setdefault(ALERT_RULES_KEY, {"default": dict(DEFAULT_ALERT_RULE)})
+    with open(NOTIF_CONFIG_PATH, "w") as f:
+        json.dump(config_dict, f, indent=4)
+    reload_notif_config()
 
 def update_settings(changes):
-    config_path = os.path.join("notif_config.json")
+    config_path = NOTIF_CONFIG_PATH
     print(f"changes: {changes}")
     if os.path.exists(config_path):
         with open(config_path, "r") as f:
@@ -49,6 +76,7 @@ def update_settings(changes):
 
         with open(config_path, "w") as f:
             json.dump(config_dict, f, indent=4)
+        reload_notif_config()
 
 def setup_email_config(email, app_password):
     email_config_path = os.path.join("email_config.json")
@@ -69,50 +97,69 @@ def setup_email_config(email, app_password):
     except Exception as e:
         print(f"Error setting up email config: {e}")
 
-def check_thresholds(system_info):
-    conn = get_db_connection()
-    current_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    config_path = os.path.join("notif_config.json")
-    if os.path.exists(config_path):
-        with open(config_path, "r") as f:
-            config_dict = json.load(f)
-            with conn.cursor() as cursor:
-                for key, value in system_info.items():
-                    if isinstance(value, dict):
-                        for nested_key, nested_value in value.items():
-                            if isinstance(nested_value, dict):
-                                for nested_nested_key, nested_nested_value in nested_value.items():
-                                    sys_val = system_info[key][nested_key][nested_nested_key]
-                                    conf_val = config_dict[key][nested_key][nested_nested_key]
-                                    if (
-                                        (isinstance(sys_val, (float, int)) and isinstance(conf_val, (float, int)))
-                                        and sys_val >= conf_val
-                                    ):
-                                        cursor.execute(
-                                            "INSERT INTO alerts (timestamp, component, value, threshold_value, sent) VALUES (%s, %s, %s, %s, %s)",
-                                            (current_timestamp, f"{key}-{nested_key}-{nested_nested_key}", sys_val, conf_val, False)
-                                        )
-                            else:
-                                sys_val = system_info[key][nested_key]
-                                conf_val = config_dict[key][nested_key]
-                                if (
-                                    (isinstance(sys_val, (float, int)) and isinstance(conf_val, (float, int)))
-                                    and sys_val >= conf_val
-                                ):
-                                    cursor.execute(
-                                        "INSERT INTO alerts (timestamp, component, value, threshold_value, sent) VALUES (%s, %s, %s, %s, %s)",
-                                        (current_timestamp, f"{key}-{nested_key}", sys_val, conf_val, False)
-                                    )
-                    else:
-                        sys_val = system_info[key]
-                        conf_val = config_dict[key]
-                        if (
-                            (isinstance(sys_val, (float, int)) and isinstance(conf_val, (float, int)))
-                            and sys_val >= conf_val
-                        ):
-                            cursor.execute(
-                                "INSERT INTO alerts (timestamp, component, value, threshold_value, sent) VALUES (%s, %s, %s, %s, %s)",
-                                (current_timestamp, key, sys_val, conf_val, False)
-                            )
-    conn.commit()
-    conn.close()
+def _flatten_thresholds(config_dict, path=()):
+    # Flatten the nested config into (path, component, threshold) rows,
+    # dropping blank ('') thresholds that have nothing to check
+    rows = []
+    for key, value in config_dict.items():
+        if isinstance(value, dict):
+            rows.extend(_flatten_thresholds(value, path + (key,)))
+        elif isinstance(value, (float, int)) and not isinstance(value, bool):
+            full_path = path + (key,)
+            rows.append((full_path, "-".join(full_path), value))
+    return rows
+
+def _compile_rules(config_dict):
+    # Each rule is (path, component, fire, clear, for_seconds); alert_rules
+    # holds a default duration/clear margin plus optional per-section overrides
+    rule_settings = config_dict.get(ALERT_RULES_KEY, {})
+    default = {**DEFAULT_ALERT_RULE, **rule_settings.get("default", {})}
+    thresholds = {k: v for k, v in config_dict.items() if k != ALERT_RULES_KEY}
+    rules = []
+    for path, component, fire in _flatten_thresholds(thresholds):
+        settings = {**default, **rule_settings.get(path[0], {})}
+        clear_margin = settings["clear_margin"] if isinstance(settings["clear_margin"], (float, int)) else 0
+        for_seconds = settings["for_seconds"] if isinstance(settings["for_seconds"], (float, int)) else 0
+        rules.append((path, component, fire, fire - clear_margin, for_seconds))
+    return rules
+
+def _load_notif_config():
+    mtime = os.path.getmtime(NOTIF_CONFIG_PATH)
+    with open(NOTIF_CONFIG_PATH, "r") as f:
+        config_dict = json.load(f)
+    _notif_cache["config"] = config_dict
+    _notif_cache["rules"] = _compile_rules(config_dict)
+    _notif_cache["mtime"] = mtime
+
+def reload_notif_config():
+    _notif_cache["checked_at"] = time.monotonic()
+    if os.path.exists(NOTIF_CONFIG_PATH):
+        _load_notif_config()
+
+def get_notif_config():
+    # Stat the file at most every NOTIF_CONFIG_CHECK_SECONDS and only re-parse on a new mtime
+    now = time.monotonic()
+    if now - _notif_cache["checked_at"] >= NOTIF_CONFIG_CHECK_SECONDS:
+        _notif_cache["checked_at"] = now
+        try:
+            if os.path.getmtime(NOTIF_CONFIG_PATH) != _notif_cache["mtime"]:
+                _load_notif_config()
+        except OSError:
+            pass
+    return _notif_cache["config"]
+
+def evaluate_thresholds(snapshot):
+    # Each rule reads its column slot directly; no walk over the whole tick
+    get_notif_config()
+    readings = []
+    for path, component, fire, clear, for_seconds in _notif_cache["rules"]:
+        value = snapshot.value(path)
+        if value is not None:
+            readings.append((component, value, fire, clear, for_seconds))
+    return readings
+
+def check_thresholds(snapshot, now=None, intervals=None):
+    # Static thresholds and learned baselines share one incident pass;
+    # intervals (family -> seconds between samples) pace its timers
+    readings = evaluate_thresholds(snapshot) + get_detector().observe(snapshot, now)
+    engine.process(readings, now, intervals)
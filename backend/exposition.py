@@ -0,0 +1,120 @@
+import functools
+import math
+
+# OpenMetrics text rendering of the collector's latest snapshot for /metrics.
+# The body is rendered at most once per tick, on the first scrape after it,
+# and every other scrape of the same tick gets the cached bytes
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+METRIC_PREFIX = "webspecs"
+
+CPU_MODES = (("user_time", "user"), ("system_time", "system"), ("idle_time", "idle"))
+# (column, metric, type, unit, help, scale) per disk IO counter
+DISK_IO_METRICS = (
+    ("read_count", "disk_reads", "counter", "", "Completed disk reads", 1),
+    ("write_count", "disk_writes", "counter", "", "Completed disk writes", 1),
+    ("read_bytes", "disk_read_bytes", "counter", "bytes", "Bytes read from disk", 1),
+    ("write_bytes", "disk_written_bytes", "counter", "bytes", "Bytes written to disk", 1),
+    ("read_time", "disk_read_time_seconds", "counter", "seconds", "Time spent reading", 0.001),
+    ("write_time", "disk_write_time_seconds", "counter", "seconds", "Time spent writing", 0.001),
+)
+DISK_USAGE_METRICS = (
+    ("total", "disk_total_bytes", "bytes", "Filesystem size"),
+    ("used", "disk_used_bytes", "bytes", "Filesystem space used"),
+    ("free", "disk_free_bytes", "bytes", "Filesystem space free"),
+    ("percent", "disk_usage_percent", "", "Filesystem space used, percent"),
+)
+MEMORY_METRICS = (
+    ("memory", "available_memory", "memory_available_bytes", "bytes", "Memory available to processes"),
+    ("memory", "used_memory", "memory_used_bytes", "bytes", "Memory in use"),
+    ("memory", "memory_percent_usage", "memory_usage_percent", "", "Memory in use, percent"),
+    ("swap_memory", "used_memory", "swap_used_bytes", "bytes", "Swap in use"),
+    ("swap_memory", "free_memory", "swap_free_bytes", "bytes", "Swap free"),
+    ("swap_memory", "percent_usage", "swap_usage_percent", "", "Swap in use, percent"),
+)
+
+
+def _number(value):
+    # repr matches OpenMetrics for finite numbers, but writes nan and inf
+    if math.isfinite(value):
+        return repr(value)
+    return "NaN" if math.isnan(value) else ("+Inf" if value > 0 else "-Inf")
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _family(lines, name, metric_type, unit, help_text):
+    lines.append(f"# TYPE {METRIC_PREFIX}_{name} {metric_type}")
+    if unit:
+        lines.append(f"# UNIT {METRIC_PREFIX}_{name} {unit}")
+    lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+
+@functools.lru_cache(maxsize=16)
+def _core_prefixes(name, count, mode=None):
+    # Sample name plus labels for every core, built once per layout
+    mode_label = f',mode="{mode}"' if mode else ""
+    return tuple(f'{METRIC_PREFIX}_{name}{{core="{i+1}"{mode_label}}} ' for i in range(count))
+
+@functools.lru_cache(maxsize=64)
+def _device_prefixes(name, labels):
+    # labels: tuple of label strings, one per device
+    return tuple(f"{METRIC_PREFIX}_{name}{{{label}}} " for label in labels)
+
+
+def render_openmetrics(snapshot):
+    sections = snapshot.sections
+    lines = []
+
+    cpu = sections.get("cpu")
+    if cpu is not None:
+        count = len(cpu.percent)
+        _family(lines, "cpu_seconds", "counter", "seconds", "CPU time per core and mode")
+        for column, mode in CPU_MODES:
+            lines.extend(map(str.__add__, _core_prefixes("cpu_seconds_total", count, mode), map(_number, getattr(cpu, column))))
+        _family(lines, "cpu_usage_percent", "gauge", "", "CPU utilisation per core, percent")
+        lines.extend(map(str.__add__, _core_prefixes("cpu_usage_percent", count), map(_number, cpu.percent)))
+
+    for section, field, name, unit, help_text in MEMORY_METRICS:
+        sample = sections.get(section)
+        if sample is not None:
+            _family(lines, name, "gauge", unit, help_text)
+            lines.append(f"{METRIC_PREFIX}_{name} {_number(getattr(sample, field))}")
+
+    disk_usage = sections.get("disk_usage")
+    if disk_usage is not None and disk_usage.devices:
+        labels = tuple(
+            f'device="{_escape(device)}",mountpoint="{_escape(mountpoint)}",fstype="{_escape(fstype)}"'
+            for device, mountpoint, fstype in zip(disk_usage.devices, disk_usage.mountpoint, disk_usage.fstype)
+        )
+        for column, name, unit, help_text in DISK_USAGE_METRICS:
+            _family(lines, name, "gauge", unit, help_text)
+            lines.extend(map(str.__add__, _device_prefixes(name, labels), map(_number, getattr(disk_usage, column))))
+
+    io = sections.get("io")
+    if io is not None and io.devices:
+        labels = tuple(f'device="{_escape(device)}"' for device in io.devices)
+        for column, name, metric_type, unit, help_text, scale in DISK_IO_METRICS:
+            _family(lines, name, metric_type, unit, help_text)
+            values = getattr(io, column)
+            if scale != 1:
+                values = [value * scale for value in values]
+            lines.extend(map(str.__add__, _device_prefixes(f"{name}_total", labels), map(_number, values)))
+
+    lines.append("# EOF\n")
+    return "\n".join(lines)
+
+
+class MetricsCache:
+    def __init__(self):
+        self.snapshot = None
+        self.body = b""
+
+    def render(self, snapshot):
+        # The collector publishes a new Snapshot object every tick, so identity
+        # is enough to tell whether the cached body is current
+        if snapshot is not self.snapshot:
+            self.body = render_openmetrics(snapshot).encode()
+            self.snapshot = snapshot
+        return self.body
+
+
+metrics_cache = MetricsCache()
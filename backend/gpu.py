@@ -0,0 +1,115 @@
+import atexit
+import math
+import os
+import threading
+import time
+
+from capabilities import optional_import
+
+# nvml talks to NVIDIA drivers, fake generates synthetic devices for machines
+# without a GPU, none turns GPU collection off
+GPU_BACKEND = os.getenv("GPU_BACKEND", "nvml")
+FAKE_GPU_COUNT = int(os.getenv("FAKE_GPU_COUNT", "2"))
+
+
+class NvmlBackend:
+    vendor = "NVIDIA"
+
+    def __init__(self):
+        pynvml = optional_import("pynvml")
+        if pynvml is None:
+            raise RuntimeError("pynvml is not available")
+        self.nvml = pynvml
+        pynvml.nvmlInit()
+        # Handles and names don't change for the life of the session
+        self.handles = [pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(pynvml.nvmlDeviceGetCount())]
+        self.names = []
+        for handle in self.handles:
+            name = pynvml.nvmlDeviceGetName(handle)
+            self.names.append(name.decode() if isinstance(name, bytes) else name)
+
+    def sample(self):
+        nvml = self.nvml
+        devices = []
+        for name, handle in zip(self.names, self.handles):
+            memory = nvml.nvmlDeviceGetMemoryInfo(handle)
+            utilization = nvml.nvmlDeviceGetUtilizationRates(handle)
+            devices.append({
+                'name': name,
+                'memory_total': memory.total,
+                'memory_used': memory.used,
+                'memory_free': memory.free,
+                'memory_percent': round(memory.used / memory.total * 100, 2) if memory.total else 0.0,
+                'temperature': nvml.nvmlDeviceGetTemperature(handle, nvml.NVML_TEMPERATURE_GPU),
+                'gpu_utilization': utilization.gpu,
+                'memory_utilization': utilization.memory,
+            })
+        return devices
+
+    def close(self):
+        self.nvml.nvmlShutdown()
+
+
+class FakeBackend:
+    vendor = "Fake"
+
+    def __init__(self, count=FAKE_GPU_COUNT):
+        self.names = [f"Fake GPU {i}" for i in range(count)]
+        self.memory_total = 8 * 1024**3
+
+    def sample(self):
+        now = time.time()
+        devices = []
+        for i, name in enumerate(self.names):
+            load = (math.sin(now / 60 + i) + 1) / 2
+            memory_used = int(self.memory_total * (0.2 + 0.6 * load))
+            devices.append({
+                'name': name,
+                'memory_total': self.memory_total,
+                'memory_used': memory_used,
+                'memory_free': self.memory_total - memory_used,
+                'memory_percent': round(memory_used / self.memory_total * 100, 2),
+                'temperature': round(40 + 40 * load, 1),
+                'gpu_utilization': round(100 * load, 1),
+                'memory_utilization': round(80 * load, 1),
+            })
+        return devices
+
+    def close(self):
+        pass
+
+
+BACKENDS = {
+    "nvml": NvmlBackend,
+    "fake": FakeBackend,
+}
+
+_backend = None
+_backend_error = None
+_lock = threading.Lock()
+
+def get_backend():
+    # Initialised once per process; a failed init is remembered rather than retried every tick
+    global _backend, _backend_error
+    with _lock:
+        if _backend is None and _backend_error is None:
+            if GPU_BACKEND not in BACKENDS:
+                _backend_error = f"GPU backend '{GPU_BACKEND}' not available"
+            else:
+                try:
+                    _backend = BACKENDS[GPU_BACKEND]()
+                    atexit.register(_backend.close)
+                except Exception as e:
+                    _backend_error = str(e)
+                    print(f"GPU collection disabled: {e}")
+        return _backend
+
+def gpu_available():
+    backend = get_backend()
+    return backend is not None and len(backend.names) > 0
+
+def get_backend_error():
+    return _backend_error
+
+def collect_gpu():
+    return {f"gpu_{i}": device for i, device in enumerate(get_backend().sample())}
@@ -0,0 +1,190 @@
+import asyncio
+import bisect
+import functools
+import re
+import time
+
+# Latency histograms and counters for the backend's own hot paths: collection
+# sources, DB statement families, routes, WebSocket sends and scheduler jobs.
+# Recording is a perf_counter pair, a bisect and a few integer adds with no
+# locking; a concurrent increment can very rarely be lost, which is fine for
+# diagnostics and keeps the cost well under a microsecond
+
+# Upper bucket bounds in seconds, doubling from 50us to ~105s
+BUCKET_BOUNDS = tuple(0.00005 * 2 ** i for i in range(22))
+QUANTILES = (0.5, 0.9, 0.99)
+CALIBRATION_ROUNDS = 20000
+
+# First table a statement reads or writes, for "insert cpu_metrics" style families
+TABLE_PATTERN = re.compile(r"\b(?:from|into|update)\s+\"?(\w+)", re.IGNORECASE)
+STATEMENT_HEAD_CHARS = 400
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKET_BOUNDS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else None,
+            "max_ms": round(self.max * 1000, 3),
+            **{f"p{int(q * 100)}_ms": round(self.quantile(q) * 1000, 3) if self.count else None for q in QUANTILES},
+        }
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Stats:
+    def __init__(self):
+        # kind -> name -> Histogram / int
+        self.histograms = {}
+        self.counters = {}
+        self.started_at = time.time()
+        self.observation_cost = None
+
+    def histogram(self, kind, name):
+        try:
+            return self.histograms[kind][name]
+        except KeyError:
+            return self.histograms.setdefault(kind, {}).setdefault(name, Histogram())
+
+    def observe(self, kind, name, seconds):
+        self.histogram(kind, name).observe(seconds)
+
+    def incr(self, kind, name, amount=1):
+        counters = self.counters.setdefault(kind, {})
+        counters[name] = counters.get(name, 0) + amount
+
+    def timed(self, kind, name):
+        return _Timer(self.histogram(kind, name))
+
+    def calibrate(self):
+        # Cost of one timed block against a private histogram, measured once
+        timer = _Timer(Histogram())
+        start = time.perf_counter()
+        for _ in range(CALIBRATION_ROUNDS):
+            with timer:
+                pass
+        self.observation_cost = (time.perf_counter() - start) / CALIBRATION_ROUNDS
+        return self.observation_cost
+
+    def report(self):
+        if self.observation_cost is None:
+            self.calibrate()
+        observations = sum(h.count for names in self.histograms.values() for h in names.values())
+        uptime = time.time() - self.started_at
+        return {
+            "uptime_seconds": round(uptime, 1),
+            "latency": {
+                kind: {name: histogram.summary() for name, histogram in sorted(names.items())}
+                for kind, names in sorted(self.histograms.items())
+            },
+            "counters": {kind: dict(sorted(names.items())) for kind, names in sorted(self.counters.items())},
+            # What recording itself has cost, from the calibrated per-observation time
+            "overhead": {
+                "per_observation_us": round(self.observation_cost * 1e6, 3),
+                "observations": observations,
+                "seconds": round(observations * self.observation_cost, 6),
+                "fraction_of_uptime": round(observations * self.observation_cost / uptime, 8) if uptime else None,
+            },
+        }
+
+
+stats = Stats()
+
+def timed(kind, name):
+    return stats.timed(kind, name)
+
+def instrument(kind, name):
+    # Decorator form of timed() for sync and async callables (scheduler jobs)
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with stats.timed(kind, name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stats.timed(kind, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def statement_family(sql):
+    # Statements are grouped by verb and first table; only the head is scanned,
+    # which is noise next to the round trip it is timing
+    if isinstance(sql, bytes):
+        sql = sql.decode(errors="replace")
+    head = sql[:STATEMENT_HEAD_CHARS]
+    words = head.split(None, 1)
+    verb = words[0].lower() if words else "unknown"
+    table = TABLE_PATTERN.search(head)
+    return f"{verb} {table.group(1)}" if table else verb
+
+
+class StatsMiddleware:
+    # Plain ASGI middleware: per-route latency keyed by the route template
+    # (/gpu/{metric}) rather than the raw path, plus 5xx counts
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            name = f"{scope['method']} {route.path if route is not None else 'unmatched'}"
+            stats.observe("route", name, time.perf_counter() - start)
+            if status >= 500:
+                stats.incr("route_errors", name)
@@ -0,0 +1,99 @@
+import asyncio
+import functools
+import os
+import time
+from urllib.parse import urlsplit
+
+from capabilities import optional_import
+from live_info import get_local_address
+
+# Comma separated tcp://host:port and icmp://host targets. {local} stands for
+# this host's first non-loopback address, which is what get_ping measured
+LATENCY_TARGETS = os.getenv("LATENCY_TARGETS", "icmp://{local}")
+PROBE_COUNT = 3
+PROBE_TIMEOUT_SECONDS = 0.9
+
+
+def parse_targets(spec=LATENCY_TARGETS):
+    targets = []
+    for raw in spec.split(","):
+        raw = raw.strip()
+        if not raw:
+            continue
+        if "{local}" in raw:
+            local = get_local_address()
+            if local is None:
+                continue
+            raw = raw.replace("{local}", local)
+        parts = urlsplit(raw if "://" in raw else f"icmp://{raw}")
+        if parts.scheme == "tcp" and parts.port is None:
+            print(f"Skipping latency target {raw}: tcp targets need a port")
+            continue
+        if parts.scheme not in ("tcp", "icmp"):
+            print(f"Skipping latency target {raw}: unknown method {parts.scheme}")
+            continue
+        if parts.scheme == "icmp" and optional_import("ping3") is None:
+            print(f"Skipping latency target {raw}: icmp targets need ping3")
+            continue
+        targets.append((raw, parts.scheme, parts.hostname, parts.port))
+    return targets
+
+
+async def probe_tcp(host, port, timeout):
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    elapsed = (time.perf_counter() - start) * 1000
+    writer.close()
+    return elapsed
+
+
+async def probe_icmp(host, timeout):
+    # ping3 is blocking, so each echo waits in the default executor
+    loop = asyncio.get_running_loop()
+    ping = optional_import("ping3").ping
+    try:
+        result = await loop.run_in_executor(None, functools.partial(ping, host, timeout=timeout, unit="ms"))
+    except Exception:
+        return None
+    return result if result else None
+
+
+async def probe_target(method, host, port, count=PROBE_COUNT, timeout=PROBE_TIMEOUT_SECONDS):
+    if method == "tcp":
+        probes = [probe_tcp(host, port, timeout) for _ in range(count)]
+    else:
+        probes = [probe_icmp(host, timeout) for _ in range(count)]
+    results = [r for r in await asyncio.gather(*probes) if r is not None]
+    loss_percent = round((count - len(results)) / count * 100, 2)
+    if not results:
+        return {"min_ms": None, "avg_ms": None, "max_ms": None, "loss_percent": loss_percent}
+    return {
+        "min_ms": round(min(results), 3),
+        "avg_ms": round(sum(results) / len(results), 3),
+        "max_ms": round(max(results), 3),
+        "loss_percent": loss_percent,
+    }
+
+
+class LatencyProber:
+    def __init__(self, spec=LATENCY_TARGETS):
+        self.spec = spec
+        self.targets = None
+
+    async def collect(self):
+        # Targets (and the local address) are resolved on the first probe only
+        if self.targets is None:
+            self.targets = await asyncio.to_thread(parse_targets, self.spec)
+        results = await asyncio.gather(*(
+            probe_target(method, host, port) for _, method, host, port in self.targets
+        ))
+        return {target[0]: stats for target, stats in zip(self.targets, results)}
+
+
+prober = LatencyProber()
+
+async def collect_latency():
+    return await prober.collect()
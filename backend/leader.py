@@ -0,0 +1,207 @@
+import asyncio
+import atexit
+import functools
+import hashlib
+import os
+import threading
+import time
+
+from live_info import HOST_NAME, get_db_connection
+
+# A lease is a session-level Postgres advisory lock held on a dedicated
+# connection. The holder renews it by heartbeating that connection; if the
+# process dies the lock is freed with the session, and if it hangs the server
+# ends the idle session after LEASE_SECONDS. That needs Postgres 14+
+# (idle_session_timeout); older servers only notice a dead host or network.
+HEARTBEAT_SECONDS = int(os.getenv("LEADER_HEARTBEAT_SECONDS", "5"))
+LEASE_SECONDS = int(os.getenv("LEADER_LEASE_SECONDS", "15"))
+
+DIGEST_LEASE = "digest"
+COLLECTOR_LEASE = f"collector:{HOST_NAME}"
+ROLLUP_LEASE = "rollup"
+
+
+def lock_key(name):
+    # Advisory locks take a signed 64-bit key
+    digest = hashlib.blake2b(name.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+# Followers try for every lease they don't hold on one shared connection per
+# process, instead of a new one per lease per heartbeat. The connection that
+# wins a lock becomes that lease's, and the next attempt opens another
+_follower = None
+_follower_lock = threading.Lock()
+_warned_no_idle_timeout = False
+
+def _warn_no_idle_timeout():
+    global _warned_no_idle_timeout
+    if not _warned_no_idle_timeout:
+        _warned_no_idle_timeout = True
+        print("Postgres has no idle_session_timeout (needs 14+); a hung leader keeps its leases until restarted")
+
+def _session():
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            try:
+                cursor.execute("SET idle_session_timeout = %s", (f"{LEASE_SECONDS}s",))
+            except Exception:
+                # idle_session_timeout needs Postgres 14+, fall back to keepalives.
+                # Those only catch a dead host or network: a leader that hangs
+                # with its connection up keeps the lease until it is restarted
+                _warn_no_idle_timeout()
+                cursor.execute("SET tcp_keepalives_idle = %s", (HEARTBEAT_SECONDS,))
+                cursor.execute("SET tcp_keepalives_interval = %s", (HEARTBEAT_SECONDS,))
+                cursor.execute("SET tcp_keepalives_count = 2")
+    except Exception as e:
+        print(f"Error opening lease session: {e}")
+        _close(conn)
+        return None
+    return conn
+
+def _close(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+def _try_lock(key):
+    # -> the connection that now holds key's advisory lock, or None
+    global _follower
+    with _follower_lock:
+        for _ in range(2):
+            reused = _follower is not None
+            if _follower is None:
+                _follower = _session()
+                if _follower is None:
+                    return None
+            conn = _follower
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_try_advisory_lock(%s)", (key,))
+                    acquired = cursor.fetchone()[0]
+            except Exception as e:
+                _follower = None
+                _close(conn)
+                if reused:
+                    # Idle since every lease was held, so the server ended it
+                    continue
+                print(f"Error trying lock {key}: {e}")
+                return None
+            if not acquired:
+                return None
+            # The lock lives with this session, so the lease takes the connection
+            _follower = None
+            return conn
+    return None
+
+def _close_follower():
+    global _follower
+    with _follower_lock:
+        if _follower is not None:
+            _close(_follower)
+        _follower = None
+
+
+class Lease:
+    def __init__(self, name):
+        self.name = name
+        self.key = lock_key(name)
+        self.conn = None
+        self.renewed_at = 0.0
+        self.lock = threading.Lock()
+        # Called on the heartbeat thread each time the lease is (re)acquired,
+        # so state kept while leading can be reloaded
+        self.on_acquire = []
+
+    def is_held(self):
+        return self.conn is not None and time.monotonic() - self.renewed_at < LEASE_SECONDS
+
+    def heartbeat(self):
+        with self.lock:
+            if self.conn is None:
+                self._acquire()
+                return
+            try:
+                with self.conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                self.renewed_at = time.monotonic()
+            except Exception as e:
+                print(f"Lost lease {self.name}: {e}")
+                self._drop()
+
+    def release(self):
+        with self.lock:
+            self._drop()
+
+    def _acquire(self):
+        conn = _try_lock(self.key)
+        if conn is not None:
+            print(f"Acquired lease {self.name}")
+            self.conn = conn
+            self.renewed_at = time.monotonic()
+            for callback in self.on_acquire:
+                callback()
+
+    def _drop(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+        self.conn = None
+        self.renewed_at = 0.0
+
+
+_leases = {}
+
+
+def lease(name):
+    if name not in _leases:
+        _leases[name] = Lease(name)
+    return _leases[name]
+
+
+def is_leader(name):
+    return lease(name).is_held()
+
+
+def heartbeat_all():
+    for held in list(_leases.values()):
+        held.heartbeat()
+
+
+def release_all():
+    for held in list(_leases.values()):
+        held.release()
+    _close_follower()
+
+
+def leader_only(name):
+    # Registering up front means the heartbeat job starts competing for it
+    lease(name)
+
+    def wrap(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def run_async(*args, **kwargs):
+                if not is_leader(name):
+                    return None
+                return await fn(*args, **kwargs)
+            return run_async
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            if not is_leader(name):
+                return None
+            return fn(*args, **kwargs)
+        return run
+
+    return wrap
+
+
+atexit.register(release_all)
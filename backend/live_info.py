@@ -1,27 +1,69 @@
-from fastapi import FastAPI, WebSocket
-import asyncio
-import psutil
-import json
-
-from ping3 import ping
-import ifcfg 
-import platform
-import pynvml
-import pyadl
-import subprocess
-import psycopg2
+import functools
 import os
 import datetime
+import socket
+import time
+from gpu import get_backend as get_gpu_backend, get_backend_error
+from capabilities import optional_import
+from instrumentation import stats, statement_family
+from query_guard import current_guard
+from sampling import (
+    gather_cpu_percents,
+    gather_cpu_times,
+    gather_swap_memory_stats,
+    gather_virtual_memory_stats,
+    get_disk_io_counters,
+    get_disk_usage,
+    get_partition_usage,
+    list_disk_partitions,
+)
+
+# Every stored row carries the host it was sampled on
+HOST_NAME = os.getenv("HOST_NAME") or socket.gethostname()
+HOST_REGISTRATION_SECONDS = 600
+
+@functools.lru_cache(maxsize=1)
+def timed_cursor():
+    # Built on the first connection, so importing this module doesn't load psycopg2
+    from psycopg2.extensions import cursor as base_cursor
+
+    class TimedCursor(base_cursor):
+        # Every statement is timed under its family ("insert cpu_metrics"), which
+        # covers execute_values pages too since they go through execute
+        def execute(self, query, vars=None):
+            guard = current_guard()
+            if guard is not None:
+                guard.check()
+            start = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            except Exception as e:
+                # 57014: statement_timeout expired or the statement was cancelled
+                if getattr(e, "pgcode", None) == "57014":
+                    stats.incr("db_cancelled", statement_family(query))
+                raise
+            finally:
+                stats.observe("db", statement_family(query), time.perf_counter() - start)
+
+    return TimedCursor
 
 def get_db_connection():
+    import psycopg2
+    # Inside a guarded request the connection carries its deadline and can be cancelled
+    guard = current_guard()
     try:
-        connection = psycopg2.connect(
-            dbname="web_specs",
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PW"),
-            host=os.getenv("DB_HOST"),
-            port="5433"
-        )
+        with stats.timed("db", "connect"):
+            connection = psycopg2.connect(
+                dbname="web_specs",
+                user=os.getenv("DB_USER"),
+                password=os.getenv("DB_PW"),
+                host=os.getenv("DB_HOST"),
+                port="5433",
+                cursor_factory=timed_cursor(),
+                options=guard.options() if guard is not None else None
+            )
+        if guard is not None:
+            guard.attach(connection)
         print("Database connection successful")
         return connection
     except psycopg2.Error as e:
@@ -31,154 +73,194 @@ def get_db_connection():
 def get_gpu_stats():
     gpu_info = {}
     try:
-        pynvml.nvmlInit()
-        device_count = pynvml.nvmlDeviceGetCount()
-        gpus = []
-        for i in range(device_count):
-            handle = pynvml.nvmlDeviceGetHandleByIndex(i)
-            name = pynvml.nvmlDeviceGetName(handle).decode()
-            memory = pynvml.nvmlDeviceGetMemoryInfo(handle)
-            temperature = pynvml.nvmlDeviceGetTemperature(handle, pynvml.NVML_TEMPERATURE_GPU)
-            utilization = pynvml.nvmlDeviceGetUtilizationRates(handle)
-            gpus.append({
-                'name': name,
-                'memory_total': memory.total,
-                'memory_used': memory.used,
-                'memory_free': memory.free,
-                'temperature': temperature,
-                'gpu_utilization': utilization.gpu,
-                'memory_utilization': utilization.memory
-            })
-        gpu_info['vendor'] = 'NVIDIA'
-        gpu_info['gpus'] = gpus 
-        pynvml.nvmlShutdown()
+        backend = get_gpu_backend()
+        if backend is None:
+            raise RuntimeError(get_backend_error())
+        gpu_info['vendor'] = backend.vendor
+        gpu_info['gpus'] = backend.sample()
     except Exception as e:
         gpu_info['error'] = str(e)
     return gpu_info
 
+@functools.lru_cache(maxsize=1)
+def get_local_address():
+    # ifcfg shells out to ifconfig/ip, so interfaces are only resolved once
+    ifcfg = optional_import("ifcfg")
+    if ifcfg is None:
+        return None
+    try:
+        for iface in ifcfg.interfaces().values():
+            if iface.get('inet') and iface['inet'] != '127.0.0.1':
+                return iface['inet']
+    except Exception as e:
+        print(f"error: {e}")
+    return None
+
 def get_ping():
     try:
-        interfaces = ifcfg.interfaces()
-        ip = None
-        for iface in interfaces.values():
-            if 'inet' in iface and iface['inet'] != '127.0.0.1':
-                ip = iface['inet']
-                break
-        if ip:
-            result = ping(ip)
+        ip = get_local_address()
+        ping3 = optional_import("ping3")
+        if ip and ping3 is not None:
+            result = ping3.ping(ip)
             return result * 1000000 if result else None
         return None
     except Exception as e:
-        print("error: {e}")
+        print(f"error: {e}")
         return None
 
-def gather_cpu_times():
-    cpu_times = psutil.cpu_times(percpu=True)
+# host -> monotonic time it was last written to the hosts registry
+_registered_hosts = {}
 
-    user_time = {f"core_{i+1}": core[0] for i, core in enumerate(cpu_times)}
-    system_time = {f"core_{i+1}": core[1] for i, core in enumerate(cpu_times)}
-    idle_time = {f"core_{i+1}": core[2] for i, core in enumerate(cpu_times)}
-    
-    return user_time, system_time, idle_time
-
-def gather_cpu_percents():
-    cpu_percents = psutil.cpu_percent(percpu=True)
-    return {f"core_{i+1}": percent for i, percent in enumerate(cpu_percents)}
-
-def gather_virtual_memory_stats():
-    virtual_memory = psutil.virtual_memory()
-    return virtual_memory[1], virtual_memory[2], virtual_memory[3]
-
-def gather_swap_memory_stats():
-    swap_memory = psutil.swap_memory()
-    return swap_memory[1], swap_memory[2], swap_memory[3]
-
-def get_disk_usage():
-    disk_partitions = psutil.disk_partitions()
-    disk_usage_info = {}
-    for partition in disk_partitions:
-        try:
-            usage = psutil.disk_usage(partition.mountpoint)
-            disk_usage_info[partition.device] = {
-                "mountpoint": partition.mountpoint,
-                "fstype": partition.fstype,
-                "total": usage.total,
-                "used": usage.used,
-                "free": usage.free,
-                "percent": usage.percent
-            }
-        except PermissionError:
-            continue
-    return disk_usage_info
-
-# Windows needs diskperf -y ran in cmd.exe
-def get_disk_io_counters():
-    raw_disks = psutil.disk_io_counters(perdisk=True)
-    result = {}
-    for key, value in raw_disks.items():
-        result[key] = {
-            'read_count': value.read_count,
-            'write_count': value.write_count,
-            'read_bytes': value.read_bytes,
-            'write_bytes': value.write_bytes,
-            'read_time': value.read_time,
-            'write_time': value.write_time,
-        }
-    return result
-
-def log_data(system_info):
+def register_host(cursor, host, now):
+    # Fleet queries list hosts from this table instead of scanning metrics;
+    # last_seen only needs to be roughly current, so it is refreshed rarely
+    registered = _registered_hosts.get(host)
+    if registered is not None and time.monotonic() - registered < HOST_REGISTRATION_SECONDS:
+        return
+    cursor.execute(
+        """INSERT INTO hosts (host, first_seen, last_seen) VALUES (%s, %s, %s)
+        ON CONFLICT (host) DO UPDATE SET last_seen = GREATEST(hosts.last_seen, EXCLUDED.last_seen)""",
+        (host, now, now)
+    )
+    _registered_hosts[host] = time.monotonic()
+
+# execute_values statements per table, in the order a tick has always been written
+INSERTS = {
+    "cpu_metrics": "INSERT INTO cpu_metrics (host, timestamp, core_id, user_time, system_time, idle_time, percent_usage) VALUES %s",
+    "disk_io_metrics": "INSERT INTO disk_io_metrics (host, timestamp, device_name, read_count, write_count, read_bytes, write_bytes, read_time, write_time) VALUES %s",
+    "disk_usage_metrics": "INSERT INTO disk_usage_metrics (host, timestamp, device_name, mountpoint, fstype, total_space, used_space, free_space, percent_usage) VALUES %s",
+    "memory_metrics": "INSERT INTO memory_metrics (host, timestamp, available_memory, used_memory, memory_percent_usage) VALUES %s",
+    "gpu_metrics": "INSERT INTO gpu_metrics (host, timestamp, device_name, model, gpu_utilization, memory_utilization, memory_used, memory_total, temperature) VALUES %s",
+    "latency_metrics": "INSERT INTO latency_metrics (host, timestamp, target, min_ms, avg_ms, max_ms, loss_percent) VALUES %s",
+    "process_metrics": "INSERT INTO process_metrics (host, timestamp, pid, name, cpu_percent, rss, io_bytes_per_sec) VALUES %s",
+    "swap_memory_metrics": "INSERT INTO swap_memory_metrics (host, timestamp, used_memory, free_memory, percent_usage) VALUES %s",
+}
+# Rows per statement for pushed batches, which run to thousands of rows
+INGEST_PAGE_SIZE = 1000
+
+def snapshot_rows(snapshot, now, host, rows=None):
+    # snapshot is a snapshot.Snapshot; rows come straight off its columns and
+    # are appended to rows (table -> list), so a batch shares one set of lists
+    rows = {table: [] for table in INSERTS} if rows is None else rows
+    sections = snapshot.sections
+
+    #CPU logging
+    if 'cpu' in sections:
+        cpu = sections['cpu']
+        rows['cpu_metrics'].extend(
+            (host, now, core_id, user_time, system_time, idle_time, percent)
+            for core_id, user_time, system_time, idle_time, percent
+            in zip(range(1, len(cpu.percent) + 1), cpu.user_time, cpu.system_time, cpu.idle_time, cpu.percent)
+        )
+
+    # IO
+    if sections.get('io') and sections['io'].devices:
+        rows['disk_io_metrics'].extend((host, now, *row) for row in sections['io'].rows())
+
+    # Disk Usage
+    if sections.get('disk_usage') and sections['disk_usage'].devices:
+        rows['disk_usage_metrics'].extend((host, now, *row) for row in sections['disk_usage'].rows())
+
+    # Memory
+    if 'memory' in sections:
+        memory = sections['memory']
+        rows['memory_metrics'].append((host, now, memory.available_memory, memory.used_memory, memory.memory_percent_usage))
+
+    # GPU
+    if 'gpu' in sections and sections['gpu'].data:
+        rows['gpu_metrics'].extend(
+            (host, now, device, stats['name'], stats['gpu_utilization'], stats['memory_utilization'], stats['memory_used'], stats['memory_total'], stats['temperature'])
+            for device, stats in sections['gpu'].data.items()
+        )
+
+    # Latency
+    if 'latency' in sections and sections['latency'].data:
+        rows['latency_metrics'].extend(
+            (host, now, target, stats['min_ms'], stats['avg_ms'], stats['max_ms'], stats['loss_percent'])
+            for target, stats in sections['latency'].data.items()
+        )
+
+    # Top processes
+    if 'processes' in sections and sections['processes'].data.get('top'):
+        rows['process_metrics'].extend(
+            (host, now, int(pid), name, cpu_percent, rss, io_rate)
+            for pid, (name, cpu_percent, rss, io_rate) in sections['processes'].data['top'].items()
+        )
+
+    # Swap Memory
+    if 'swap_memory' in sections:
+        swap_memory = sections['swap_memory']
+        rows['swap_memory_metrics'].append((host, now, swap_memory.used_memory, swap_memory.free_memory, swap_memory.percent_usage))
+
+    return rows
+
+def write_rows(cursor, rows, page_size=100):
+    from psycopg2.extras import execute_values
+    for table, table_rows in rows.items():
+        if table_rows:
+            execute_values(cursor, INSERTS[table], table_rows, page_size=page_size)
+
+def log_data(snapshot, now=None, host=HOST_NAME):
     try:
-        now = datetime.datetime.now()
+        now = now or datetime.datetime.now()
         conn = get_db_connection()
         print(f"conn: {conn}")
         with conn.cursor() as cursor:
-            
-            #CPU logging
-            num_cpus = len(system_info['cpu']['user_time'].keys())
-            for i in range(0,num_cpus):
-                core_id = i+1
-                user_time = system_info['cpu']['user_time'][f'core_{core_id}']
-                system_time = system_info['cpu']['system_time'][f'core_{core_id}']
-                idle_time = system_info['cpu']['idle_time'][f'core_{core_id}']
-                percent = system_info['cpu']['percent'][f'core_{core_id}']
-                cursor.execute(f"""INSERT INTO 
-                    cpu_metrics (timestamp, core_id, user_time, system_time, idle_time, percent_usage)
-                    VALUES ('{now}', {core_id}, {user_time}, {system_time}, {idle_time}, {percent})"""
-                )
-            
-            # IO
-            for raw_disk in system_info['io']:
-                cursor.execute(f"""INSERT INTO
-                disk_io_metrics (timestamp, device_name, read_count, write_count, read_bytes, write_bytes, read_time, write_time)
-                VALUES ('{now}', '{raw_disk}', {system_info['io'][raw_disk]['read_count']}, {system_info['io'][raw_disk]['write_count']}, {system_info['io'][raw_disk]['read_bytes']}, {system_info['io'][raw_disk]['write_bytes']}, {system_info['io'][raw_disk]['read_time']}, {system_info['io'][raw_disk]['write_time']})"""
-                )
-            
-            # Disk Usage
-            for disk in system_info['disk_usage']:
-                cursor.execute(f"""INSERT INTO
-                    disk_usage_metrics (timestamp, device_name, mountpoint, fstype, total_space, used_space, free_space, percent_usage)
-                    VALUES ('{now}', '{disk}', '{system_info['disk_usage'][disk]['mountpoint']}', '{system_info['disk_usage'][disk]['fstype']}', {system_info['disk_usage'][disk]['total']}, {system_info['disk_usage'][disk]['used']}, {system_info['disk_usage'][disk]['free']}, {system_info['disk_usage'][disk]['percent']})"""
-                )
-            
-            # Memory
-            cursor.execute(f"""INSERT INTO
-                    memory_metrics (timestamp, available_memory, used_memory, memory_percent_usage)
-                    VALUES ('{now}', {system_info['memory']['available_memory']}, {system_info['memory']['used_memory']}, {system_info['memory']['memory_percent_usage']})"""
-                )
-            
-            # Swap Memory
-            cursor.execute(f"""INSERT INTO
-                    swap_memory_metrics (timestamp, used_memory, free_memory, percent_usage)
-                    VALUES ('{now}', {system_info['swap_memory']['used_memory']}, {system_info['swap_memory']['free_memory']}, {system_info['swap_memory']['percent_usage']})"""
-                )
-            
+            register_host(cursor, host, now)
+            write_rows(cursor, snapshot_rows(snapshot, now, host))
             conn.commit()
 
     except Exception as e:
         print(e)
         conn.rollback()
+        # The registry upsert rolled back with the rest
+        _registered_hosts.pop(host, None)
         return False
     
     finally:
         if 'conn' in locals():
             conn.close()
+
+def log_batch(host, samples, batch_id=None):
+    # samples: (timestamp, Snapshot) pairs pushed by one agent, written with
+    # one execute_values per table for the whole batch in one transaction.
+    # Returns False without writing when batch_id was already stored
+    rows = {table: [] for table in INSERTS}
+    for now, snapshot in samples:
+        snapshot_rows(snapshot, now, host, rows)
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database unavailable")
+    try:
+        with conn.cursor() as cursor:
+            if batch_id is not None:
+                # Recorded in the same transaction as the rows, so the id
+                # exists exactly when the batch does
+                cursor.execute(
+                    "INSERT INTO ingest_batches (host, batch_id) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+                    (host, batch_id)
+                )
+                if cursor.rowcount == 0:
+                    conn.rollback()
+                    return False
+            register_host(cursor, host, max(now for now, _ in samples))
+            write_rows(cursor, rows, INGEST_PAGE_SIZE)
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        _registered_hosts.pop(host, None)
+        raise
+    finally:
+        conn.close()
+
+def prune_ingest_batches(days):
+    conn = get_db_connection()
+    if conn is None:
+        return
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM ingest_batches WHERE received_at < now() - %s * interval '1 day'", (days,))
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,288 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from live_info import get_db_connection
+
+# Replays the dashboard's request mix against a running backend while
+# hundreds of /ws/metrics clients stay connected, then reports latency and
+# throughput per endpoint and the load it put on Postgres.
+# Each virtual user opens a page, fires every request that page makes at
+# once (as the frontend does), then thinks before the next page
+GROUPBY_WEIGHTS = {"minute": 40, "hour": 30, "day": 15, "month": 10, "year": 5}
+TIME_WEIGHTS = {"hourly": 50, "daily": 30, "monthly": 12, "yearly": 5, "overall": 3}
+DISTRIBUTION_TIME_WEIGHTS = {"hour": 50, "day": 30, "month": 12, "year": 5, "overall": 3}
+TIMESERIES_ENDPOINTS = [
+    "/memory/percent/timeseries", "/swap_memory/percent/timeseries", "/cpu/percent/timeseries",
+    "/io/read/bytes/timeseries", "/io/write/bytes/timeseries", "/io/read/time/timeseries", "/io/write/time/timeseries",
+]
+BAR_CHART_ENDPOINTS = [
+    "/memory/percent", "/swap_memory/percent", "/cpu/percent",
+    "/io/read/bytes", "/io/write/bytes", "/io/read/time", "/io/write/time",
+]
+DISTRIBUTION_ENDPOINTS = [
+    "/cpu/percent/distribution", "/memory/percent/distribution", "/swap_memory/percent/distribution",
+    "/io/read/bytes/distribution", "/io/write/bytes/distribution",
+]
+PAGE_WEIGHTS = {"timeseries": 40, "barcharts": 25, "distributions": 20, "staticinfo": 10, "settings": 5}
+DB_COUNTERS = ["xact_commit", "xact_rollback", "blks_read", "blks_hit", "tup_returned", "tup_fetched", "tup_inserted"]
+
+
+def _pick(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+def page_requests(rng, page):
+    # Paths one page view fetches, with the parameters the user picked
+    if page == "timeseries":
+        groupby = _pick(rng, GROUPBY_WEIGHTS)
+        return [f"{path}?type=avg&groupby={groupby}" for path in TIMESERIES_ENDPOINTS]
+    if page == "barcharts":
+        time_range = _pick(rng, TIME_WEIGHTS)
+        return [f"{path}?type=avg&time={time_range}" for path in BAR_CHART_ENDPOINTS]
+    if page == "distributions":
+        time_range = _pick(rng, DISTRIBUTION_TIME_WEIGHTS)
+        return [f"{path}?time={time_range}" for path in DISTRIBUTION_ENDPOINTS]
+    if page == "staticinfo":
+        return ["/system/static-info"]
+    return ["/notification-settings"]
+
+def all_requests():
+    paths = [f"{path}?type=avg&groupby={groupby}" for path in TIMESERIES_ENDPOINTS for groupby in GROUPBY_WEIGHTS]
+    paths += [f"{path}?type=avg&time={time_range}" for path in BAR_CHART_ENDPOINTS for time_range in TIME_WEIGHTS]
+    paths += [f"{path}?time={time_range}" for path in DISTRIBUTION_ENDPOINTS for time_range in DISTRIBUTION_TIME_WEIGHTS]
+    return paths + ["/system/static-info", "/notification-settings"]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class Results:
+    def __init__(self):
+        # path -> list of seconds, path -> error count
+        self.latencies = {}
+        self.errors = {}
+        self.ws_connect = []
+        self.ws_gaps = []
+        self.ws_frames = 0
+        self.ws_bytes = 0
+        self.ws_failures = 0
+
+    def record(self, path, seconds, ok):
+        self.latencies.setdefault(path, []).append(seconds)
+        if not ok:
+            self.errors[path] = self.errors.get(path, 0) + 1
+
+
+def fetch(base_url, path, timeout):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(base_url + path, timeout=timeout) as response:
+            body = response.read()
+        # Some routes answer 200 with an error payload, count those too
+        ok = response.status < 400 and b'"error"' not in body[:64]
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+async def http_user(loop, executor, args, results, rng, deadline):
+    while time.monotonic() < deadline:
+        paths = page_requests(rng, _pick(rng, PAGE_WEIGHTS))
+        outcomes = await asyncio.gather(*(
+            loop.run_in_executor(executor, fetch, args.base_url, path, args.timeout) for path in paths
+        ))
+        for path, (seconds, ok) in zip(paths, outcomes):
+            results.record(path, seconds, ok)
+        await asyncio.sleep(rng.expovariate(1 / args.think) if args.think > 0 else 0)
+
+
+async def ws_client(url, results, deadline):
+    start = time.perf_counter()
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            results.ws_connect.append(time.perf_counter() - start)
+            last = None
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    frame = await asyncio.wait_for(ws.recv(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                now = time.perf_counter()
+                if last is not None:
+                    results.ws_gaps.append(now - last)
+                last = now
+                results.ws_frames += 1
+                results.ws_bytes += len(frame)
+    except (OSError, websockets.exceptions.WebSocketException):
+        results.ws_failures += 1
+
+
+def db_counters():
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_stat_clear_snapshot()")
+            cursor.execute(f"SELECT {', '.join(DB_COUNTERS)} FROM pg_stat_database WHERE datname = current_database()")
+            return dict(zip(DB_COUNTERS, cursor.fetchone()))
+    finally:
+        conn.close()
+
+def backend_db_stats(base_url):
+    # Statement family totals from the backend's own /internal/stats
+    try:
+        with urllib.request.urlopen(base_url + "/internal/stats", timeout=10) as response:
+            report = json.loads(response.read())
+    except (urllib.error.URLError, OSError, ValueError):
+        return {}
+    return {
+        family: (summary["count"], summary["count"] * (summary["mean_ms"] or 0))
+        for family, summary in report.get("latency", {}).get("db", {}).items()
+    }
+
+def db_load(before, after, backend_before, backend_after, seconds):
+    load = {}
+    if before and after:
+        load.update({f"{name}_per_sec": round((after[name] - before[name]) / seconds, 1) for name in DB_COUNTERS})
+    statements = {
+        family: (count - backend_before.get(family, (0, 0))[0], total - backend_before.get(family, (0, 0))[1])
+        for family, (count, total) in backend_after.items()
+    }
+    load["statements"] = {family: {"count": count, "db_ms": round(total, 1)} for family, (count, total) in statements.items() if count}
+    return load
+
+
+async def run_phase(args, make_users, seconds, ws_clients):
+    results = Results()
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max(args.users * 8, 8))
+    deadline = time.monotonic() + seconds
+    ws_url = args.base_url.replace("http", "ws", 1) + "/ws/metrics"
+    tasks = [ws_client(ws_url, results, deadline) for _ in range(ws_clients)]
+    tasks += make_users(loop, executor, results, deadline)
+    started = time.monotonic()
+    await asyncio.gather(*tasks)
+    executor.shutdown()
+    return results, time.monotonic() - started
+
+
+def endpoint_report(results, elapsed):
+    rows = {}
+    for path, latencies in sorted(results.latencies.items()):
+        rows[path] = {
+            "requests": len(latencies),
+            "errors": results.errors.get(path, 0),
+            "rps": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+            "max_ms": round(max(latencies) * 1000, 1),
+        }
+    return rows
+
+def print_endpoints(rows):
+    print(f"{'endpoint':<58} {'reqs':>6} {'err':>5} {'rps':>7} {'p50':>9} {'p99':>9}")
+    for path, row in rows.items():
+        print(f"{path:<58} {row['requests']:>6} {row['errors']:>5} {row['rps']:>7} {row['p50_ms']:>7}ms {row['p99_ms']:>7}ms")
+
+
+async def main_async(args):
+    report = {"config": vars(args)}
+    rng = random.Random(args.seed)
+
+    def mixed_users(loop, executor, results, deadline):
+        return [http_user(loop, executor, args, results, random.Random(rng.random()), deadline) for _ in range(args.users)]
+
+    print(f"Mixed phase: {args.users} dashboard users, {args.ws_clients} WebSocket clients, {args.duration}s")
+    before, backend_before = db_counters(), backend_db_stats(args.base_url)
+    results, elapsed = await run_phase(args, mixed_users, args.duration, args.ws_clients)
+    after, backend_after = db_counters(), backend_db_stats(args.base_url)
+
+    endpoints = endpoint_report(results, elapsed)
+    total = sum(len(latencies) for latencies in results.latencies.values())
+    report["mixed"] = {
+        "seconds": round(elapsed, 1),
+        "requests": total,
+        "rps": round(total / elapsed, 2),
+        "endpoints": endpoints,
+        "websocket": {
+            "clients": args.ws_clients,
+            "failures": results.ws_failures,
+            "connect_p50_ms": round((percentile(results.ws_connect, 0.5) or 0) * 1000, 1),
+            "connect_p99_ms": round((percentile(results.ws_connect, 0.99) or 0) * 1000, 1),
+            "frames_per_sec": round(results.ws_frames / elapsed, 1),
+            "mbytes_per_sec": round(results.ws_bytes / elapsed / 1e6, 2),
+            # Frames are due every tick; wide gaps mean the fan-out is falling behind
+            "frame_gap_p50_ms": round((percentile(results.ws_gaps, 0.5) or 0) * 1000, 1),
+            "frame_gap_p99_ms": round((percentile(results.ws_gaps, 0.99) or 0) * 1000, 1),
+        },
+        "db": db_load(before, after, backend_before, backend_after, elapsed),
+    }
+    print_endpoints(endpoints)
+    print(f"\n{total} requests, {report['mixed']['rps']} req/s")
+    print(f"WebSocket: {json.dumps(report['mixed']['websocket'])}")
+    print(f"DB: {json.dumps({k: v for k, v in report['mixed']['db'].items() if k != 'statements'})}")
+
+    # Per-endpoint DB load needs the endpoint alone on the database
+    if args.isolate_seconds > 0:
+        report["isolated"] = {}
+        print(f"\nIsolated phases: {args.isolate_seconds}s per endpoint, {args.users} concurrent users")
+        for path in all_requests():
+            def isolated_users(loop, executor, results, deadline, path=path):
+                async def user():
+                    while time.monotonic() < deadline:
+                        seconds, ok = await loop.run_in_executor(executor, fetch, args.base_url, path, args.timeout)
+                        results.record(path, seconds, ok)
+                return [user() for _ in range(args.users)]
+
+            before, backend_before = db_counters(), backend_db_stats(args.base_url)
+            results, elapsed = await run_phase(args, isolated_users, args.isolate_seconds, 0)
+            after, backend_after = db_counters(), backend_db_stats(args.base_url)
+            row = endpoint_report(results, elapsed).get(path, {})
+            row["db"] = db_load(before, after, backend_before, backend_after, elapsed)
+            report["isolated"][path] = row
+            db_ms = sum(s["db_ms"] for s in row["db"]["statements"].values())
+            print(f"{path:<58} {row.get('rps', 0):>7} rps  p50 {row.get('p50_ms')}ms  p99 {row.get('p99_ms')}ms  "
+                  f"db {db_ms / max(row.get('requests', 1), 1):.1f}ms/req  blks_read {row['db'].get('blks_read_per_sec')}/s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"\nWrote {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard and WebSocket load driver")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=60, help="seconds for the mixed phase")
+    parser.add_argument("--users", type=int, default=20, help="concurrent dashboard users")
+    parser.add_argument("--think", type=float, default=2.0, help="mean seconds between a user's page views")
+    parser.add_argument("--ws-clients", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--isolate-seconds", type=float, default=0, help="also run each endpoint alone for this long")
+    parser.add_argument("--json", help="write the full report here")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
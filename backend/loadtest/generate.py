@@ -0,0 +1,210 @@
+import argparse
+import datetime
+import io
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from live_info import HOST_NAME, get_db_connection
+
+# Synthetic metric history for load testing, bulk-loaded with COPY into the
+# database get_db_connection() points at (DB_USER / DB_PW / DB_HOST).
+# Load follows a diurnal curve (quiet nights, busy afternoons, calmer
+# weekends) with per-core offsets, noise and occasional bursts
+COPY_CHUNK_ROWS = 200000
+TABLE_COLUMNS = {
+    "cpu_metrics": "host, timestamp, core_id, user_time, system_time, idle_time, percent_usage",
+    "memory_metrics": "host, timestamp, available_memory, used_memory, memory_percent_usage",
+    "swap_memory_metrics": "host, timestamp, used_memory, free_memory, percent_usage",
+    "disk_io_metrics": "host, timestamp, device_name, read_count, write_count, read_bytes, write_bytes, read_time, write_time",
+    "disk_usage_metrics": "host, timestamp, device_name, mountpoint, fstype, total_space, used_space, free_space, percent_usage",
+}
+GIB = 1024 ** 3
+MEMORY_TOTAL = 64 * GIB
+SWAP_TOTAL = 8 * GIB
+DISK_TOTAL = 1024 * GIB
+
+
+def diurnal_load(ts):
+    # 0..1: trough around 04:00, peak around 15:00, weekends at 60%
+    hour = ts.hour + ts.minute / 60
+    daily = 0.5 - 0.5 * math.cos((hour - 4) / 24 * 2 * math.pi)
+    return daily * (0.6 if ts.weekday() >= 5 else 1.0)
+
+
+class HostModel:
+    def __init__(self, host, cores, devices, rng):
+        self.host = host
+        self.cores = cores
+        self.devices = [f"nvme{i}n1" for i in range(devices)]
+        self.rng = rng
+        self.core_bias = [rng.uniform(-10, 10) for _ in range(cores)]
+        self.cpu_times = [[0.0, 0.0, 0.0] for _ in range(cores)]
+        self.io_counters = {device: [0] * 6 for device in self.devices}
+        self.disk_used = {device: DISK_TOTAL * rng.uniform(0.2, 0.5) for device in self.devices}
+        self.burst_left = 0
+
+    def cpu_rows(self, ts, stamp, interval):
+        if self.burst_left:
+            self.burst_left -= 1
+        elif self.rng.random() < 0.0005:
+            self.burst_left = self.rng.randint(5, 60)
+        load = diurnal_load(ts)
+        for core in range(self.cores):
+            percent = 5 + 70 * load + self.core_bias[core] + self.rng.gauss(0, 5) + (40 if self.burst_left else 0)
+            percent = min(max(percent, 0.0), 100.0)
+            times = self.cpu_times[core]
+            times[0] += interval * percent / 100 * 0.75
+            times[1] += interval * percent / 100 * 0.25
+            times[2] += interval * (1 - percent / 100)
+            yield f"{self.host}\t{stamp}\t{core + 1}\t{times[0]:.2f}\t{times[1]:.2f}\t{times[2]:.2f}\t{percent:.1f}\n"
+
+    def memory_rows(self, ts, stamp):
+        percent = min(max(30 + 40 * diurnal_load(ts) + self.rng.gauss(0, 3), 5.0), 99.0)
+        used = int(MEMORY_TOTAL * percent / 100)
+        yield f"{self.host}\t{stamp}\t{MEMORY_TOTAL - used}\t{used}\t{percent:.1f}\n"
+
+    def swap_rows(self, ts, stamp):
+        percent = min(max(5 + 10 * diurnal_load(ts) + self.rng.gauss(0, 1), 0.0), 100.0)
+        used = int(SWAP_TOTAL * percent / 100)
+        yield f"{self.host}\t{stamp}\t{used}\t{SWAP_TOTAL - used}\t{percent:.1f}\n"
+
+    def io_rows(self, ts, stamp, interval):
+        load = diurnal_load(ts)
+        for device in self.devices:
+            counters = self.io_counters[device]
+            reads = int(interval * (50 + 400 * load) * self.rng.uniform(0.5, 1.5))
+            writes = int(interval * (30 + 300 * load) * self.rng.uniform(0.5, 1.5))
+            counters[0] += reads
+            counters[1] += writes
+            counters[2] += reads * 16384
+            counters[3] += writes * 32768
+            counters[4] += reads // 10
+            counters[5] += writes // 8
+            yield f"{self.host}\t{stamp}\t{device}\t" + "\t".join(map(str, counters)) + "\n"
+
+    def disk_usage_rows(self, ts, stamp):
+        for i, device in enumerate(self.devices):
+            # Slow growth with occasional cleanups
+            used = self.disk_used[device] + self.rng.uniform(0, 2) * 1024 ** 2
+            if used > DISK_TOTAL * 0.9:
+                used = DISK_TOTAL * 0.4
+            self.disk_used[device] = used
+            mountpoint = "/" if i == 0 else f"/data{i}"
+            yield f"{self.host}\t{stamp}\t/dev/{device}p1\t{mountpoint}\text4\t{DISK_TOTAL}\t{int(used)}\t{int(DISK_TOTAL - used)}\t{used / DISK_TOTAL * 100:.1f}\n"
+
+
+def generate(model, start, end, interval, tables):
+    # Yields (table, row) in timestamp order; slow-moving families are
+    # sampled less often, like the live collector does
+    every = {"memory_metrics": 5, "swap_memory_metrics": 60, "disk_io_metrics": 5, "disk_usage_metrics": 60}
+    step = datetime.timedelta(seconds=interval)
+    ts = start
+    tick = 0
+    while ts < end:
+        stamp = ts.strftime("%Y-%m-%d %H:%M:%S")
+        seconds = tick * interval
+        if "cpu_metrics" in tables:
+            for row in model.cpu_rows(ts, stamp, interval):
+                yield "cpu_metrics", row
+        if "memory_metrics" in tables and seconds % max(every["memory_metrics"], interval) == 0:
+            for row in model.memory_rows(ts, stamp):
+                yield "memory_metrics", row
+        if "swap_memory_metrics" in tables and seconds % max(every["swap_memory_metrics"], interval) == 0:
+            for row in model.swap_rows(ts, stamp):
+                yield "swap_memory_metrics", row
+        if "disk_io_metrics" in tables and seconds % max(every["disk_io_metrics"], interval) == 0:
+            for row in model.io_rows(ts, stamp, max(every["disk_io_metrics"], interval)):
+                yield "disk_io_metrics", row
+        if "disk_usage_metrics" in tables and seconds % max(every["disk_usage_metrics"], interval) == 0:
+            for row in model.disk_usage_rows(ts, stamp):
+                yield "disk_usage_metrics", row
+        ts += step
+        tick += 1
+
+
+def copy_rows(conn, table, lines):
+    buffer = io.StringIO("".join(lines))
+    with conn.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({TABLE_COLUMNS[table]}) FROM STDIN", buffer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and bulk-load synthetic metric history")
+    parser.add_argument("--host", default=HOST_NAME, help="host name the rows are stored under")
+    parser.add_argument("--cores", type=int, default=16)
+    parser.add_argument("--devices", type=int, default=4)
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--interval", type=int, default=60, help="seconds between CPU samples (the live collector uses 1)")
+    parser.add_argument("--end", help="last timestamp, ISO format (default now)")
+    parser.add_argument("--tables", default=",".join(TABLE_COLUMNS), help="comma separated tables to fill")
+    parser.add_argument("--truncate", action="store_true", help="empty the tables first")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tables = args.tables.split(",")
+    unknown = set(tables) - set(TABLE_COLUMNS)
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(sorted(unknown))}")
+
+    end = datetime.datetime.fromisoformat(args.end) if args.end else datetime.datetime.now().replace(microsecond=0)
+    start = end - datetime.timedelta(days=365 * args.years)
+    samples = int((end - start).total_seconds() // args.interval)
+    print(f"Generating {start} .. {end}: {samples} ticks, ~{samples * args.cores} cpu rows")
+
+    conn = get_db_connection()
+    if conn is None:
+        sys.exit(1)
+    try:
+        if args.truncate:
+            with conn.cursor() as cursor:
+                for table in tables:
+                    cursor.execute(f"TRUNCATE {table}")
+            conn.commit()
+
+        model = HostModel(args.host, args.cores, args.devices, random.Random(args.seed))
+        pending = {table: [] for table in tables}
+        counts = {table: 0 for table in tables}
+        started = time.monotonic()
+        for table, row in generate(model, start, end, args.interval, set(tables)):
+            rows = pending[table]
+            rows.append(row)
+            if len(rows) >= COPY_CHUNK_ROWS:
+                copy_rows(conn, table, rows)
+                counts[table] += len(rows)
+                rows.clear()
+                conn.commit()
+                elapsed = time.monotonic() - started
+                print(f"  {sum(counts.values())} rows, {sum(counts.values()) / elapsed:.0f} rows/s")
+        for table, rows in pending.items():
+            if rows:
+                copy_rows(conn, table, rows)
+                counts[table] += len(rows)
+        # Registered hosts are what the rollup job and fleet routes cover
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """INSERT INTO hosts (host, first_seen, last_seen) VALUES (%s, %s, %s)
+                ON CONFLICT (host) DO UPDATE SET first_seen = LEAST(hosts.first_seen, EXCLUDED.first_seen),
+                    last_seen = GREATEST(hosts.last_seen, EXCLUDED.last_seen)""",
+                (args.host, start, end)
+            )
+        conn.commit()
+
+        # Fresh statistics so the planner sees the real table sizes
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f"ANALYZE {table}")
+        for table, count in counts.items():
+            print(f"{table}: {count} rows")
+        print(f"Loaded in {time.monotonic() - started:.1f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_TIMEOUT_SECONDS = 30
+SEND_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 2
+RENDER_WORKERS = 4
+
+
+def render_message(sender, recipient, subject, body):
+    # email and smtplib load on the first digest, not with the backend
+    from email.message import EmailMessage
+    msg = EmailMessage()
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = recipient
+    msg.set_content(body)
+    return msg
+
+def render_messages(sender, recipients, subject, body):
+    return [render_message(sender, recipient, subject, body) for recipient in recipients]
+
+
+class Mailer:
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, starttls=SMTP_STARTTLS,
+                 retries=SEND_RETRIES, backoff=RETRY_BACKOFF_SECONDS):
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.retries = retries
+        self.backoff = backoff
+        self.smtp = None
+        self.credentials = None
+        # smtplib sessions are not thread safe, one digest sends at a time
+        self.lock = threading.Lock()
+        self.render_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS)
+
+    def _session(self, sender, password):
+        import smtplib
+        if self.smtp is not None and self.credentials == (sender, password):
+            try:
+                if self.smtp.noop()[0] == 250:
+                    return self.smtp
+            except smtplib.SMTPException:
+                pass
+            except OSError:
+                pass
+        self.close()
+
+        smtp = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT_SECONDS)
+        if self.starttls:
+            smtp.starttls()
+        if password:
+            smtp.login(sender, password)
+        self.smtp = smtp
+        self.credentials = (sender, password)
+        return smtp
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except Exception:
+                pass
+        self.smtp = None
+
+    def send_all(self, messages, sender, password):
+        # Returns (delivered, refused, failed); refused recipients are permanent
+        # rejections, failed ones ran out of retries and are worth another try later
+        import smtplib
+        delivered, refused, failed = [], [], []
+        with self.lock:
+            for index, msg in enumerate(messages):
+                for attempt in range(self.retries):
+                    try:
+                        smtp = self._session(sender, password)
+                    except (smtplib.SMTPException, OSError) as e:
+                        # Unreachable server or refused login: every later message
+                        # would fail the same way, so fail them all now
+                        print(f"Unable to open SMTP session: {e}")
+                        self.close()
+                        failed.extend(m['To'] for m in messages[index:])
+                        return delivered, refused, failed
+                    try:
+                        smtp.send_message(msg)
+                        delivered.append(msg['To'])
+                        break
+                    except smtplib.SMTPRecipientsRefused:
+                        refused.append(msg['To'])
+                        break
+                    except (smtplib.SMTPServerDisconnected, OSError) as e:
+                        # The session dropped; the next attempt reopens it at once
+                        print(f"SMTP session lost sending to {msg['To']} (attempt {attempt + 1}): {e}")
+                        self.close()
+                    except smtplib.SMTPException as e:
+                        # Temporary rejection of this message, the session is still usable
+                        print(f"Error sending to {msg['To']} (attempt {attempt + 1}): {e}")
+                        if attempt + 1 < self.retries:
+                            time.sleep(self.backoff * 2 ** attempt)
+                else:
+                    failed.append(msg['To'])
+        return delivered, refused, failed
+
+    async def send_digest(self, sender, password, recipients, subject, body):
+        loop = asyncio.get_running_loop()
+        chunk = max(1, -(-len(recipients) // RENDER_WORKERS))
+        rendered = await asyncio.gather(*(
+            loop.run_in_executor(self.render_pool, render_messages, sender, recipients[i:i + chunk], subject, body)
+            for i in range(0, len(recipients), chunk)
+        ))
+        messages = [msg for batch in rendered for msg in batch]
+        return await asyncio.to_thread(self.send_all, messages, sender, password)
+
+
+mailer = Mailer()
@@ -0,0 +1,141 @@
+import datetime
+
+from live_info import HOST_NAME, get_db_connection
+from snapshot import Snapshot
+
+# Point-in-time lookup behind /snapshot: for every metric table, the stored
+# sample nearest an instant, rebuilt into a /ws/metrics frame. Each table costs
+# two ordered LIMIT 1 probes of its (host, timestamp) index, one either side
+# of the instant, so latency doesn't grow with history
+# Samples further than this from the instant are left out rather than shown as current
+SNAPSHOT_TOLERANCE_SECONDS = 300
+
+# frame section -> (table, columns, row order within one sample)
+SNAPSHOT_TABLES = {
+    "cpu": ("cpu_metrics", "core_id, user_time, system_time, idle_time, percent_usage", "core_id"),
+    "memory": ("memory_metrics", "available_memory, memory_percent_usage, used_memory", "id"),
+    "swap_memory": ("swap_memory_metrics", "used_memory, free_memory, percent_usage", "id"),
+    "io": ("disk_io_metrics", "device_name, read_count, write_count, read_bytes, write_bytes, read_time, write_time", "id"),
+    "disk_usage": ("disk_usage_metrics", "device_name, mountpoint, fstype, total_space, used_space, free_space, percent_usage", "id"),
+    "gpu": ("gpu_metrics", "device_name, model, gpu_utilization, memory_utilization, memory_used, memory_total, temperature", "id"),
+    "latency": ("latency_metrics", "target, min_ms, avg_ms, max_ms, loss_percent", "id"),
+    "processes": ("process_metrics", "pid, name, cpu_percent, rss, io_bytes_per_sec", "id"),
+}
+
+def _nearest_query(table, columns, order):
+    return f"""
+        WITH nearest AS (
+            SELECT ts FROM (
+                (SELECT timestamp AS ts FROM {table}
+                 WHERE host = %(host)s AND timestamp <= %(at)s AND timestamp >= %(earliest)s
+                 ORDER BY timestamp DESC LIMIT 1)
+                UNION ALL
+                (SELECT timestamp AS ts FROM {table}
+                 WHERE host = %(host)s AND timestamp > %(at)s AND timestamp <= %(latest)s
+                 ORDER BY timestamp ASC LIMIT 1)
+            ) candidates
+            ORDER BY abs(extract(epoch FROM ts - %(at)s)), ts
+            LIMIT 1
+        )
+        SELECT timestamp, {columns} FROM {table}
+        WHERE host = %(host)s AND timestamp = (SELECT ts FROM nearest)
+        ORDER BY {order}
+    """
+
+SNAPSHOT_QUERIES = {section: _nearest_query(*spec) for section, spec in SNAPSHOT_TABLES.items()}
+
+
+# Stored rows -> the section's frame shape (see snapshot.py and the collectors)
+def _cpu(rows):
+    columns = ("user_time", "system_time", "idle_time", "percent")
+    return {
+        column: {f"core_{row[0]}": row[i] for row in rows}
+        for i, column in enumerate(columns, start=1)
+    }
+
+def _memory(rows):
+    available_memory, memory_percent_usage, used_memory = rows[0]
+    return {"available_memory": available_memory, "memory_percent_usage": memory_percent_usage, "used_memory": used_memory}
+
+def _swap_memory(rows):
+    used_memory, free_memory, percent_usage = rows[0]
+    return {"used_memory": used_memory, "free_memory": free_memory, "percent_usage": percent_usage}
+
+def _io(rows):
+    columns = ("read_count", "write_count", "read_bytes", "write_bytes", "read_time", "write_time")
+    return {row[0]: dict(zip(columns, row[1:])) for row in rows}
+
+def _disk_usage(rows):
+    columns = ("mountpoint", "fstype", "total", "used", "free", "percent")
+    return {row[0]: dict(zip(columns, row[1:])) for row in rows}
+
+def _gpu(rows):
+    # memory_free and memory_percent aren't stored; both follow from used and total
+    return {
+        device: {
+            "name": model,
+            "memory_total": memory_total,
+            "memory_used": memory_used,
+            "memory_free": memory_total - memory_used,
+            "memory_percent": round(memory_used / memory_total * 100, 2) if memory_total else 0.0,
+            "temperature": temperature,
+            "gpu_utilization": gpu_utilization,
+            "memory_utilization": memory_utilization,
+        }
+        for device, model, gpu_utilization, memory_utilization, memory_used, memory_total, temperature in rows
+    }
+
+def _latency(rows):
+    columns = ("min_ms", "avg_ms", "max_ms", "loss_percent")
+    return {row[0]: dict(zip(columns, row[1:])) for row in rows}
+
+def _processes(rows):
+    # Only the top N per ranking were stored, so rankings are over those
+    def ranking(index):
+        return [pid for pid, *_ in sorted(rows, key=lambda row: row[index], reverse=True)]
+    return {
+        "top": {str(pid): [name, cpu_percent, rss, io_rate] for pid, name, cpu_percent, rss, io_rate in rows},
+        "by_cpu": ranking(2),
+        "by_rss": ranking(3),
+        "by_io": ranking(4),
+    }
+
+SECTION_BUILDERS = {
+    "cpu": _cpu,
+    "memory": _memory,
+    "swap_memory": _swap_memory,
+    "io": _io,
+    "disk_usage": _disk_usage,
+    "gpu": _gpu,
+    "latency": _latency,
+    "processes": _processes,
+}
+
+
+def snapshot_at(at, host=None, tolerance=SNAPSHOT_TOLERANCE_SECONDS):
+    # -> (frame dict, {section: sampled at}); sections with no sample within
+    # tolerance of at are missing from both
+    window = datetime.timedelta(seconds=tolerance)
+    params = {"host": host or HOST_NAME, "at": at, "earliest": at - window, "latest": at + window}
+    frame, sampled_at = {}, {}
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            for section, query in SNAPSHOT_QUERIES.items():
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                if rows:
+                    frame[section] = SECTION_BUILDERS[section]([row[1:] for row in rows])
+                    sampled_at[section] = rows[0][0]
+    finally:
+        conn.close()
+    # Through Snapshot so values come out typed exactly as the live frame's,
+    # except a CPU sample with a core missing (cores 1, 2 and 4 stored):
+    # CpuSample needs core_1..core_n, so those rows are returned as stored
+    typed = {}
+    for section, data in frame.items():
+        try:
+            typed[section] = Snapshot.from_dict({section: data}).to_dict()[section]
+        except KeyError:
+            typed[section] = data
+    return typed, sampled_at
@@ -0,0 +1,139 @@
+import heapq
+import os
+import time
+
+import psutil
+
+# Optional source: set COLLECT_PROCESSES=1 to sample the busiest processes
+COLLECT_PROCESSES = os.getenv("COLLECT_PROCESSES", "0") == "1"
+PROCESS_TOP_N = int(os.getenv("PROCESS_TOP_N", "10"))
+# A scan stops after this long and reports what it saw as truncated; the
+# next one picks up where it stopped
+PROCESS_SCAN_BUDGET_SECONDS = 0.25
+
+# process_iter reads these for one process at a time, under oneshot(), as
+# the scan reaches it; names are only fetched for the processes that make the top N
+SCAN_ATTRS = ['pid', 'create_time', 'cpu_times', 'memory_info']
+if hasattr(psutil.Process, 'io_counters'):
+    SCAN_ATTRS.append('io_counters')
+
+
+def _push(heap, size, entry):
+    if len(heap) < size:
+        heapq.heappush(heap, entry)
+    elif entry > heap[0]:
+        heapq.heapreplace(heap, entry)
+
+
+class ProcessSampler:
+    def __init__(self, top_n=PROCESS_TOP_N, budget=PROCESS_SCAN_BUDGET_SECONDS):
+        self.top_n = top_n
+        self.budget = budget
+        # pid -> (create_time, cpu seconds, io bytes, sampled at) from the previous scan
+        self.previous = {}
+        # (pid, create_time) -> name, kept only for recent winners
+        self.names = {}
+        # process_iter a truncated scan stopped in, so high PIDs aren't starved
+        self.iterator = None
+
+    def sample(self):
+        now = time.monotonic()
+        deadline = now + self.budget
+        current = {}
+        procs = {}
+        top_cpu, top_rss, top_io = [], [], []
+        truncated = False
+
+        # Round robin over PIDs: carry on with the iterator the last truncated
+        # scan stopped in, then wrap around to a fresh one from the lowest PID.
+        # process_iter walks PIDs in order and reads each one only when it is
+        # reached, so nothing past the budget is read
+        wrapped = self.iterator is None
+        if wrapped:
+            self.iterator = psutil.process_iter(SCAN_ATTRS, ad_value=None)
+        while True:
+            proc = next(self.iterator, None)
+            if proc is None:
+                if wrapped:
+                    break
+                self.iterator = psutil.process_iter(SCAN_ATTRS, ad_value=None)
+                wrapped = True
+                continue
+            info = proc.info
+            pid = info['pid']
+            if pid in current:
+                # Back where this scan started: every process has been seen
+                break
+            cpu_times = info['cpu_times']
+            memory_info = info['memory_info']
+            if cpu_times is None or memory_info is None:
+                continue
+            io_counters = info.get('io_counters')
+            cpu_total = cpu_times.user + cpu_times.system
+            io_total = io_counters.read_bytes + io_counters.write_bytes if io_counters else 0
+            current[pid] = (info['create_time'], cpu_total, io_total, now)
+            procs[pid] = proc
+
+            # Rates need a previous sample of the same process (same create_time)
+            cpu_percent = 0.0
+            io_rate = 0.0
+            previous = self.previous.get(pid)
+            if previous is not None and previous[0] == info['create_time'] and now > previous[3]:
+                elapsed = now - previous[3]
+                cpu_percent = (cpu_total - previous[1]) / elapsed * 100
+                io_rate = (io_total - previous[2]) / elapsed
+
+            row = (pid, info['create_time'], round(cpu_percent, 2), memory_info.rss, round(io_rate, 1))
+            _push(top_cpu, self.top_n, (cpu_percent, pid, row))
+            _push(top_rss, self.top_n, (memory_info.rss, pid, row))
+            _push(top_io, self.top_n, (io_rate, pid, row))
+
+            if time.monotonic() > deadline:
+                truncated = True
+                break
+        if not truncated:
+            self.iterator = None
+
+        # Processes we didn't reach this scan keep their old baseline
+        if truncated:
+            for pid, previous in self.previous.items():
+                current.setdefault(pid, previous)
+        self.previous = current
+
+        winners = {}
+        for heap in (top_cpu, top_rss, top_io):
+            for _, pid, row in heap:
+                winners[pid] = row
+
+        names = {}
+        for pid, (_, create_time, cpu_percent, rss, io_rate) in winners.items():
+            key = (pid, create_time)
+            if key not in self.names:
+                try:
+                    self.names[key] = procs[pid].name()
+                except (psutil.Error, KeyError):
+                    self.names[key] = ""
+            names[key] = self.names[key]
+        self.names = names
+
+        def ranking(heap):
+            return [pid for _, pid, _ in sorted(heap, reverse=True)]
+
+        return {
+            'scanned': len(procs),
+            'truncated': truncated,
+            # pid -> [name, cpu_percent, rss, io_bytes_per_sec]
+            'top': {
+                str(pid): [names[(pid, create_time)], cpu_percent, rss, io_rate]
+                for pid, (_, create_time, cpu_percent, rss, io_rate) in winners.items()
+            },
+            'by_cpu': ranking(top_cpu),
+            'by_rss': ranking(top_rss),
+            'by_io': ranking(top_io),
+        }
+
+
+sampler = ProcessSampler()
+
+def collect_processes():
+    return sampler.sample()
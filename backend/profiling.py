@@ -0,0 +1,130 @@
+import collections
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# On-demand profiler for the running backend. Nothing is installed until a
+# capture starts: the sampler is a thread that lives only for the capture and
+# tracemalloc is switched off again afterwards, so idle cost is zero
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+MAX_PROFILE_SECONDS = 120
+DEFAULT_SAMPLE_INTERVAL = 0.01
+TRACEMALLOC_FRAMES = 16
+TOP_ALLOCATIONS = 25
+TOP_FUNCTIONS = 50
+
+
+class ProfileBusy(Exception):
+    pass
+
+
+def _frame_label(code):
+    # Functions rather than lines, so a flame graph merges by function
+    label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label.replace(";", ":")
+
+def _stack(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class Profiler:
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def _sample(self, seconds, interval):
+        # Statistical profile of every thread: sys._current_frames() at a
+        # fixed interval, folded into "thread;outer;...;inner" stacks
+        own = threading.get_ident()
+        stacks = collections.Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        next_at = time.monotonic()
+        while next_at < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                thread = names.get(ident, str(ident)).replace(";", ":")
+                stacks[";".join([thread] + _stack(frame))] += 1
+            samples += 1
+            next_at += interval
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return stacks, samples
+
+    def _top_functions(self, stacks):
+        own_counts = collections.Counter()
+        total_counts = collections.Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            own_counts[frames[-1]] += count
+            for label in set(frames):
+                total_counts[label] += count
+        return [
+            {"function": label, "self": own_counts[label], "total": total}
+            for label, total in total_counts.most_common(TOP_FUNCTIONS)
+        ]
+
+    def capture(self, seconds, interval=DEFAULT_SAMPLE_INTERVAL, allocations=False):
+        # Blocks for the capture; run it off the event loop
+        if not self.lock.acquire(blocking=False):
+            raise ProfileBusy("A profile capture is already running")
+        try:
+            seconds = min(max(seconds, interval), MAX_PROFILE_SECONDS)
+            started_tracing = False
+            before = None
+            if allocations:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(TRACEMALLOC_FRAMES)
+                    started_tracing = True
+                before = tracemalloc.take_snapshot()
+
+            started = time.time()
+            stacks, samples = self._sample(seconds, interval)
+
+            top_allocations = None
+            if allocations:
+                after = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                if started_tracing:
+                    tracemalloc.stop()
+                top_allocations = {
+                    "traced_bytes": current,
+                    "peak_traced_bytes": peak,
+                    # Growth per allocation site over the capture window
+                    "top": [
+                        {
+                            "site": str(stat.traceback[0]),
+                            "size_diff": stat.size_diff,
+                            "count_diff": stat.count_diff,
+                            "size": stat.size,
+                        }
+                        for stat in after.compare_to(before, "lineno")[:TOP_ALLOCATIONS]
+                    ],
+                }
+
+            return {
+                "started_at": started,
+                "seconds": seconds,
+                "interval": interval,
+                "samples": samples,
+                "top_functions": self._top_functions(stacks),
+                "allocations": top_allocations,
+                # flamegraph.pl / speedscope input, one "stack count" per line
+                "collapsed": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()),
+            }
+        finally:
+            self.lock.release()
+
+
+profiler = Profiler()
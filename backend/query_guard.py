@@ -0,0 +1,214 @@
+import asyncio
+import contextvars
+import datetime
+import functools
+import inspect
+import json
+import os
+import threading
+from urllib.parse import parse_qsl
+
+from instrumentation import stats
+from ranges import ROLLUP_STEP_SECONDS, RangeError, parse_step, parse_window
+
+# Deadlines, cancellation and admission for the history routes. Every
+# connection a guarded request opens gets a statement_timeout, the running
+# statement is cancelled as soon as the client disconnects, and queries over
+# long windows wait for one of a few slots instead of piling onto Postgres
+QUERY_TIMEOUT_SECONDS = float(os.getenv("QUERY_TIMEOUT_SECONDS", "10"))
+HEAVY_QUERY_TIMEOUT_SECONDS = float(os.getenv("HEAVY_QUERY_TIMEOUT_SECONDS", "60"))
+MAX_HEAVY_QUERIES = int(os.getenv("MAX_HEAVY_QUERIES", "4"))
+# How long a heavy query waits for a slot before it is refused
+HEAVY_QUERY_QUEUE_SECONDS = 5
+QUERY_RETRY_AFTER_SECONDS = 5
+
+HISTORY_PREFIXES = ("/cpu/", "/memory/", "/swap_memory/", "/io/", "/gpu/", "/latency", "/processes/", "/snapshot")
+# Windows of a month or more scan raw history (groupby=day reads a month)
+HEAVY_WINDOWS = {
+    "time": {"month", "monthly", "year", "yearly", "overall"},
+    "groupby": {"day", "month", "year"},
+}
+HEAVY_RANGE = datetime.timedelta(days=28)
+
+heavy_slots = asyncio.Semaphore(MAX_HEAVY_QUERIES)
+
+_current = contextvars.ContextVar("query_guard", default=None)
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class QueryGuard:
+    # One per guarded request; the route's worker thread sees it through the
+    # context copied into the threadpool
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.connections = []
+        self.cancelled = False
+        self.responded = False
+        self.lock = threading.Lock()
+
+    def options(self):
+        # Passed at connect time, so the timeout costs no extra round trip
+        return f"-c statement_timeout={int(self.timeout * 1000)}"
+
+    def attach(self, connection):
+        with self.lock:
+            self.connections.append(connection)
+            if self.cancelled:
+                raise ClientDisconnected("Client disconnected before the query ran")
+
+    def check(self):
+        # Closes the gap where the client leaves between statements
+        if self.cancelled:
+            raise ClientDisconnected("Client disconnected")
+
+    def cancel(self):
+        # Sends a cancel request for whatever each connection is running, like
+        # pg_cancel_backend on its backend pid but without another connection
+        with self.lock:
+            if self.cancelled or self.responded:
+                return
+            self.cancelled = True
+            connections = list(self.connections)
+        stats.incr("queries", "cancelled_on_disconnect")
+        for connection in connections:
+            try:
+                connection.cancel()
+            except Exception as e:
+                print(f"Error cancelling query: {e}")
+
+    def close(self):
+        with self.lock:
+            connections, self.connections = self.connections, []
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+def current_guard():
+    return _current.get()
+
+
+def reads_rollups(endpoint):
+    # Marks a timeseries route that serves whole-hour steps from series_rollups;
+    # every other route scans raw rows whatever the step
+    endpoint.reads_rollups = True
+    return endpoint
+
+@functools.lru_cache(maxsize=None)
+def _window_defaults(endpoint):
+    parameters = inspect.signature(endpoint).parameters
+    return {name: parameters[name].default for name in HEAVY_WINDOWS if name in parameters}
+
+def is_heavy(scope):
+    # The requested window, with the route's own defaults for parameters the
+    # client left out (/cpu/percent reads all history unless told otherwise)
+    from starlette.routing import Match
+    endpoint = None
+    params = {}
+    for route in scope["app"].router.routes:
+        if route.matches(scope)[0] == Match.FULL:
+            endpoint = route.endpoint
+            params.update(_window_defaults(endpoint))
+            break
+    params.update(parse_qsl(scope["query_string"].decode()))
+    if params.get("start") is not None:
+        # Explicit ranges: long ones are heavy unless the route reads rollups
+        # for an explicit whole-hour step
+        try:
+            start, end = parse_window(params["start"], params.get("end"))
+            step = parse_step(params["step"]) if params.get("step") is not None else None
+        except RangeError:
+            # The route answers 400 without querying
+            return False
+        if end - start < HEAVY_RANGE:
+            return False
+        from_rollups = getattr(endpoint, "reads_rollups", False) and step is not None and step % ROLLUP_STEP_SECONDS == 0
+        return not from_rollups
+    return any(params.get(name) in windows for name, windows in HEAVY_WINDOWS.items())
+
+async def _respond(send, status, error, headers=()):
+    body = json.dumps({"error": error}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def _acquire(semaphore, timeout):
+    # asyncio.wait_for(semaphore.acquire(), ...) can leak a slot before
+    # Python 3.12: the timeout may cancel an acquire that has already won.
+    # Here the acquire is its own task, and if it wins after we stop waiting
+    # (timeout, or this request cancelled) the slot is given straight back
+    acquire = asyncio.ensure_future(semaphore.acquire())
+    try:
+        await asyncio.wait({acquire}, timeout=timeout)
+    finally:
+        if not acquire.done():
+            acquire.cancel()
+            acquire.add_done_callback(lambda task: task.cancelled() or semaphore.release())
+    return acquire.done() and not acquire.cancelled()
+
+
+class QueryGuardMiddleware:
+    # Plain ASGI middleware around the history routes
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(HISTORY_PREFIXES):
+            return await self.app(scope, receive, send)
+
+        heavy = is_heavy(scope)
+        guard = QueryGuard(HEAVY_QUERY_TIMEOUT_SECONDS if heavy else QUERY_TIMEOUT_SECONDS)
+
+        # The route reads client messages through a queue, so a watcher can
+        # see the disconnect while the query is still running
+        messages = asyncio.Queue()
+        async def watch():
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    await asyncio.to_thread(guard.cancel)
+                    return
+
+        async def send_tracked(message):
+            if message["type"] == "http.response.start":
+                guard.responded = True
+            await send(message)
+
+        watcher = asyncio.create_task(watch())
+        try:
+            if heavy:
+                if not await _acquire(heavy_slots, HEAVY_QUERY_QUEUE_SECONDS):
+                    stats.incr("queries", "heavy_refused")
+                    return await _respond(
+                        send, 429, "Too many long-range queries are running, retry later",
+                        [(b"retry-after", str(QUERY_RETRY_AFTER_SECONDS).encode())],
+                    )
+            try:
+                if guard.cancelled:
+                    # The client left while queued. Nobody reads this, but the
+                    # request still ends with a status in the access log
+                    return await _respond(send, 499, "Client closed the request")
+                token = _current.set(guard)
+                try:
+                    await self.app(scope, messages.get, send_tracked)
+                finally:
+                    _current.reset(token)
+            finally:
+                if heavy:
+                    heavy_slots.release()
+        finally:
+            watcher.cancel()
+            # History routes leave their connection open; it goes back here
+            await asyncio.to_thread(guard.close)
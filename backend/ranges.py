@@ -0,0 +1,90 @@
+import collections
+import datetime
+import math
+import re
+
+# Prometheus-style range queries for the history routes: start and end as
+# unix seconds or ISO 8601, step as seconds or a duration like 10s/5m/1h/1d.
+# Stored timestamps are naive local time, so instants are converted to it
+MAX_RANGE_POINTS = 11000
+# Steps picked when the client gives none, smallest first; a range gets the
+# first one that keeps it under DEFAULT_RANGE_POINTS points
+DEFAULT_RANGE_POINTS = 300
+NICE_STEPS = [1, 5, 10, 15, 30, 60, 300, 600, 900, 1800, 3600, 7200, 10800, 21600, 43200, 86400]
+# series_rollups holds hourly buckets, so steps of whole hours read those
+ROLLUP_STEP_SECONDS = 3600
+
+STEP_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_STEP = re.compile(r"^(\d+(?:\.\d+)?)([smhdw]?)$")
+
+TimeRange = collections.namedtuple("TimeRange", ["start", "end", "step"])
+
+
+class RangeError(ValueError):
+    pass
+
+
+def parse_instant(value):
+    try:
+        return datetime.datetime.fromtimestamp(float(value))
+    except ValueError:
+        pass
+    except (OverflowError, OSError):
+        raise RangeError(f"Timestamp {value!r} is out of range")
+    try:
+        instant = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise RangeError(f"Invalid timestamp {value!r}. Use unix seconds or ISO 8601.")
+    if instant.tzinfo is not None:
+        instant = instant.astimezone().replace(tzinfo=None)
+    return instant
+
+def parse_step(value):
+    match = _STEP.match(value.strip().lower())
+    if not match:
+        raise RangeError(f"Invalid step {value!r}. Use seconds or a duration such as 10s, 5m, 1h or 1d.")
+    seconds = round(float(match.group(1)) * STEP_UNITS[match.group(2)])
+    if seconds < 1:
+        raise RangeError("step must be at least one second")
+    return seconds
+
+def default_step(span):
+    wanted = span / DEFAULT_RANGE_POINTS
+    for step in NICE_STEPS:
+        if step >= wanted:
+            return step
+    return math.ceil(wanted / 86400) * 86400
+
+def parse_window(start, end):
+    # -> (start, end), or None when the route's fixed window applies
+    if start is None:
+        if end is not None:
+            raise RangeError("end needs a start")
+        return None
+    start = parse_instant(start)
+    end = parse_instant(end) if end is not None else datetime.datetime.now()
+    if end <= start:
+        raise RangeError("end must be after start")
+    return start, end
+
+def parse_range(start, end, step):
+    # -> TimeRange, or None when the route's groupby applies
+    window = parse_window(start, end)
+    if window is None:
+        if step is not None:
+            raise RangeError("step needs a start")
+        return None
+    start, end = window
+    span = (end - start).total_seconds()
+    step = parse_step(step) if step is not None else default_step(span)
+    if span / step > MAX_RANGE_POINTS:
+        raise RangeError(f"Range has more than {MAX_RANGE_POINTS} points at this step. Use a larger step or a shorter range.")
+    return TimeRange(start, end, step)
+
+def uses_rollups(time_range):
+    return time_range.step % ROLLUP_STEP_SECONDS == 0
+
+def period_expression(column):
+    # Buckets of %(step)s seconds aligned to the epoch (local midnight for a
+    # day), labelled by their start
+    return f"'epoch'::timestamp + floor(extract(epoch FROM {column}) / %(step)s) * %(step)s * interval '1 second'"
@@ -0,0 +1,104 @@
+import datetime
+import json
+import math
+import os
+import zlib
+
+from snapshot import SAMPLE_CLASSES, Snapshot
+
+# Server side of the push agent (agent.py). A batch is one host's samples as
+# gzip'd JSON: {"host": ..., "batch_id": ..., "sent_at": ..., "samples":
+# [frame, ...]}, each frame shaped like a /ws/metrics frame plus an epoch
+# "timestamp" that the agent has already corrected to the server's clock.
+# batch_id is the same every time the agent retries the same frames, so a
+# batch committed before its response was lost is stored once
+INGEST_TOKEN = os.getenv("INGEST_TOKEN")
+INGEST_MAX_CONCURRENCY = int(os.getenv("INGEST_MAX_CONCURRENCY", "8"))
+INGEST_RETRY_AFTER_SECONDS = 2
+MAX_BATCH_BYTES = 16 * 1024 * 1024
+MAX_BATCH_SAMPLES = 5000
+MAX_HOST_LENGTH = 255
+MAX_BATCH_ID_LENGTH = 64
+# How long batch ids are remembered; agents buffer about a day by default
+INGEST_DEDUPE_DAYS = 7
+# Numeric columns are bigint or double precision; larger values can't be stored
+MAX_STORED_NUMBER = 2 ** 63
+
+
+class BatchError(Exception):
+    pass
+
+
+def _gunzip(body):
+    # Bounded, so a small compressed body can't expand without limit
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, MAX_BATCH_BYTES + 1)
+    except zlib.error as e:
+        raise BatchError(f"Invalid gzip body: {e}")
+    if len(data) > MAX_BATCH_BYTES or decompressor.unconsumed_tail:
+        raise BatchError(f"Batch is larger than {MAX_BATCH_BYTES} bytes uncompressed")
+    return data
+
+def _check_text(value, name):
+    # Postgres text can't hold NUL
+    if not isinstance(value, str) or "\x00" in value:
+        raise BatchError(f"{name} must be a string")
+
+def _check_numbers(values, name):
+    for value in values:
+        if (isinstance(value, bool) or not isinstance(value, (float, int))
+                or not math.isfinite(value) or abs(value) >= MAX_STORED_NUMBER):
+            raise BatchError(f"{name} must be a finite number, got {value!r}")
+
+def _check_sample(sample):
+    # Checks what the insert would otherwise fail on, so a bad batch is
+    # refused with 400 and dropped instead of failing as 503 and retried forever
+    section = sample.section
+    for device in getattr(sample, "devices", ()):
+        _check_text(device, f"{section} device name")
+    for column in getattr(sample, "TEXT_COLUMNS", ()):
+        for value in getattr(sample, column):
+            _check_text(value, f"{section}.{column}")
+    for column in getattr(sample, "COLUMNS", ()):
+        _check_numbers(getattr(sample, column), f"{section}.{column}")
+    for field in getattr(sample, "FIELDS", ()):
+        _check_numbers((getattr(sample, field),), f"{section}.{field}")
+
+def decode_batch(body, content_encoding=""):
+    # -> (host, batch_id or None, [(timestamp, Snapshot)]); raises
+    # BatchError for anything the agent should drop rather than retry
+    if content_encoding == "gzip":
+        body = _gunzip(body)
+    elif content_encoding:
+        raise BatchError(f"Unsupported Content-Encoding {content_encoding!r}")
+    try:
+        batch = json.loads(body)
+    except ValueError as e:
+        raise BatchError(f"Invalid JSON: {e}")
+    if not isinstance(batch, dict):
+        raise BatchError("Batch must be a JSON object")
+
+    host = batch.get("host")
+    samples = batch.get("samples")
+    if not isinstance(host, str) or not host or len(host) > MAX_HOST_LENGTH or "\x00" in host:
+        raise BatchError("host must be a non-empty string")
+    if not isinstance(samples, list) or len(samples) > MAX_BATCH_SAMPLES:
+        raise BatchError(f"samples must be a list of at most {MAX_BATCH_SAMPLES} frames")
+    batch_id = batch.get("batch_id")
+    if batch_id is not None and (not isinstance(batch_id, str) or not batch_id or len(batch_id) > MAX_BATCH_ID_LENGTH):
+        raise BatchError(f"batch_id must be a non-empty string of at most {MAX_BATCH_ID_LENGTH} characters")
+
+    decoded = []
+    for sample in samples:
+        try:
+            # Families this server doesn't store are skipped, so newer agents can send more
+            frame = {name: data for name, data in sample.items() if name in SAMPLE_CLASSES}
+            timestamp = datetime.datetime.fromtimestamp(round(sample["timestamp"]))
+            snapshot = Snapshot.from_dict(frame)
+        except (AttributeError, KeyError, TypeError, ValueError, OverflowError, OSError) as e:
+            raise BatchError(f"Malformed sample: {e!r}")
+        for sample in snapshot.sections.values():
+            _check_sample(sample)
+        decoded.append((timestamp, snapshot))
+    return host, batch_id, decoded
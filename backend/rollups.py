@@ -0,0 +1,274 @@
+from instrumentation import stats
+from live_info import HOST_NAME, get_db_connection
+from ranges import period_expression, uses_rollups
+
+# Hourly per-host rollups behind the fleet routes. Each metric is one value
+# per host per sample (CPU averaged over cores, the fullest disk, IO summed
+# over devices), aggregated into samples/avg/min/max per hour. Fleet queries
+# then read hosts x buckets rows from host_rollups, never raw metric rows.
+ROLLUP_INTERVAL_MINUTES = 5
+# Each refresh recomputes only the (host, hour) buckets that rows past the
+# table's id watermark fall in, so late samples pushed through /ingest are
+# picked up wherever they land. Ids are read in chunks of this many, one
+# transaction each, which also bounds the first run's backfill
+ROLLUP_ID_CHUNK = 1000000
+
+# Restricts a table to the dirty buckets: an index scan on (host, timestamp) per bucket
+_BUCKETS = """JOIN unnest(CAST(%(hosts)s AS text[]), CAST(%(buckets)s AS timestamp[])) AS dirty(dirty_host, dirty_bucket)
+        ON host = dirty_host AND timestamp >= dirty_bucket AND timestamp < dirty_bucket + interval '1 hour'"""
+
+def _per_sample(table, expression):
+    # One value per host per timestamp, then hourly stats over those values
+    return f"""
+        SELECT host, date_trunc('hour', timestamp), COUNT(*), AVG(value), MIN(value), MAX(value)
+        FROM (SELECT host, timestamp, {expression} AS value FROM {table} {_BUCKETS} GROUP BY host, timestamp) samples
+        GROUP BY 1, 2
+    """
+
+def _rate(column):
+    # Counters are cumulative: bytes/s per device over the bucket, summed per host
+    return f"""
+        SELECT host, bucket, SUM(samples), SUM(rate), SUM(rate), SUM(rate)
+        FROM (
+            SELECT host, device_name, date_trunc('hour', timestamp) AS bucket, COUNT(*) AS samples,
+                GREATEST(MAX({column}) - MIN({column}), 0)
+                    / NULLIF(EXTRACT(EPOCH FROM MAX(timestamp) - MIN(timestamp)), 0) AS rate
+            FROM disk_io_metrics {_BUCKETS}
+            GROUP BY 1, 2, 3
+        ) devices
+        GROUP BY 1, 2
+        HAVING SUM(rate) IS NOT NULL
+    """
+
+# metric -> (source table, query)
+ROLLUP_QUERIES = {
+    "cpu_percent": ("cpu_metrics", _per_sample("cpu_metrics", "AVG(percent_usage)")),
+    "memory_percent": ("memory_metrics", _per_sample("memory_metrics", "AVG(memory_percent_usage)")),
+    "swap_memory_percent": ("swap_memory_metrics", _per_sample("swap_memory_metrics", "AVG(percent_usage)")),
+    "disk_usage_percent": ("disk_usage_metrics", _per_sample("disk_usage_metrics", "MAX(percent_usage)")),
+    "gpu_utilization": ("gpu_metrics", _per_sample("gpu_metrics", "AVG(gpu_utilization)")),
+    "io_read_bytes_rate": ("disk_io_metrics", _rate("read_bytes")),
+    "io_write_bytes_rate": ("disk_io_metrics", _rate("write_bytes")),
+}
+
+# History route metric -> (table, column, series column). series_rollups
+# keeps the same hourly stats per core, device or target for one host, which
+# range queries read when their step is a whole number of hours
+SERIES_METRICS = {
+    "memory_percent": ("memory_metrics", "memory_percent_usage", None),
+    "swap_memory_percent": ("swap_memory_metrics", "percent_usage", None),
+    "cpu_percent": ("cpu_metrics", "percent_usage", "core_id"),
+    "io_read_bytes": ("disk_io_metrics", "read_bytes", "device_name"),
+    "io_write_bytes": ("disk_io_metrics", "write_bytes", "device_name"),
+    "io_read_time": ("disk_io_metrics", "read_time", "device_name"),
+    "io_write_time": ("disk_io_metrics", "write_time", "device_name"),
+    "gpu_utilization": ("gpu_metrics", "gpu_utilization", "device_name"),
+    "gpu_memory": ("gpu_metrics", "memory_used", "device_name"),
+    "gpu_temperature": ("gpu_metrics", "temperature", "device_name"),
+    "latency": ("latency_metrics", "avg_ms", "target"),
+    "latency_loss": ("latency_metrics", "loss_percent", "target"),
+}
+# Series stored as text that the routes report as numbers
+SERIES_TYPES = {"core_id": int}
+
+def _per_series(table, column, series):
+    series = f"CAST({series} AS text)" if series else "''"
+    return f"""
+        SELECT host, {series}, date_trunc('hour', timestamp), COUNT({column}), AVG({column}), MIN({column}), MAX({column})
+        FROM {table} {_BUCKETS}
+        GROUP BY 1, 2, 3
+        HAVING COUNT({column}) > 0
+    """
+
+SERIES_ROLLUP_QUERIES = {metric: (spec[0], _per_series(*spec)) for metric, spec in SERIES_METRICS.items()}
+
+# Every table a rollup reads, each with its own watermark
+ROLLUP_TABLES = sorted({table for table, _ in [*ROLLUP_QUERIES.values(), *SERIES_ROLLUP_QUERIES.values()]})
+
+# type parameter -> how one host's hourly rows combine into a longer period
+HOST_AGGREGATES = {
+    "avg": "SUM(avg_value * samples) / SUM(samples)",
+    "max": "MAX(max_value)",
+    "min": "MIN(min_value)",
+}
+
+
+def _rollup_buckets(cursor, table, buckets):
+    # Recomputes every rollup fed by table for the given (host, bucket) pairs
+    params = {"hosts": [host for host, _ in buckets], "buckets": [bucket for _, bucket in buckets]}
+    for metric, (source, query) in ROLLUP_QUERIES.items():
+        if source != table:
+            continue
+        cursor.execute(
+            f"""
+            INSERT INTO host_rollups (host, bucket, samples, avg_value, min_value, max_value, metric)
+            SELECT rolled.*, %(metric)s FROM ({query}) AS rolled
+            ON CONFLICT (host, metric, bucket) DO UPDATE SET samples = EXCLUDED.samples,
+                avg_value = EXCLUDED.avg_value, min_value = EXCLUDED.min_value, max_value = EXCLUDED.max_value
+            """,
+            {**params, "metric": metric}
+        )
+    for metric, (source, query) in SERIES_ROLLUP_QUERIES.items():
+        if source != table:
+            continue
+        cursor.execute(
+            f"""
+            INSERT INTO series_rollups (host, series, bucket, samples, avg_value, min_value, max_value, metric)
+            SELECT rolled.*, %(metric)s FROM ({query}) AS rolled
+            ON CONFLICT (host, metric, bucket, series) DO UPDATE SET samples = EXCLUDED.samples,
+                avg_value = EXCLUDED.avg_value, min_value = EXCLUDED.min_value, max_value = EXCLUDED.max_value
+            """,
+            {**params, "metric": metric}
+        )
+
+def _refresh_table(conn, table):
+    # last_id is the highest id rolled up. The scan starts from the run
+    # before's (previous_id), so rows that a transaction still open at that
+    # point committed under a lower id are caught on the next refresh
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT last_id, previous_id FROM rollup_watermarks WHERE source_table = %s", (table,))
+        watermark = cursor.fetchone()
+        cursor.execute(f"SELECT MAX(id) FROM {table}")
+        latest = cursor.fetchone()[0] or 0
+    # No watermark yet: backfill everything, then start tracking
+    last_id, previous_id = watermark or (None, None)
+    since = previous_id if previous_id is not None else last_id or 0
+    while since < latest:
+        chunk_end = min(since + ROLLUP_ID_CHUNK, latest)
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""SELECT DISTINCT host, date_trunc('hour', timestamp) FROM {table}
+                WHERE id > %s AND id <= %s AND timestamp IS NOT NULL""",
+                (since, chunk_end)
+            )
+            buckets = cursor.fetchall()
+            if buckets:
+                _rollup_buckets(cursor, table, buckets)
+            cursor.execute(
+                """INSERT INTO rollup_watermarks (source_table, last_id, previous_id) VALUES (%s, %s, %s)
+                ON CONFLICT (source_table) DO UPDATE SET last_id = EXCLUDED.last_id, previous_id = EXCLUDED.previous_id""",
+                (table, chunk_end, last_id)
+            )
+        conn.commit()
+        stats.incr("rollups", f"buckets {table}", len(buckets))
+        since = chunk_end
+
+def refresh_rollups():
+    conn = get_db_connection()
+    if conn is None:
+        return
+    try:
+        for table in ROLLUP_TABLES:
+            _refresh_table(conn, table)
+    except Exception as e:
+        print(f"Error refreshing rollups: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def list_hosts():
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT host, first_seen, last_seen FROM hosts ORDER BY host")
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+# window is an interval string ('1 day') or None for all history
+def fleet_timeseries(metric, type, quantile, trunc, window):
+    # Per period: the quantile across hosts of each host's value for it
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT period, percentile_cont(%(quantile)s) WITHIN GROUP (ORDER BY value), AVG(value), MAX(value), COUNT(*)
+                FROM (
+                    SELECT host, date_trunc('{trunc}', bucket) AS period, {HOST_AGGREGATES[type]} AS value
+                    FROM host_rollups
+                    WHERE metric = %(metric)s AND (%(window)s IS NULL OR bucket >= NOW() - CAST(%(window)s AS interval))
+                    GROUP BY host, date_trunc('{trunc}', bucket)
+                ) per_host
+                WHERE value IS NOT NULL
+                GROUP BY period
+                ORDER BY period
+                """,
+                {"quantile": quantile, "metric": metric, "window": window}
+            )
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+def fleet_top(metric, type, window, limit):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT host, {HOST_AGGREGATES[type]} AS value, SUM(samples)
+                FROM host_rollups
+                WHERE metric = %(metric)s AND (%(window)s IS NULL OR bucket >= NOW() - CAST(%(window)s AS interval))
+                GROUP BY host
+                HAVING {HOST_AGGREGATES[type]} IS NOT NULL
+                ORDER BY value DESC
+                LIMIT %(limit)s
+                """,
+                {"metric": metric, "window": window, "limit": limit}
+            )
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+def range_points(metric, type, host, time_range, series=None, digits=2):
+    # One history route's series over an explicit range, bucketed by step.
+    # Whole-hour steps read series_rollups; anything finer reads the raw table
+    # through its (host, timestamp) index. Either way a row or hourly bucket
+    # counts when it starts within [start, end), so a start past the hour
+    # skips that hour's bucket rather than pulling in time before start
+    table, column, series_column = SERIES_METRICS[metric]
+    params = {
+        "host": host or HOST_NAME,
+        "metric": metric,
+        "start": time_range.start,
+        "end": time_range.end,
+        "step": time_range.step,
+        "series": series,
+    }
+    if uses_rollups(time_range):
+        query = f"""
+            SELECT series, {period_expression('bucket')} AS period, {HOST_AGGREGATES[type]}
+            FROM series_rollups
+            WHERE host = %(host)s AND metric = %(metric)s
+                AND bucket >= %(start)s AND bucket < %(end)s
+                {"AND series = %(series)s" if series is not None else ""}
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """
+    else:
+        query = f"""
+            SELECT {series_column or "''"}, {period_expression('timestamp')} AS period, {type.upper()}({column})
+            FROM {table}
+            WHERE host = %(host)s AND timestamp >= %(start)s AND timestamp < %(end)s
+                {f"AND {series_column} = %(series)s" if series is not None else ""}
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    # Same point shape as the route's groupby form
+    cast = SERIES_TYPES.get(series_column, str)
+    points = []
+    for series_value, period, value in rows:
+        point = {series_column: cast(series_value)} if series_column else {}
+        point["period"] = period.isoformat()
+        point["value"] = round(float(value), digits) if value is not None else None
+        points.append(point)
+    return points
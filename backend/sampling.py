@@ -0,0 +1,135 @@
+import concurrent.futures
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+# Local samplers that need nothing but psutil, shared by the backend and the
+# standalone push agent (agent.py), which must not import FastAPI, psycopg2
+# or the GPU libraries
+
+# Mounts whose disk_usage call misses its deadline (a stale NFS or FUSE
+# mount) are skipped for a doubling backoff
+QUARANTINE_BASE_SECONDS = 30
+QUARANTINE_MAX_SECONDS = 900
+
+def gather_cpu_times():
+    cpu_times = psutil.cpu_times(percpu=True)
+
+    user_time = {f"core_{i+1}": core[0] for i, core in enumerate(cpu_times)}
+    system_time = {f"core_{i+1}": core[1] for i, core in enumerate(cpu_times)}
+    idle_time = {f"core_{i+1}": core[2] for i, core in enumerate(cpu_times)}
+    
+    return user_time, system_time, idle_time
+
+def gather_cpu_percents():
+    cpu_percents = psutil.cpu_percent(percpu=True)
+    return {f"core_{i+1}": percent for i, percent in enumerate(cpu_percents)}
+
+def gather_virtual_memory_stats():
+    virtual_memory = psutil.virtual_memory()
+    return virtual_memory[1], virtual_memory[2], virtual_memory[3]
+
+def gather_swap_memory_stats():
+    swap_memory = psutil.swap_memory()
+    return swap_memory[1], swap_memory[2], swap_memory[3]
+
+def list_disk_partitions():
+    return psutil.disk_partitions()
+
+def get_partition_usage(partition):
+    usage = psutil.disk_usage(partition.mountpoint)
+    return {
+        "mountpoint": partition.mountpoint,
+        "fstype": partition.fstype,
+        "total": usage.total,
+        "used": usage.used,
+        "free": usage.free,
+        "percent": usage.percent
+    }
+
+def get_disk_usage():
+    disk_usage_info = {}
+    for partition in list_disk_partitions():
+        try:
+            disk_usage_info[partition.device] = get_partition_usage(partition)
+        except PermissionError:
+            continue
+    return disk_usage_info
+
+class DeadlineCalls:
+    # Blocking counterpart of Collector._call for the push agent. Each call
+    # gets a deadline; one that overruns keeps its worker and is not
+    # resubmitted until it returns, so a hung mount only ever ties up one thread
+    def __init__(self, workers=4):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sampling")
+        # name -> future still running from an earlier call
+        self.in_flight = {}
+        # mountpoint -> (quarantined until, current backoff)
+        self.quarantine = {}
+
+    def call(self, name, fn, *args, deadline):
+        # -> (status, value) with status "ok", "late" or "error"
+        future = self.in_flight.get(name)
+        if future is None:
+            future = self.in_flight[name] = self.pool.submit(fn, *args)
+        try:
+            value = future.result(timeout=deadline)
+        except concurrent.futures.TimeoutError:
+            return "late", None
+        except Exception as e:
+            del self.in_flight[name]
+            if not isinstance(e, PermissionError):
+                print(f"Error collecting {name}: {e}")
+            return "error", None
+        del self.in_flight[name]
+        return "ok", value
+
+    def disk_usage(self, deadline):
+        # -> (get_disk_usage shape, mountpoints that were late or quarantined)
+        status, partitions = self.call("disk_partitions", list_disk_partitions, deadline=deadline)
+        if status != "ok":
+            return None, ["disk_partitions"]
+        # Started together, so the whole family takes one deadline at most
+        now = time.monotonic()
+        pending = []
+        late = []
+        for partition in partitions:
+            until, backoff = self.quarantine.get(partition.mountpoint, (0, 0))
+            if now < until:
+                late.append(partition.mountpoint)
+                continue
+            name = f"disk_usage:{partition.mountpoint}"
+            if name not in self.in_flight:
+                self.in_flight[name] = self.pool.submit(get_partition_usage, partition)
+            pending.append((partition, name))
+
+        usage = {}
+        expires = time.monotonic() + deadline
+        for partition, name in pending:
+            status, value = self.call(name, get_partition_usage, partition, deadline=max(expires - time.monotonic(), 0))
+            if status == "ok":
+                self.quarantine.pop(partition.mountpoint, None)
+                usage[partition.device] = value
+            elif status == "late":
+                _, backoff = self.quarantine.get(partition.mountpoint, (0, 0))
+                backoff = min(max(backoff * 2, QUARANTINE_BASE_SECONDS), QUARANTINE_MAX_SECONDS)
+                self.quarantine[partition.mountpoint] = (time.monotonic() + backoff, backoff)
+                print(f"Quarantining {partition.mountpoint} for {backoff}s")
+                late.append(partition.mountpoint)
+        return usage, late
+
+# Windows needs diskperf -y ran in cmd.exe
+def get_disk_io_counters():
+    raw_disks = psutil.disk_io_counters(perdisk=True)
+    result = {}
+    for key, value in raw_disks.items():
+        result[key] = {
+            'read_count': value.read_count,
+            'write_count': value.write_count,
+            'read_bytes': value.read_bytes,
+            'write_bytes': value.write_bytes,
+            'read_time': value.read_time,
+            'write_time': value.write_time,
+        }
+    return result
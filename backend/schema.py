@@ -0,0 +1,283 @@
+import argparse
+import re
+import threading
+import time
+
+from live_info import HOST_NAME, get_db_connection
+
+# Idempotent DDL applied at startup, on top of the tables listed in the README
+SCHEMA_STATEMENTS = [
+    # Alerts are incidents: one open row per component, updated in place
+    "ALTER TABLE alerts ADD COLUMN IF NOT EXISTS last_seen timestamp without time zone",
+    "ALTER TABLE alerts ADD COLUMN IF NOT EXISTS closed_at timestamp without time zone",
+    "ALTER TABLE alerts ADD COLUMN IF NOT EXISTS peak_value double precision",
+    # Anomaly incidents: z-score of the latest reading and the highest one;
+    # value and peak_value hold the observed values
+    "ALTER TABLE alerts ADD COLUMN IF NOT EXISTS score double precision",
+    "ALTER TABLE alerts ADD COLUMN IF NOT EXISTS peak_score double precision",
+    "CREATE INDEX IF NOT EXISTS alerts_unsent_idx ON alerts (timestamp) WHERE sent = false",
+    # Alerts a subscriber's failed digests missed, resent with the next one
+    "ALTER TABLE email_subscriptions ADD COLUMN IF NOT EXISTS failed_alert_ids bigint[] NOT NULL DEFAULT '{}'",
+    "ALTER TABLE email_subscriptions ADD COLUMN IF NOT EXISTS digest_failures integer NOT NULL DEFAULT 0",
+    """CREATE TABLE IF NOT EXISTS gpu_metrics (
+        id bigserial PRIMARY KEY,
+        "timestamp" timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+        device_name text NOT NULL,
+        model text,
+        gpu_utilization double precision NOT NULL,
+        memory_utilization double precision NOT NULL,
+        memory_used bigint NOT NULL,
+        memory_total bigint NOT NULL,
+        temperature double precision NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS gpu_metrics_timestamp_idx ON gpu_metrics (timestamp)",
+    """CREATE TABLE IF NOT EXISTS latency_metrics (
+        id bigserial PRIMARY KEY,
+        "timestamp" timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+        target text NOT NULL,
+        min_ms double precision,
+        avg_ms double precision,
+        max_ms double precision,
+        loss_percent double precision NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS latency_metrics_target_timestamp_idx ON latency_metrics (target, timestamp)",
+    # Only the union of the top N by CPU, RSS and IO is kept per sample
+    """CREATE TABLE IF NOT EXISTS process_metrics (
+        id bigserial PRIMARY KEY,
+        "timestamp" timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+        pid integer NOT NULL,
+        name text,
+        cpu_percent real NOT NULL,
+        rss bigint NOT NULL,
+        io_bytes_per_sec real NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS process_metrics_timestamp_idx ON process_metrics (timestamp)",
+    # Fleet registry, written on a host's first sample and then every few minutes
+    """CREATE TABLE IF NOT EXISTS hosts (
+        host text PRIMARY KEY,
+        first_seen timestamp without time zone NOT NULL,
+        last_seen timestamp without time zone NOT NULL
+    )""",
+    # Hourly per-host aggregates that fleet queries read instead of raw rows
+    """CREATE TABLE IF NOT EXISTS host_rollups (
+        host text NOT NULL,
+        metric text NOT NULL,
+        bucket timestamp without time zone NOT NULL,
+        samples integer NOT NULL,
+        avg_value double precision,
+        min_value double precision,
+        max_value double precision,
+        PRIMARY KEY (host, metric, bucket)
+    )""",
+    "CREATE INDEX IF NOT EXISTS host_rollups_metric_bucket_idx ON host_rollups (metric, bucket)",
+    # Hourly stats per core, device or latency target for range queries; the
+    # key leads with bucket after (host, metric) so ranges are index scans
+    """CREATE TABLE IF NOT EXISTS series_rollups (
+        host text NOT NULL,
+        metric text NOT NULL,
+        series text NOT NULL,
+        bucket timestamp without time zone NOT NULL,
+        samples integer NOT NULL,
+        avg_value double precision,
+        min_value double precision,
+        max_value double precision,
+        PRIMARY KEY (host, metric, bucket, series)
+    )""",
+    # Ids of recently stored agent batches, so a retried batch is stored once
+    """CREATE TABLE IF NOT EXISTS ingest_batches (
+        host text NOT NULL,
+        batch_id text NOT NULL,
+        received_at timestamp without time zone NOT NULL DEFAULT now(),
+        PRIMARY KEY (host, batch_id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ingest_batches_received_at_idx ON ingest_batches (received_at)",
+    # One-time data migrations already applied (see ONE_TIME_MIGRATIONS)
+    """CREATE TABLE IF NOT EXISTS schema_migrations (
+        name text PRIMARY KEY,
+        applied_at timestamp without time zone NOT NULL DEFAULT now()
+    )""",
+    # How far each metric table's ids have been rolled up (see rollups.py)
+    """CREATE TABLE IF NOT EXISTS rollup_watermarks (
+        source_table text PRIMARY KEY,
+        last_id bigint NOT NULL,
+        previous_id bigint
+    )""",
+]
+
+# Data migrations run by the first startup that finds them missing from
+# schema_migrations, instead of scanning the table on every startup
+ONE_TIME_MIGRATIONS = {
+    # Rows written before incidents existed are one-off samples, close them.
+    # Must run before the one-open-incident index below is built
+    "close_legacy_alerts": "UPDATE alerts SET last_seen = timestamp, closed_at = timestamp, peak_value = value WHERE last_seen IS NULL",
+}
+
+# Tables whose rows belong to one monitored host
+HOST_TABLES = [
+    "cpu_metrics",
+    "memory_metrics",
+    "swap_memory_metrics",
+    "disk_io_metrics",
+    "disk_usage_metrics",
+    "gpu_metrics",
+    "latency_metrics",
+    "process_metrics",
+    "alerts",
+]
+
+# Original tables with integer surrogate ids. At fleet rates int4 runs out in
+# days (300 hosts x 16 cores at 1 Hz is ~4800 cpu_metrics rows/s), so the ids
+# and their sequences are widened to bigint by `python schema.py --widen-ids`
+BIGINT_ID_TABLES = [
+    "cpu_metrics",
+    "memory_metrics",
+    "swap_memory_metrics",
+    "disk_io_metrics",
+    "disk_usage_metrics",
+    "network_metrics",
+]
+_NEXTVAL = re.compile(r"nextval\('([^']+)'")
+
+def integer_ids(cursor):
+    # (table, column is integer, integer sequence or None) for each table
+    # still to widen; a few catalog reads
+    cursor.execute(
+        """SELECT table_name, data_type, column_default FROM information_schema.columns
+        WHERE table_schema = current_schema() AND column_name = 'id' AND table_name = ANY(%s)""",
+        (BIGINT_ID_TABLES,)
+    )
+    pending = []
+    for table, data_type, default in cursor.fetchall():
+        sequence = _NEXTVAL.search(default or "")
+        sequence = sequence and sequence.group(1)
+        if sequence:
+            cursor.execute("SELECT seqtypid::regtype::text FROM pg_sequence WHERE seqrelid = %s::regclass", (sequence,))
+            row = cursor.fetchone()
+            if not row or row[0] != "integer":
+                sequence = None
+        if data_type == "integer" or sequence:
+            pending.append((table, data_type == "integer", sequence))
+    return pending
+
+def widen_ids():
+    # Explicit, never run at startup: ALTER COLUMN ... TYPE bigint rewrites
+    # the table under an ACCESS EXCLUSIVE lock. Each table is widened in its
+    # own transaction, so only one is locked at a time
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database unavailable")
+    try:
+        with conn.cursor() as cursor:
+            pending = integer_ids(cursor)
+        conn.commit()
+        for table, column, sequence in pending:
+            with conn.cursor() as cursor:
+                if column:
+                    print(f"Widening {table}.id to bigint")
+                    cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id TYPE bigint")
+                if sequence:
+                    # A maxvalue left at the int4 limit moves to the bigint one
+                    cursor.execute(f"ALTER SEQUENCE {sequence} AS bigint")
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    ids_widened.set()
+
+# Applied once every HOST_TABLES table has its host column
+HOST_SCOPED_STATEMENTS = [
+    # One open incident per component per host
+    "DROP INDEX IF EXISTS alerts_open_component_idx",
+    "CREATE UNIQUE INDEX IF NOT EXISTS alerts_open_host_component_idx ON alerts (host, component) WHERE closed_at IS NULL",
+    # Seed the registry from existing history once, so rollups backfill it
+    """INSERT INTO hosts (host, first_seen, last_seen)
+    SELECT host, MIN(timestamp), MAX(timestamp) FROM memory_metrics
+    WHERE timestamp IS NOT NULL AND NOT EXISTS (SELECT 1 FROM hosts)
+    GROUP BY host""",
+]
+
+# Set once ensure_schema has succeeded
+schema_applied = threading.Event()
+# Set once no id is left as integer. /ingest stays closed until then:
+# thousands of agents writing into integer ids would run them out quickly
+ids_widened = threading.Event()
+IDS_RECHECK_SECONDS = 60
+_apply_lock = threading.Lock()
+_ids_checked_at = None
+
+def ensure_schema():
+    with _apply_lock:
+        return _ensure_schema()
+
+def _ensure_schema():
+    conn = get_db_connection()
+    if conn is None:
+        return False
+    try:
+        with conn.cursor() as cursor:
+            for statement in SCHEMA_STATEMENTS:
+                cursor.execute(statement)
+            cursor.execute("SELECT name FROM schema_migrations")
+            applied = {name for name, in cursor.fetchall()}
+            for name, statement in ONE_TIME_MIGRATIONS.items():
+                if name not in applied:
+                    print(f"Applying migration {name}")
+                    cursor.execute(statement)
+                    cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s) ON CONFLICT DO NOTHING", (name,))
+            for table in HOST_TABLES:
+                # Rows stored before hosts existed were sampled on this machine
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS host text NOT NULL DEFAULT %s", (HOST_NAME,))
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_host_timestamp_idx ON {table} (host, timestamp)")
+            for statement in HOST_SCOPED_STATEMENTS:
+                cursor.execute(statement)
+            widened = not integer_ids(cursor)
+        conn.commit()
+        schema_applied.set()
+        if widened:
+            ids_widened.set()
+        else:
+            print("Ids are still integer, /ingest stays closed until `python schema.py --widen-ids` is run")
+        return True
+    except Exception as e:
+        print(f"Error applying schema: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+def check_ids():
+    # For /ingest while ids are integer: re-reads the catalog at most once a
+    # minute, so a widening run from another process opens it without a restart
+    global _ids_checked_at
+    with _apply_lock:
+        now = time.monotonic()
+        if ids_widened.is_set() or (_ids_checked_at is not None and now - _ids_checked_at < IDS_RECHECK_SECONDS):
+            return ids_widened.is_set()
+        _ids_checked_at = now
+        conn = get_db_connection()
+        if conn is None:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                if not integer_ids(cursor):
+                    ids_widened.set()
+            conn.commit()
+        except Exception as e:
+            print(f"Error checking id types: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+    return ids_widened.is_set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the Web Specs schema")
+    parser.add_argument("--widen-ids", action="store_true",
+                        help="widen the original tables' integer ids to bigint; rewrites each table under an exclusive lock")
+    args = parser.parse_args()
+    if not ensure_schema():
+        raise SystemExit("Unable to apply the schema")
+    if args.widen_ids:
+        widen_ids()
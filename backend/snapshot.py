@@ -0,0 +1,346 @@
+import copy
+import functools
+import json
+from array import array
+
+# Typed per-tick samples. The collector fills per-core and per-device columns
+# directly from psutil; ingestion, threshold rules, anomaly baselines and the
+# WebSocket frame all read those columns. Frames keep the original nested
+# shape ({"cpu": {"percent": {"core_1": ...}}}) so clients are unaffected.
+
+
+@functools.lru_cache(maxsize=8)
+def core_keys(count):
+    return tuple(f"core_{i+1}" for i in range(count))
+
+@functools.lru_cache(maxsize=8)
+def _json_keys(keys):
+    # '"core_1": ' style prefixes, built once per layout rather than per tick
+    return tuple(f"{json.dumps(key)}: " for key in keys)
+
+@functools.lru_cache(maxsize=32)
+def _series_keys(prefix, keys, suffix=""):
+    return tuple(f"{prefix}-{key}{suffix}" for key in keys)
+
+@functools.lru_cache(maxsize=None)
+def _core_index(key):
+    # "core_3" -> 2; threshold paths are a fixed set, so this is parsed once per key
+    prefix, _, number = key.partition("_")
+    return int(number) - 1 if prefix == "core" and number.isdigit() and int(number) > 0 else None
+
+@functools.lru_cache(maxsize=8)
+def _key_index(keys):
+    return {key: i for i, key in enumerate(keys)}
+
+def _encode_column(keys, values):
+    # float/int repr is what json.dumps writes for finite numbers
+    return "{" + ", ".join(map(str.__add__, _json_keys(keys), map(repr, values))) + "}"
+
+def _is_number(value):
+    return isinstance(value, (float, int)) and not isinstance(value, bool)
+
+
+class CpuSample:
+    __slots__ = ("user_time", "system_time", "idle_time", "percent", "_json")
+    section = "cpu"
+    COLUMNS = ("user_time", "system_time", "idle_time", "percent")
+
+    def __init__(self, user_time, system_time, idle_time, percent):
+        # One array('d') per column, indexed by core (core_1 is index 0)
+        self.user_time = user_time
+        self.system_time = system_time
+        self.idle_time = idle_time
+        self.percent = percent
+        self._json = None
+
+    @classmethod
+    def from_psutil(cls, cpu_times, cpu_percents):
+        return cls(
+            array('d', [core.user for core in cpu_times]),
+            array('d', [core.system for core in cpu_times]),
+            array('d', [core.idle for core in cpu_times]),
+            array('d', cpu_percents),
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        keys = core_keys(len(data["percent"]))
+        return cls(*(array('d', [data[column][key] for key in keys]) for column in cls.COLUMNS))
+
+    @property
+    def keys(self):
+        return core_keys(len(self.percent))
+
+    def encode(self):
+        if self._json is None:
+            keys = self.keys
+            self._json = "{" + ", ".join(
+                f'"{column}": {_encode_column(keys, getattr(self, column))}' for column in self.COLUMNS
+            ) + "}"
+        return self._json
+
+    def value(self, path):
+        if len(path) != 2 or path[0] not in self.COLUMNS:
+            return None
+        index = _core_index(path[1])
+        column = getattr(self, path[0])
+        return None if index is None or index >= len(column) else column[index]
+
+    def series(self, fields):
+        for column in self.COLUMNS:
+            if column in fields:
+                yield from zip(_series_keys(f"cpu-{column}", self.keys), getattr(self, column))
+
+    def to_dict(self):
+        keys = self.keys
+        return {column: dict(zip(keys, getattr(self, column))) for column in self.COLUMNS}
+
+
+class _ScalarSample:
+    # Base for single-row families; subclasses set section and FIELDS
+    __slots__ = ()
+    section = None
+    FIELDS = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(*(data[field] for field in cls.FIELDS))
+
+    def encode(self):
+        if self._json is None:
+            self._json = "{" + ", ".join(f'"{field}": {getattr(self, field)!r}' for field in self.FIELDS) + "}"
+        return self._json
+
+    def value(self, path):
+        if len(path) != 1 or path[0] not in self.FIELDS:
+            return None
+        return getattr(self, path[0])
+
+    def series(self, fields):
+        for field in self.FIELDS:
+            if field in fields:
+                yield f"{self.section}-{field}", getattr(self, field)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class MemorySample(_ScalarSample):
+    FIELDS = ("available_memory", "memory_percent_usage", "used_memory")
+    __slots__ = FIELDS + ("_json",)
+    section = "memory"
+
+    def __init__(self, available_memory, memory_percent_usage, used_memory):
+        self.available_memory = available_memory
+        self.memory_percent_usage = memory_percent_usage
+        self.used_memory = used_memory
+        self._json = None
+
+
+class SwapSample(_ScalarSample):
+    FIELDS = ("used_memory", "free_memory", "percent_usage")
+    __slots__ = FIELDS + ("_json",)
+    section = "swap_memory"
+
+    def __init__(self, used_memory, free_memory, percent_usage):
+        self.used_memory = used_memory
+        self.free_memory = free_memory
+        self.percent_usage = percent_usage
+        self._json = None
+
+
+class _DeviceSample:
+    # Base for per-device families: a tuple of device names plus one column
+    # per field, all indexed alike
+    __slots__ = ()
+    section = None
+    COLUMNS = ()
+    TEXT_COLUMNS = ()
+    # array typecode per numeric column, 'Q' unless listed
+    TYPECODES = {}
+
+    @classmethod
+    def from_dict(cls, data):
+        devices = tuple(data)
+        text = [[data[device][column] for device in devices] for column in cls.TEXT_COLUMNS]
+        numbers = [
+            array(cls.TYPECODES.get(column, 'Q'), [data[device][column] for device in devices])
+            for column in cls.COLUMNS
+        ]
+        return cls(devices, *text, *numbers)
+
+    def encode(self):
+        if self._json is None:
+            parts = []
+            for i, prefix in enumerate(_json_keys(self.devices)):
+                fields = ", ".join(
+                    f'"{column}": {json.dumps(getattr(self, column)[i])}' for column in self.TEXT_COLUMNS
+                ) if self.TEXT_COLUMNS else None
+                numbers = ", ".join(f'"{column}": {getattr(self, column)[i]!r}' for column in self.COLUMNS)
+                parts.append(prefix + "{" + (f"{fields}, {numbers}" if fields else numbers) + "}")
+            self._json = "{" + ", ".join(parts) + "}"
+        return self._json
+
+    def value(self, path):
+        if len(path) != 2 or path[1] not in self.COLUMNS:
+            return None
+        index = _key_index(self.devices).get(path[0])
+        return None if index is None else getattr(self, path[1])[index]
+
+    def series(self, fields):
+        for column in self.COLUMNS:
+            if column in fields:
+                yield from zip(_series_keys(self.section, self.devices, f"-{column}"), getattr(self, column))
+
+    def rows(self):
+        columns = [self.devices] + [getattr(self, column) for column in self.TEXT_COLUMNS + self.COLUMNS]
+        return zip(*columns)
+
+    def to_dict(self):
+        names = self.TEXT_COLUMNS + self.COLUMNS
+        return {device: dict(zip(names, row[1:])) for device, row in zip(self.devices, self.rows())}
+
+
+class DiskIoSample(_DeviceSample):
+    __slots__ = ("devices", "read_count", "write_count", "read_bytes", "write_bytes", "read_time", "write_time", "_json")
+    section = "io"
+    COLUMNS = ("read_count", "write_count", "read_bytes", "write_bytes", "read_time", "write_time")
+
+    def __init__(self, devices, read_count, write_count, read_bytes, write_bytes, read_time, write_time):
+        self.devices = devices
+        self.read_count = read_count
+        self.write_count = write_count
+        self.read_bytes = read_bytes
+        self.write_bytes = write_bytes
+        self.read_time = read_time
+        self.write_time = write_time
+        self._json = None
+
+    @classmethod
+    def from_psutil(cls, disk_io_counters):
+        counters = list(disk_io_counters.values())
+        return cls(
+            tuple(disk_io_counters),
+            array('Q', [c.read_count for c in counters]),
+            array('Q', [c.write_count for c in counters]),
+            array('Q', [c.read_bytes for c in counters]),
+            array('Q', [c.write_bytes for c in counters]),
+            array('Q', [c.read_time for c in counters]),
+            array('Q', [c.write_time for c in counters]),
+        )
+
+
+class DiskUsageSample(_DeviceSample):
+    __slots__ = ("devices", "mountpoint", "fstype", "total", "used", "free", "percent", "_json")
+    section = "disk_usage"
+    TEXT_COLUMNS = ("mountpoint", "fstype")
+    COLUMNS = ("total", "used", "free", "percent")
+    TYPECODES = {"percent": 'd'}
+
+    def __init__(self, devices, mountpoint, fstype, total, used, free, percent):
+        self.devices = devices
+        self.mountpoint = mountpoint
+        self.fstype = fstype
+        self.total = total
+        self.used = used
+        self.free = free
+        self.percent = percent
+        self._json = None
+
+    @classmethod
+    def from_usages(cls, usages):
+        # usages: (partition, psutil disk_usage) pairs for the mounts that answered
+        return cls(
+            tuple(partition.device for partition, _ in usages),
+            [partition.mountpoint for partition, _ in usages],
+            [partition.fstype for partition, _ in usages],
+            array('Q', [usage.total for _, usage in usages]),
+            array('Q', [usage.used for _, usage in usages]),
+            array('Q', [usage.free for _, usage in usages]),
+            array('d', [usage.percent for _, usage in usages]),
+        )
+
+
+class PayloadSample:
+    # Families with a small, irregular shape (GPU devices, latency targets,
+    # top processes) keep their dict payload and are encoded once
+    __slots__ = ("section", "data", "_json")
+
+    def __init__(self, section, data):
+        self.section = section
+        self.data = data
+        self._json = None
+
+    def encode(self):
+        if self._json is None:
+            self._json = json.dumps(self.data)
+        return self._json
+
+    def value(self, path):
+        value = self.data
+        for key in path:
+            if not isinstance(value, dict) or key not in value:
+                return None
+            value = value[key]
+        return value if _is_number(value) else None
+
+    def series(self, fields):
+        yield from _leaves(self.data, (self.section,), fields, False)
+
+    def to_dict(self):
+        return copy.deepcopy(self.data)
+
+
+def _leaves(value, path, fields, tracked):
+    # Leaves count once any key on their path is listed in fields
+    if isinstance(value, dict):
+        for key, nested in value.items():
+            yield from _leaves(nested, path + (key,), fields, tracked or key in fields)
+    elif tracked and _is_number(value):
+        yield "-".join(path), value
+
+
+SAMPLE_CLASSES = {sample.section: sample for sample in (CpuSample, MemorySample, SwapSample, DiskIoSample, DiskUsageSample)}
+
+
+class Snapshot:
+    __slots__ = ("sections", "late")
+
+    def __init__(self, sections, late=()):
+        # sections: family name -> sample
+        self.sections = sections
+        self.late = list(late)
+
+    def __contains__(self, section):
+        return section in self.sections
+
+    def encode(self):
+        # Samples cache their own encoding, so families that weren't
+        # re-sampled this tick are reused as-is
+        parts = [f'"{name}": {sample.encode()}' for name, sample in self.sections.items()]
+        parts.append(f'"late": {json.dumps(self.late)}')
+        return "{" + ", ".join(parts) + "}"
+
+    def value(self, path):
+        # Number at a notif_config path such as ("cpu", "percent", "core_1"), or None
+        sample = self.sections.get(path[0])
+        return None if sample is None else sample.value(path[1:])
+
+    def series(self, tracked):
+        # (section, iterator of (key, value)) for the fields tracked per section
+        for section, fields in tracked.items():
+            sample = self.sections.get(section)
+            if sample is not None:
+                yield section, sample.series(fields)
+
+    def to_dict(self):
+        return {name: sample.to_dict() for name, sample in self.sections.items()}
+
+    @classmethod
+    def from_dict(cls, frame):
+        # Inverse of to_dict, for frames pushed by remote agents. Raises
+        # KeyError, TypeError, ValueError or OverflowError on a malformed frame
+        return cls({
+            name: SAMPLE_CLASSES[name].from_dict(data) if name in SAMPLE_CLASSES else PayloadSample(name, data)
+            for name, data in frame.items()
+        })
@@ -1,3 +1,5 @@
+import concurrent.futures
+import functools
 import os
 import platform
 import socket
@@ -5,6 +7,13 @@ import psutil
 import datetime
 import uuid
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROBE_TIMEOUT_SECONDS = 2
+REFRESH_INTERVAL_SECONDS = 5
+STATIC_TTL_SECONDS = 24 * 3600
 
 def get_ip_addresses():
     ip_list = []
@@ -37,41 +46,88 @@ def get_listening_ports():
             ports.add(conn.laddr.port)
     return sorted(list(ports))
 
-def run_cmd(cmd):
+def run_cmd(cmd, timeout=PROBE_TIMEOUT_SECONDS):
     try:
-        return subprocess.check_output(cmd, shell=True, text=True).strip()
-    except subprocess.CalledProcessError:
+        return subprocess.check_output(cmd, shell=True, text=True, stderr=subprocess.DEVNULL, timeout=timeout).strip()
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
         return "N/A"
 
-def system_info():
+def get_uptime_hours():
+    return round((datetime.datetime.now() - datetime.datetime.fromtimestamp(psutil.boot_time())).total_seconds() / 3600, 2)
+
+# field -> (probe, ttl in seconds)
+PROBES = {
+    "Hostname": (socket.gethostname, 3600),
+    "FQDN": (socket.getfqdn, 3600),
+    "IP Addresses": (get_ip_addresses, 60),
+    "MAC Addresses": (get_mac_addresses, 3600),
+    "OS": (platform.system, STATIC_TTL_SECONDS),
+    "OS Release": (platform.release, STATIC_TTL_SECONDS),
+    "Kernel Version": (platform.version, STATIC_TTL_SECONDS),
+    "Architecture": (platform.machine, STATIC_TTL_SECONDS),
+    "CPU Model": (platform.processor, STATIC_TTL_SECONDS),
+    "CPU Cores": (lambda: psutil.cpu_count(logical=False), STATIC_TTL_SECONDS),
+    "CPU Threads": (lambda: psutil.cpu_count(logical=True), STATIC_TTL_SECONDS),
+    "Memory (Total)": (lambda: f"{round(psutil.virtual_memory().total / (1024**3), 2)} GB", 3600),
+    "Swap (Total)": (lambda: f"{round(psutil.swap_memory().total / (1024**3), 2)} GB", 300),
+    "Boot Time": (get_boot_time, 3600),
+    "Uptime (hours)": (get_uptime_hours, 60),
+    "Users Logged In": (get_logged_in_users, 60),
+    "Listening Ports": (get_listening_ports, 60),
+    "Firewall Rules": (lambda: run_cmd("sudo -n iptables -L -n") or "N/A", 300),
+    "Installed Docker Version": (lambda: run_cmd("docker --version"), 3600),
+    "Installed PostgreSQL Version": (lambda: run_cmd("psql --version"), 3600),
+    "Virtualization": (lambda: run_cmd("systemd-detect-virt"), STATIC_TTL_SECONDS),
+    "Cloud Metadata": (lambda: run_cmd("curl -s --max-time 1 http://169.254.169.254/latest/meta-data/instance-id || echo 'Not Cloud'"), STATIC_TTL_SECONDS),
+}
+
+# field -> (value, expires_at)
+_cache = {}
+_in_flight = set()
+_lock = threading.RLock()
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="static-info")
+_stop = threading.Event()
+
+def _store(field, ttl, future):
     try:
-        info = {
-            "Hostname": socket.gethostname(),
-            "FQDN": socket.getfqdn(),
-            "IP Addresses": get_ip_addresses(),
-            "MAC Addresses": get_mac_addresses(),
-            "OS": platform.system(),
-            "OS Release": platform.release(),
-            "Kernel Version": platform.version(),
-            "Architecture": platform.machine(),
-            "CPU Model": platform.processor(),
-            "CPU Cores": psutil.cpu_count(logical=False),
-            "CPU Threads": psutil.cpu_count(logical=True),
-            "Memory (Total)": f"{round(psutil.virtual_memory().total / (1024**3), 2)} GB",
-            "Swap (Total)": f"{round(psutil.swap_memory().total / (1024**3), 2)} GB",
-            "Boot Time": get_boot_time(),
-            "Uptime (hours)": round((datetime.datetime.now() - datetime.datetime.fromtimestamp(psutil.boot_time())).total_seconds() / 3600, 2),
-            "Users Logged In": get_logged_in_users(),
-            "Listening Ports": get_listening_ports(),
-            "Firewall Rules": run_cmd("sudo iptables -L -n") or "N/A",
-            "Installed Docker Version": run_cmd("docker --version"),
-            "Installed PostgreSQL Version": run_cmd("psql --version"),
-            "Virtualization": run_cmd("systemd-detect-virt"),
-            "Cloud Metadata": run_cmd("curl -s http://169.254.169.254/latest/meta-data/instance-id || echo 'Not Cloud'"),
-        }
-
-        return info
-    
+        value = future.result()
     except Exception as e:
-        print(e)
-        return {}
\ No newline at end of file
+        print(f"Error probing {field}: {e}")
+        value = "N/A"
+    with _lock:
+        _cache[field] = (value, time.monotonic() + ttl)
+        _in_flight.discard(field)
+
+def refresh(wait=False):
+    # Start every expired probe concurrently; with wait=True block until they
+    # land or PROBE_TIMEOUT_SECONDS passes, whichever is first
+    now = time.monotonic()
+    futures = []
+    with _lock:
+        for field, (probe, ttl) in PROBES.items():
+            if field in _in_flight or (field in _cache and _cache[field][1] > now):
+                continue
+            _in_flight.add(field)
+            future = _pool.submit(probe)
+            future.add_done_callback(functools.partial(_store, field, ttl))
+            futures.append(future)
+    if wait and futures:
+        concurrent.futures.wait(futures, timeout=PROBE_TIMEOUT_SECONDS + 1)
+
+def _refresh_forever():
+    while not _stop.wait(REFRESH_INTERVAL_SECONDS):
+        refresh()
+
+def start_refresher():
+    _stop.clear()
+    refresh(wait=True)
+    threading.Thread(target=_refresh_forever, daemon=True, name="static-info-refresher").start()
+
+def stop_refresher():
+    _stop.set()
+
+def system_info():
+    if not _cache:
+        refresh(wait=True)
+    with _lock:
+        return {field: _cache[field][0] if field in _cache else "N/A" for field in PROBES}
@@ -0,0 +1,133 @@
+import datetime
+
+import pytest
+
+import alert_engine
+from alert_engine import AlertEngine
+
+START = datetime.datetime(2024, 1, 1, 12, 0, 0)
+INTERVALS = {"cpu": 1, "memory": 5, "swap_memory": 60}
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if query.startswith("SELECT id, component FROM alerts"):
+            self.db.loads += 1
+        if "closed_at = %s" in query:
+            self.db.closed.extend(params[-1])
+
+    def fetchall(self):
+        # No open incidents when the engine first loads
+        return []
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.opened = []
+        self.closed = []
+        self.loads = 0
+
+    def execute_values(self, cursor, query, rows, template=None, fetch=False):
+        if query.lstrip().startswith("INSERT"):
+            start = len(self.opened)
+            self.opened.extend(rows)
+            return [(start + i, row[2]) for i, row in enumerate(rows, 1)]
+        return None
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDatabase()
+    monkeypatch.setattr(alert_engine, "get_db_connection", lambda: FakeConnection(db))
+    monkeypatch.setattr("psycopg2.extras.execute_values", db.execute_values)
+    return db
+
+
+def run(engine, seconds, readings_at):
+    # One process() call per 1s collector tick from START, with the readings
+    # of the families sampled on that tick
+    for second in range(seconds + 1):
+        engine.process(readings_at(second), START + datetime.timedelta(seconds=second), INTERVALS)
+
+
+def test_five_second_family_fires_after_for_seconds(db):
+    engine = AlertEngine(host="test")
+
+    def readings_at(second):
+        readings = [("cpu-percent-core_0", 10.0, 80, 75, 30)]
+        if second % 5 == 0:
+            readings.append(("memory-memory_percent_usage", 95.0, 80, 75, 30))
+        return readings
+
+    run(engine, 29, readings_at)
+    assert db.opened == []
+    engine.process(readings_at(30), START + datetime.timedelta(seconds=30), INTERVALS)
+    assert [row[2] for row in db.opened] == ["memory-memory_percent_usage"]
+
+
+def test_slow_family_incident_survives_a_missed_sample(db):
+    engine = AlertEngine(host="test")
+    reading = ("swap_memory-percent_usage", 95.0, 80, 75, 0)
+    engine.process([reading], START, INTERVALS)
+    assert len(db.opened) == 1
+
+    # The 60s sample at +60 is late; the next one arrives at +120
+    for second in range(1, 121):
+        now = START + datetime.timedelta(seconds=second)
+        engine.process([reading] if second == 120 else [], now, INTERVALS)
+    assert db.closed == []
+
+    # Five intervals with no reading at all close it
+    engine.process([], START + datetime.timedelta(seconds=120 + 5 * 60 + 1), INTERVALS)
+    assert db.closed == [1]
+
+
+def test_anomaly_compares_its_score_and_stores_the_observed_value(db):
+    engine = AlertEngine(host="test")
+    engine.process([("anomaly-memory-memory_percent_usage", 97.5, 4.0, 2.0, 0, 6.25)], START, INTERVALS)
+    [row] = db.opened
+    # value, threshold_value, peak_value, score, peak_score
+    assert (row[3], row[4], row[7], row[8], row[9]) == (97.5, 4.0, 97.5, 6.25, 6.25)
+
+    # A high observed value with a low score closes it
+    engine.process([("anomaly-memory-memory_percent_usage", 99.0, 4.0, 2.0, 0, 1.5)], START, INTERVALS)
+    assert db.closed == [1]
+
+
+def test_resync_reloads_open_incidents_on_the_next_tick(db):
+    engine = AlertEngine(host="test")
+    engine.process([("memory-memory_percent_usage", 95.0, 80, 75, 0)], START, INTERVALS)
+    engine.process([], START + datetime.timedelta(seconds=1), INTERVALS)
+    assert db.loads == 1
+
+    # Another replica closed it while this one didn't hold the lease
+    engine.resync()
+    engine.process([], START + datetime.timedelta(seconds=2), INTERVALS)
+    assert db.loads == 2
+    assert engine.open == {}
@@ -0,0 +1,41 @@
+import datetime
+
+import anomaly
+from anomaly import AnomalyDetector
+from snapshot import MemorySample, Snapshot
+
+START = datetime.datetime(2024, 1, 1, 12, 0, 0)
+
+
+def memory(percent):
+    return Snapshot({"memory": MemorySample(1024, percent, 512)})
+
+
+def warmed_up(tmp_path):
+    detector = AnomalyDetector(path=str(tmp_path / "state.json"))
+    for i in range(anomaly.WARMUP_SAMPLES):
+        detector.observe(memory(50.0 + i % 2), START + datetime.timedelta(seconds=i))
+    return detector
+
+
+def test_readings_carry_the_observed_value_and_z_score(tmp_path):
+    detector = warmed_up(tmp_path)
+    [reading] = detector.observe(memory(90.0), START)
+    component, value, fire, clear, for_seconds, score = reading
+    assert component == "anomaly-memory-memory_percent_usage"
+    assert value == 90.0
+    assert score >= fire
+
+
+def test_high_only_fields_ignore_drops(tmp_path):
+    detector = warmed_up(tmp_path)
+    [reading] = detector.observe(memory(5.0), START)
+    assert reading[-1] < 0
+
+
+def test_directions_can_be_overridden(monkeypatch, tmp_path):
+    monkeypatch.setitem(anomaly.TRACKED_FIELDS, "memory", dict(anomaly.TRACKED_FIELDS["memory"]))
+    anomaly._override_directions("memory.memory_percent_usage=both")
+    detector = warmed_up(tmp_path)
+    [reading] = detector.observe(memory(5.0), START)
+    assert reading[-1] >= anomaly.Z_FIRE
@@ -0,0 +1,17 @@
+from array import array
+
+from exposition import render_openmetrics
+from snapshot import CpuSample, MemorySample, Snapshot
+
+
+def test_non_finite_values_use_openmetrics_spelling():
+    cpu = CpuSample(array('d', [1.0, 2.0]), array('d', [1.0, 2.0]), array('d', [1.0, 2.0]),
+                    array('d', [float("nan"), float("inf")]))
+    memory = MemorySample(1024, float("-inf"), 512)
+    lines = render_openmetrics(Snapshot({"cpu": cpu, "memory": memory})).splitlines()
+
+    assert 'webspecs_cpu_usage_percent{core="1"} NaN' in lines
+    assert 'webspecs_cpu_usage_percent{core="2"} +Inf' in lines
+    assert "webspecs_memory_usage_percent -Inf" in lines
+    assert "webspecs_memory_used_bytes 512" in lines
+    assert not any(line.endswith((" nan", " inf", " -inf")) for line in lines)
@@ -0,0 +1,14 @@
+import json
+import subprocess
+import sys
+
+from bench.bench_import import PROBE
+
+
+def test_importing_backend_loads_no_optional_modules_and_starts_no_threads(tmp_path):
+    # A fresh interpreter, so nothing an earlier test imported counts
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr[-2000:]
+    probe = json.loads(result.stdout.splitlines()[-1])
+    assert probe["loaded"] == []
+    assert probe["threads"] == []
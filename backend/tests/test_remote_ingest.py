@@ -0,0 +1,33 @@
+import gzip
+import json
+
+import pytest
+
+from remote_ingest import BatchError, decode_batch
+
+MEMORY = {"available_memory": 1024, "memory_percent_usage": 50.0, "used_memory": 1024}
+DISK_USAGE = {"sda1": {"mountpoint": "/", "fstype": "ext4", "total": 200, "used": 100, "free": 100, "percent": 50.0}}
+
+
+def batch(**sample):
+    body = {"host": "web-1", "batch_id": "b1", "samples": [dict(sample, timestamp=1700000000)]}
+    return gzip.compress(json.dumps(body).encode())
+
+
+def test_decodes_a_well_formed_batch():
+    host, batch_id, samples = decode_batch(batch(memory=MEMORY, disk_usage=DISK_USAGE), "gzip")
+    assert (host, batch_id) == ("web-1", "b1")
+    [(_, snapshot)] = samples
+    assert snapshot.value(("memory", "used_memory")) == 1024
+
+
+@pytest.mark.parametrize("sample", [
+    {"memory": dict(MEMORY, used_memory="1024")},
+    {"memory": dict(MEMORY, memory_percent_usage=float("nan"))},
+    {"memory": dict(MEMORY, available_memory=2 ** 63)},
+    {"disk_usage": {"sda1": dict(DISK_USAGE["sda1"], fstype={"name": "ext4"})}},
+    {"disk_usage": {"sda1": dict(DISK_USAGE["sda1"], mountpoint="/mnt\x00")}},
+])
+def test_rejects_values_the_database_would_refuse(sample):
+    with pytest.raises(BatchError):
+        decode_batch(batch(**sample), "gzip")